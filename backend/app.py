@@ -6,8 +6,27 @@ from routes.user_routes import user_bp
 from config.firebase_config import firebase_admin
 from routes.rempla_routes import rempla_bp
 from routes.message_routes import message_bp
+from routes.reference_routes import reference_bp
+from routes.stream_routes import stream_bp
+from routes.attachment_routes import attachment_bp
+from config import settings
+from config.database import get_db, pool
+from config.logging_config import dropped_events, setup_logging
+from middleware.metrics import init_metrics, register_stats
+from middleware.idempotency import idempotency_cache
+from middleware.rate_limit import rate_limit_store
+from middleware.response_layer import init_response_layer
+from middleware.token_verifier import token_verifier
+from services.attachment_processor import attachment_processor
+from services.conversation_cache import conversation_cache
+from services.feed_engine import feed_engine
+from services.push_hub import push_hub
+from services.reference_data import reference_data
+from services.update_coalescer import user_updates
 from datetime import datetime
 
+setup_logging()
+
 app = Flask(__name__)
 CORS(app)  # En développement
 # En production, spécifiez l'origine exacte :
@@ -21,10 +40,42 @@ def ping():
         'timestamp': datetime.now().isoformat()
     })
 
+# Sérialisation JSON rapide et compression gzip/brotli des réponses
+init_response_layer(app)
+
+# Latences par endpoint, appels Firestore par requête et route /metrics
+init_metrics(app)
+register_stats('token_cache', token_verifier.stats)
+register_stats('conversation_cache', conversation_cache.stats)
+register_stats('firestore_pool', pool.stats)
+register_stats('logging', lambda: {'droppedEvents': dropped_events()})
+register_stats('reference_data', reference_data.stats)
+register_stats('idempotency_cache', idempotency_cache.stats)
+register_stats('user_updates', user_updates.stats)
+register_stats('rate_limit', rate_limit_store.stats)
+register_stats('push_hub', push_hub.stats)
+register_stats('feed', feed_engine.stats)
+register_stats('attachments', attachment_processor.stats)
+
 # Enregistrer le blueprint
 app.register_blueprint(user_bp)
 app.register_blueprint(rempla_bp)
 app.register_blueprint(message_bp)
+app.register_blueprint(reference_bp)
+app.register_blueprint(stream_bp)
+app.register_blueprint(attachment_bp)
+
+# Ouvrir les connexions Firestore avant la première requête
+if settings.FIRESTORE_WARMUP:
+    pool.warm_up()
+
+# Les listeners chargent les données de référence en arrière-plan
+if settings.REFERENCE_DATA_PRELOAD:
+    reference_data.start(get_db())
+
+# Relance des traitements interrompus et nettoyage des pièces jointes non rattachées
+if settings.ATTACHMENT_SWEEP_INTERVAL:
+    attachment_processor.start_sweeper(get_db(), settings.ATTACHMENT_SWEEP_INTERVAL)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)  # host='0.0.0.0' permet les connexions externes
\ No newline at end of file
@@ -0,0 +1,11 @@
+# ELIO_Backend/asgi.py
+
+from a2wsgi import WSGIMiddleware
+
+from config import settings
+from app import app
+
+# Application ASGI exposant les blueprints existants. Chaque requête est exécutée
+# dans un pool de ASYNC_THREADS threads : les requêtes en attente de Firestore
+# avancent en parallèle, jusqu'à la taille du pool.
+asgi_app = WSGIMiddleware(app, workers=settings.ASYNC_THREADS)
@@ -0,0 +1,550 @@
+# ELIO_Backend/benchmarks/run_benchmark.py
+#
+# Banc de charge du backend contre l'émulateur Firestore :
+#   firebase emulators:start --only firestore
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/run_benchmark.py --save-baseline local
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/run_benchmark.py --baseline local
+#
+# Le serveur est lancé avec AUTH_STUB=1 : les requêtes s'authentifient avec des
+# tokens factices "stub:<uid>", acceptés uniquement face à l'émulateur.
+# /metrics est lu avec METRICS_TOKEN (fixé par le banc s'il n'est pas défini).
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+sys.path.insert(0, BACKEND_DIR)
+
+# Poids relatifs de chaque opération dans un mélange de trafic
+TRAFFIC_MIXES = {
+    # Usage courant : beaucoup de messagerie et de recherche
+    'default': {
+        'send_message': 40, 'search_replacements': 25, 'delete_message': 10,
+        'update_user': 15, 'create_user': 10
+    },
+    'messaging': {'send_message': 70, 'delete_message': 30},
+    'search': {'search_replacements': 100},
+    # Arrivée de nouveaux utilisateurs : création puis étapes d'onboarding
+    'onboarding': {'create_user': 30, 'update_user': 70}
+}
+
+# Statuts attendus : tout autre statut est compté comme une erreur
+EXPECTED_STATUSES = {
+    'send_message': {201},
+    'delete_message': {200},
+    'search_replacements': {200},
+    'create_user': {200, 201},
+    'update_user': {200}
+}
+
+# Seuils de régression par rapport à la référence enregistrée
+LATENCY_TOLERANCE = 0.25
+LATENCY_NOISE_FLOOR_MS = 2.0
+THROUGHPUT_TOLERANCE = 0.15
+FIRESTORE_OPS_TOLERANCE = 0.05
+ERROR_RATE_TOLERANCE = 0.01
+
+CITIES = [
+    ('Marseille', 43.2965, 5.3698), ('Paris', 48.8566, 2.3522), ('Lyon', 45.7640, 4.8357),
+    ('Toulouse', 43.6047, 1.4442), ('Bordeaux', 44.8378, -0.5792), ('Lille', 50.6292, 3.0573)
+]
+
+
+# --- Données de test -----------------------------------------------------------
+
+class Dataset:
+    """Identifiants des documents créés dans l'émulateur pour le banc"""
+
+    def __init__(self):
+        self.professions = []
+        self.specialties = []
+        self.establishments = []
+        self.users = []
+        self.conversations = []
+
+
+def reset_emulator(project_id):
+    host = os.environ['FIRESTORE_EMULATOR_HOST']
+    url = f"http://{host}/emulator/v1/projects/{project_id}/databases/(default)/documents"
+    urllib.request.urlopen(urllib.request.Request(url, method='DELETE'), timeout=30).close()
+
+
+def seed(db, rng, users, conversations, replacements, establishments):
+    """Peupler l'émulateur avec un jeu de données proche de la production"""
+    dataset = Dataset()
+    now = datetime.utcnow()
+    batch, count = db.batch(), 0
+
+    def write(ref, data):
+        nonlocal batch, count
+        batch.set(ref, data)
+        count += 1
+        if count % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+
+    for i in range(5):
+        profession_id = f'prf{i}'
+        write(db.collection('professions').document(profession_id),
+              {'name': f'Profession {i}', 'createdAt': now, 'updatedAt': now})
+        dataset.professions.append(profession_id)
+        for j in range(4):
+            specialty_id = f'spc{i}_{j}'
+            write(db.collection('specialties').document(specialty_id),
+                  {'name': f'Spécialité {i}.{j}', 'professionId': profession_id, 'isActive': True,
+                   'createdAt': now, 'updatedAt': now})
+            dataset.specialties.append((specialty_id, profession_id))
+
+    for i in range(establishments):
+        _, latitude, longitude = rng.choice(CITIES)
+        establishment_id = f'est{i}'
+        write(db.collection('establishments').document(establishment_id), {
+            'name': f'Établissement {i}',
+            'coordinates': {'latitude': latitude + rng.uniform(-0.3, 0.3),
+                            'longitude': longitude + rng.uniform(-0.3, 0.3)},
+            'professionIds': rng.sample(dataset.professions, 2),
+            'createdAt': now, 'updatedAt': now
+        })
+        dataset.establishments.append(establishment_id)
+
+    for i in range(replacements):
+        specialty_id, profession_id = rng.choice(dataset.specialties)
+        start = now + timedelta(days=rng.randint(0, 120))
+        write(db.collection('replacements').document(f'rep{i}'), {
+            'title': f'Remplacement {i}',
+            'establishmentId': rng.choice(dataset.establishments),
+            'professionId': profession_id,
+            'specialtyId': specialty_id,
+            'startDate': start,
+            'endDate': start + timedelta(days=rng.randint(1, 14)),
+            'status': 'open' if rng.random() < 0.8 else 'confirmed',
+            'createdAt': now, 'updatedAt': now
+        })
+
+    for i in range(users):
+        uid = f'bench-user-{i}'
+        write(db.collection('users').document(uid), {
+            'uid': uid, 'email': f'{uid}@bench.local', 'role': 'user',
+            'isProfileComplete': False, 'onboardingStep': 0, 'createdAt': now, 'updatedAt': now
+        })
+        dataset.users.append(uid)
+
+    for i in range(conversations):
+        conversation_id = f'conv{i}'
+        participants = rng.sample(dataset.users, 2)
+        write(db.collection('conversations').document(conversation_id), {
+            'participants': participants, 'status': 'active',
+            'establishmentId': rng.choice(dataset.establishments),
+            'lastActivity': now, 'createdAt': now, 'updatedAt': now
+        })
+        dataset.conversations.append((conversation_id, participants))
+
+    batch.commit()
+    return dataset
+
+
+# --- Serveur -------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, server_mode, log_path):
+    env = dict(
+        os.environ,
+        AUTH_STUB='1',
+        METRICS_TOKEN=metrics_token(),
+        RATE_LIMIT_ENABLED='0',
+        SERVER_MODE=server_mode,
+        HOST='127.0.0.1',
+        PORT=str(port),
+        FLASK_DEBUG='0',
+        # Les métriques sont propres à chaque processus : un seul worker
+        ASYNC_WORKERS='1'
+    )
+    log_file = open(log_path, 'w')
+    process = subprocess.Popen([sys.executable, 'serve.py'], cwd=BACKEND_DIR, env=env,
+                               stdout=log_file, stderr=subprocess.STDOUT)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté au démarrage, voir {log_path}")
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/ping', timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Le serveur ne répond pas sur /ping, voir {log_path}")
+
+
+# --- Trafic --------------------------------------------------------------------
+
+class HttpClient:
+    """Connexion HTTP persistante d'un worker"""
+
+    def __init__(self, host, port):
+        self._host, self._port = host, port
+        self._connection = None
+
+    def request(self, method, path, uid, body=None):
+        headers = {'Authorization': f'Bearer stub:{uid}'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self._host, self._port, timeout=30)
+            try:
+                start = time.perf_counter()
+                self._connection.request(method, path, body=payload, headers=headers)
+                response = self._connection.getresponse()
+                data = response.read()
+                return response.status, time.perf_counter() - start, data
+            except (http.client.HTTPException, OSError):
+                # Connexion fermée par le serveur : réessayer une fois sur une nouvelle connexion
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+
+
+class Worker:
+    """Exécute des opérations tirées au sort selon le mélange de trafic"""
+
+    def __init__(self, client, dataset, rng, run_id):
+        self.client = client
+        self.dataset = dataset
+        self.rng = rng
+        self.run_id = run_id
+        self.sent = []
+        self.created = 0
+
+    def run(self, operation):
+        if operation == 'delete_message' and not self.sent:
+            operation = 'send_message'
+        return operation, getattr(self, operation)()
+
+    def send_message(self):
+        conversation_id, participants = self.rng.choice(self.dataset.conversations)
+        uid = self.rng.choice(participants)
+        status, latency, body = self.client.request('POST', '/send_message', uid, {
+            'conversationId': conversation_id, 'content': 'Message de test', 'type': 'text'
+        })
+        if status == 201:
+            self.sent.append((uid, conversation_id, json.loads(body)['id']))
+        return status, latency
+
+    def delete_message(self):
+        uid, conversation_id, message_id = self.sent.pop(self.rng.randrange(len(self.sent)))
+        status, latency, _ = self.client.request('DELETE', f'/delete_message/{conversation_id}/{message_id}', uid)
+        return status, latency
+
+    def search_replacements(self):
+        _, latitude, longitude = self.rng.choice(CITIES)
+        start = datetime.utcnow() + timedelta(days=self.rng.randint(0, 60))
+        body = {
+            'professionId': self.rng.choice(self.dataset.professions),
+            'startDate': start.isoformat(),
+            'endDate': (start + timedelta(days=30)).isoformat()
+        }
+        if self.rng.random() < 0.5:
+            body['location'] = {'latitude': latitude, 'longitude': longitude}
+            body['radiusKm'] = self.rng.choice([10, 25, 50])
+        status, latency, _ = self.client.request('POST', '/search_replacements', self.rng.choice(self.dataset.users), body)
+        return status, latency
+
+    def create_user(self):
+        # Une partie des créations rejoue un utilisateur existant (requête retentée)
+        if self.rng.random() < 0.2:
+            uid = self.rng.choice(self.dataset.users)
+        else:
+            self.created += 1
+            uid = f'bench-new-{self.run_id}-{id(self)}-{self.created}'
+        status, latency, _ = self.client.request('POST', '/create_user', uid, {})
+        return status, latency
+
+    def update_user(self):
+        uid = self.rng.choice(self.dataset.users)
+        specialty_id, profession_id = self.rng.choice(self.dataset.specialties)
+        body = self.rng.choice([
+            {'onboardingStep': self.rng.randint(1, 3)},
+            {'firstName': 'Camille', 'lastName': 'Martin'},
+            {'professionId': profession_id, 'specialityIds': [specialty_id]},
+            {'isProfileComplete': True}
+        ])
+        status, latency, _ = self.client.request('PUT', f'/update_user/{uid}', uid, body)
+        return status, latency
+
+
+def run_traffic(host, port, dataset, mix, duration, warmup, concurrency, seed_value, run_id):
+    operations = list(mix)
+    weights = [mix[operation] for operation in operations]
+    samples = {operation: [] for operation in operations}
+    errors = {operation: 0 for operation in operations}
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    def loop(index):
+        rng = random.Random(seed_value * 1000 + index)
+        worker = Worker(HttpClient(host, port), dataset, rng, run_id)
+        local_samples, local_errors = [], []
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            operation, (status, latency) = worker.run(rng.choices(operations, weights)[0])
+            if now >= measure_from:
+                local_samples.append((operation, latency))
+                if status not in EXPECTED_STATUSES[operation]:
+                    local_errors.append(operation)
+        with lock:
+            for operation, latency in local_samples:
+                samples.setdefault(operation, []).append(latency)
+            for operation in local_errors:
+                errors[operation] = errors.get(operation, 0) + 1
+
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    # Les métriques Firestore sont relevées à la fin du préchauffage
+    time.sleep(max(0.0, measure_from - time.perf_counter()))
+    before = scrape_metrics(host, port)
+    for thread in threads:
+        thread.join()
+    after = scrape_metrics(host, port)
+    return samples, errors, before, after
+
+
+# --- Métriques -----------------------------------------------------------------
+
+_METRIC_LINE = re.compile(r'^(elio_[a-z_]+)\{([^}]*)\} ([0-9.eE+-]+)$')
+
+
+def metrics_token():
+    return os.environ.setdefault('METRICS_TOKEN', 'benchmark')
+
+
+def scrape_metrics(host, port):
+    """Lire les compteurs Firestore de /metrics : {(métrique, endpoint, kind): valeur}"""
+    metrics_request = urllib.request.Request(
+        f'http://{host}:{port}/metrics', headers={'Authorization': f'Bearer {metrics_token()}'}
+    )
+    with urllib.request.urlopen(metrics_request, timeout=10) as response:
+        text = response.read().decode('utf-8')
+    values = {}
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+        values[(name, labels.get('endpoint'), labels.get('kind'))] = float(value)
+    return values
+
+
+def firestore_costs(before, after):
+    """Allers-retours, lectures et écritures Firestore moyens par requête et par route"""
+    def delta(key):
+        return after.get(key, 0.0) - before.get(key, 0.0)
+
+    costs = {}
+    for name, endpoint, _ in after:
+        if name != 'elio_firestore_round_trips_per_request_count':
+            continue
+        count = delta((name, endpoint, None))
+        if not count:
+            continue
+        operation = endpoint.split('.')[-1]
+        costs[operation] = {
+            'roundTrips': delta(('elio_firestore_round_trips_per_request_sum', endpoint, None)) / count,
+            'reads': delta(('elio_firestore_reads_per_request_sum', endpoint, None)) / count,
+            'writes': delta(('elio_firestore_writes_per_request_sum', endpoint, None)) / count
+        }
+    # Écritures différées (regroupement des update_user) faites hors requête
+    background_writes = delta(('elio_firestore_documents_total', 'background', 'write'))
+    return costs, background_writes
+
+
+# --- Rapport -------------------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Méthode du rang le plus proche
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def build_report(samples, errors, costs, background_writes, duration, args):
+    report = {
+        'date': datetime.utcnow().isoformat(),
+        'mix': args.mix,
+        'concurrency': args.concurrency,
+        'duration': duration,
+        'serverMode': args.server_mode,
+        'endpoints': {},
+        'backgroundWrites': background_writes
+    }
+    total = 0
+    for operation, latencies in sorted(samples.items()):
+        if not latencies:
+            continue
+        latencies.sort()
+        total += len(latencies)
+        report['endpoints'][operation] = {
+            'requests': len(latencies),
+            'throughput': len(latencies) / duration,
+            'errorRate': errors.get(operation, 0) / len(latencies),
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'firestore': costs.get(operation, {'roundTrips': 0.0, 'reads': 0.0, 'writes': 0.0})
+        }
+    report['throughput'] = total / duration
+    return report
+
+
+def print_report(report):
+    print(f"\nMélange '{report['mix']}', {report['concurrency']} workers, {report['duration']} s "
+          f"({report['serverMode']}) : {report['throughput']:.1f} req/s")
+    print(f"{'route':<22}{'req':>7}{'req/s':>8}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'RT/req':>8}{'R/req':>7}{'W/req':>7}")
+    for operation, stats in report['endpoints'].items():
+        firestore = stats['firestore']
+        print(f"{operation:<22}{stats['requests']:>7}{stats['throughput']:>8.1f}{stats['errorRate'] * 100:>7.2f}"
+              f"{stats['p50']:>9.1f}{stats['p95']:>9.1f}{stats['p99']:>9.1f}"
+              f"{firestore['roundTrips']:>8.2f}{firestore['reads']:>7.2f}{firestore['writes']:>7.2f}")
+    print(f"Écritures Firestore hors requête : {report['backgroundWrites']:.0f}")
+
+
+def compare(report, baseline):
+    """Retourner la liste des régressions par rapport à la référence"""
+    regressions = []
+    if report['throughput'] < baseline['throughput'] * (1 - THROUGHPUT_TOLERANCE):
+        regressions.append(f"débit global {report['throughput']:.1f} req/s < référence {baseline['throughput']:.1f}")
+    for operation, reference in baseline['endpoints'].items():
+        current = report['endpoints'].get(operation)
+        if current is None:
+            continue
+        for key in ('p95', 'p99'):
+            limit = max(reference[key] * (1 + LATENCY_TOLERANCE), reference[key] + LATENCY_NOISE_FLOOR_MS)
+            if current[key] > limit:
+                regressions.append(f"{operation}: {key} {current[key]:.1f} ms > {limit:.1f} ms")
+        for key in ('roundTrips', 'reads', 'writes'):
+            # Le coût Firestore est déterministe : toute hausse est une régression
+            if current['firestore'][key] > reference['firestore'][key] + FIRESTORE_OPS_TOLERANCE:
+                regressions.append(f"{operation}: {key}/requête {current['firestore'][key]:.2f} "
+                                   f"> référence {reference['firestore'][key]:.2f}")
+        if current['errorRate'] > reference['errorRate'] + ERROR_RATE_TOLERANCE:
+            regressions.append(f"{operation}: taux d'erreur {current['errorRate']:.2%}")
+    return regressions
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banc de charge du backend contre l'émulateur Firestore")
+    parser.add_argument('--mix', default='default', choices=sorted(TRAFFIC_MIXES), help='Mélange de trafic')
+    parser.add_argument('--duration', type=float, default=30, help='Durée de la mesure (secondes)')
+    parser.add_argument('--warmup', type=float, default=5, help='Préchauffage non mesuré (secondes)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Nombre de clients simultanés')
+    parser.add_argument('--server-mode', default='sync', choices=['sync', 'async'], help='Mode du serveur lancé')
+    parser.add_argument('--url', help='Utiliser un serveur déjà lancé (host:port, avec AUTH_STUB=1 et METRICS_TOKEN)')
+    parser.add_argument('--seed', type=int, default=42, help='Graine des tirages aléatoires')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--conversations', type=int, default=300)
+    parser.add_argument('--replacements', type=int, default=2000)
+    parser.add_argument('--establishments', type=int, default=200)
+    parser.add_argument('--no-reset', action='store_true', help="Ne pas vider l'émulateur avant le peuplement")
+    parser.add_argument('--output', help='Écrire le rapport JSON dans ce fichier')
+    parser.add_argument('--save-baseline', metavar='NAME', help='Enregistrer le rapport comme référence')
+    parser.add_argument('--baseline', metavar='NAME', help='Comparer à une référence (code de sortie 1 si régression)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        print("FIRESTORE_EMULATOR_HOST n'est pas défini : le banc ne tourne que contre l'émulateur")
+        return 2
+
+    from config.database import get_db
+    from config.firebase_config import app as firebase_app
+
+    rng = random.Random(args.seed)
+    if not args.no_reset:
+        reset_emulator(firebase_app.project_id)
+    print("Peuplement de l'émulateur...")
+    dataset = seed(get_db(), rng, args.users, args.conversations, args.replacements, args.establishments)
+
+    process = None
+    if args.url:
+        host, _, port = args.url.partition(':')
+        port = int(port)
+    else:
+        host, port = '127.0.0.1', free_port()
+        log_path = os.path.join(tempfile.gettempdir(), 'elio_benchmark_server.log')
+        print(f"Démarrage du serveur ({args.server_mode}) sur le port {port}, logs : {log_path}")
+        process = start_server(port, args.server_mode, log_path)
+
+    try:
+        print(f"Trafic '{args.mix}' : {args.warmup:.0f} s de préchauffage puis {args.duration:.0f} s de mesure")
+        samples, errors, before, after = run_traffic(
+            host, port, dataset, TRAFFIC_MIXES[args.mix], args.duration, args.warmup,
+            args.concurrency, args.seed, str(int(time.time()))
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    costs, background_writes = firestore_costs(before, after)
+    report = build_report(samples, errors, costs, background_writes, args.duration, args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save_baseline), 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Référence enregistrée : {baseline_path(args.save_baseline)}")
+    if args.baseline:
+        with open(baseline_path(args.baseline)) as f:
+            baseline = json.load(f)
+        if baseline['mix'] != report['mix'] or baseline['concurrency'] != report['concurrency']:
+            print("Attention : la référence a été mesurée avec un autre mélange ou une autre concurrence")
+        regressions = compare(report, baseline)
+        if regressions:
+            print("\nRégressions détectées :")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\nAucune régression par rapport à la référence")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import itertools
+import os
+import threading
+import time
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.services.firestore import client as firestore_client
+from google.cloud.firestore_v1.services.firestore.transports import grpc as firestore_grpc
+
+from config import settings
+from config.firebase_config import app as firebase_app
+from config.logging_config import get_logger
+
+# Options du canal gRPC : keepalive pour garder les connexions ouvertes entre
+# deux rafales de requêtes et messages volumineux pour les lectures groupées
+GRPC_CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.max_receive_message_length', 32 * 1024 * 1024),
+]
+
+WARMUP_COLLECTION = '_warmup'
+
+logger = get_logger('database')
+
+
+class FirestorePool:
+    """Pool de clients Firestore construits une seule fois par processus.
+
+    Chaque client possède son propre canal gRPC ; les requêtes sont réparties
+    en round-robin pour ne pas sérialiser tous les appels sur une connexion.
+    """
+
+    def __init__(self, size):
+        self._size = max(1, size)
+        self._clients = None
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._checkouts = [0] * self._size
+        self.warmup_seconds = None
+        self.warmup_errors = 0
+
+    def _ensure_clients(self):
+        if self._clients is None:
+            with self._lock:
+                if self._clients is None:
+                    self._clients = [self._build_client() for _ in range(self._size)]
+        return self._clients
+
+    def _build_client(self):
+        client = firestore.Client(
+            project=firebase_app.project_id,
+            credentials=firebase_app.credential.get_credential()
+        )
+        # L'émulateur utilise son propre canal non chiffré
+        if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+            return client
+        try:
+            # google-cloud-firestore ne permet pas de passer les options du canal :
+            # on installe le transport gRPC configuré avant le premier appel
+            channel = firestore_grpc.FirestoreGrpcTransport.create_channel(
+                client._target,
+                credentials=client._credentials,
+                options=GRPC_CHANNEL_OPTIONS
+            )
+            transport = firestore_grpc.FirestoreGrpcTransport(host=client._target, channel=channel)
+            client._transport = transport
+            client._firestore_api_internal = firestore_client.FirestoreClient(
+                transport=transport,
+                client_options=client._client_options
+            )
+        except Exception as e:
+            logger.warning("Canal gRPC par défaut utilisé", extra={'error': str(e)})
+        return client
+
+    def get(self):
+        clients = self._ensure_clients()
+        index = next(self._counter) % self._size
+        self._checkouts[index] += 1
+        return clients[index]
+
+    def warm_up(self):
+        """Établir les connexions (TLS, HTTP/2, jeton OAuth) de chaque client"""
+        start = time.perf_counter()
+        for client in self._ensure_clients():
+            try:
+                client.collection(WARMUP_COLLECTION).document('ping').get()
+            except Exception as e:
+                self.warmup_errors += 1
+                logger.warning("Échec du préchauffage Firestore", extra={'error': str(e)})
+        self.warmup_seconds = time.perf_counter() - start
+        logger.info("Connexions Firestore préchauffées", extra={'clients': self._size, 'seconds': round(self.warmup_seconds, 3)})
+        return self.warmup_seconds
+
+    def stats(self):
+        return {
+            'size': self._size,
+            'initialized': self._clients is not None,
+            'checkouts': list(self._checkouts),
+            'warmupSeconds': self.warmup_seconds,
+            'warmupErrors': self.warmup_errors
+        }
+
+
+pool = FirestorePool(settings.FIRESTORE_POOL_SIZE)
+
+
+def get_db():
+    """Client Firestore partagé à utiliser dans les routes et services"""
+    return pool.get()
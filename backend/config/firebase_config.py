@@ -1,5 +1,5 @@
 import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import credentials
 import os
 
 # Obtenir le chemin absolu du fichier de credentials
@@ -14,5 +14,3 @@ except ValueError:
     # Si non, initialiser avec les credentials
     cred = credentials.Certificate(cred_path)
     app = firebase_admin.initialize_app(cred)
-
-print("✅ Firebase initialisé avec succès") 
\ No newline at end of file
@@ -0,0 +1,131 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+
+from config import settings
+
+ROOT_LOGGER = 'elio'
+
+# Attributs standards d'un LogRecord : tout le reste provient de `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'route'}
+
+_listener = None
+_queue_handler = None
+
+
+def get_logger(name):
+    """Logger applicatif, rattaché au pipeline asynchrone"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par événement, avec les champs passés dans `extra`"""
+
+    def format(self, record):
+        event = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'route', None):
+            event['route'] = record.route
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                event[key] = value
+        if record.exc_info:
+            event['exception'] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class RouteSamplingFilter(logging.Filter):
+    """Ajouter la route courante et échantillonner les logs INFO/DEBUG par route.
+
+    Les WARNING et au-delà ne sont jamais échantillonnés.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self._rates = rates
+
+    def filter(self, record):
+        if not hasattr(record, 'route'):
+            record.route = request.endpoint if has_request_context() else None
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rates.get((record.route or '').rsplit('.', 1)[-1])
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui ne bloque jamais : les événements sont abandonnés si la file est pleine"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Figer le message sans formater l'événement.
+
+        QueueHandler.prepare formate l'événement dans le thread de la requête et
+        efface exc_info : le champ `exception` du format JSON était perdu. Seuls
+        les arguments du message sont résolus ici ; exc_info et les champs de
+        `extra` sont conservés et formatés par le thread d'écriture.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sampling(value):
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, _, rate = item.partition('=')
+        rates[route.strip()] = float(rate)
+    return rates
+
+
+def setup_logging():
+    """Installer le pipeline : QueueHandler côté requête, écriture dans un thread dédié"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(route)s] %(message)s'))
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(RouteSamplingFilter(parse_sampling(settings.LOG_SAMPLING)))
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(settings.LOG_LEVEL)
+    logger.addHandler(_queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    # Vider la file à l'arrêt du processus
+    atexit.register(_listener.stop)
+
+
+def dropped_events():
+    return _queue_handler.dropped if _queue_handler is not None else 0
@@ -0,0 +1,124 @@
+import os
+from dotenv import load_dotenv
+
+# Charger le fichier .env du backend s'il existe (sans écraser l'environnement)
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+# --- Vérification des tokens Firebase ---------------------------------------
+
+# Nombre maximal de tokens déjà vérifiés conservés en mémoire
+TOKEN_CACHE_SIZE = _env_int('TOKEN_CACHE_SIZE', 10000)
+# Intervalle minimal entre deux rafraîchissements des certificats Google (secondes)
+CERTS_MIN_REFRESH_INTERVAL = _env_int('CERTS_MIN_REFRESH_INTERVAL', 60)
+# Accepter des tokens factices "stub:<uid>" (benchmarks) ; ignoré hors émulateur Firestore
+AUTH_STUB = os.environ.get('AUTH_STUB', '0') == '1'
+
+# --- Serveur ------------------------------------------------------------------
+
+# 'sync' : serveur WSGI threadé de Flask ; 'async' : serveur ASGI (uvicorn)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync').lower()
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = _env_int('PORT', 5000)
+DEBUG = os.environ.get('FLASK_DEBUG', '0') == '1'
+# Nombre de processus uvicorn en mode async
+ASYNC_WORKERS = _env_int('ASYNC_WORKERS', 1)
+# Taille du pool de threads qui exécute les handlers Flask en mode async
+ASYNC_THREADS = _env_int('ASYNC_THREADS', 200)
+
+# --- Firestore ----------------------------------------------------------------
+
+# Nombre de clients Firestore (un canal gRPC chacun) partagés par le processus
+FIRESTORE_POOL_SIZE = _env_int('FIRESTORE_POOL_SIZE', 4)
+# Ouvrir les connexions au démarrage plutôt qu'à la première requête
+FIRESTORE_WARMUP = os.environ.get('FIRESTORE_WARMUP', '1') == '1'
+# Charger professions, spécialités et établissements en mémoire au démarrage
+REFERENCE_DATA_PRELOAD = os.environ.get('REFERENCE_DATA_PRELOAD', '1') == '1'
+
+# --- Limitation de débit ----------------------------------------------------
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+# 'memory' (seaux propres au processus) ou 'redis' (seaux partagés, paquet redis requis)
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory').lower()
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+# Limites par route, ex: "send_message=120/minute,search_replacements=20/minute"
+RATE_LIMITS = os.environ.get('RATE_LIMITS', '')
+
+# --- Écritures utilisateurs -------------------------------------------------
+
+# 'memory' : clés propres au processus, la garantie ne vaut qu'au sein d'un même worker
+# (un rejeu arrivé sur un autre worker est réexécuté) ; 'redis' : clés partagées entre
+# workers et instances, via RATE_LIMIT_REDIS_URL (paquet redis requis)
+IDEMPOTENCY_STORE = os.environ.get('IDEMPOTENCY_STORE', RATE_LIMIT_STORE).lower()
+# Nombre maximal de réponses conservées pour les en-têtes Idempotency-Key (stockage local)
+IDEMPOTENCY_CACHE_SIZE = _env_int('IDEMPOTENCY_CACHE_SIZE', 10000)
+# Durée de conservation d'une réponse idempotente (secondes)
+IDEMPOTENCY_TTL = _env_int('IDEMPOTENCY_TTL', 86400)
+# Fenêtre de regroupement des update_user d'un même utilisateur (ms, 0 = désactivé).
+# Activé, update_user répond avant l'écriture : un échec n'est alors visible que dans les logs
+USER_UPDATE_COALESCE_MS = _env_int('USER_UPDATE_COALESCE_MS', 0)
+
+# --- Fil de remplacements -----------------------------------------------------
+
+# Nombre maximal d'utilisateurs dont le fil est gardé en mémoire
+FEED_MAX_USERS = _env_int('FEED_MAX_USERS', 10000)
+# Délai après lequel le profil d'un utilisateur est relu (secondes)
+FEED_PROFILE_TTL = _env_int('FEED_PROFILE_TTL', 300)
+
+# --- Temps réel ---------------------------------------------------------------
+
+# Nombre maximal de flux SSE ouverts par processus (chacun occupe un thread)
+PUSH_MAX_STREAMS = _env_int('PUSH_MAX_STREAMS', 100)
+# Durée maximale d'un flux SSE (secondes) : en mode async, la déconnexion du client
+# n'est pas signalée au handler, le flux est donc fermé au plus tard après ce délai
+PUSH_MAX_STREAM_SECONDS = _env_int('PUSH_MAX_STREAM_SECONDS', 300)
+
+# --- Réponses ------------------------------------------------------------------
+
+# Taille minimale (octets) d'une réponse pour qu'elle soit compressée
+COMPRESSION_MIN_SIZE = _env_int('COMPRESSION_MIN_SIZE', 1024)
+COMPRESSION_GZIP_LEVEL = _env_int('COMPRESSION_GZIP_LEVEL', 6)
+# Qualité brotli (0-11) : 4 offre un bon compromis CPU / taille pour du JSON
+COMPRESSION_BROTLI_QUALITY = _env_int('COMPRESSION_BROTLI_QUALITY', 4)
+
+# --- Pièces jointes ------------------------------------------------------------
+
+# 'local' (disque, développement et tests) ou 'gcs' (Cloud Storage)
+ATTACHMENT_STORAGE = os.environ.get('ATTACHMENT_STORAGE', 'local').lower()
+ATTACHMENT_LOCAL_DIR = os.environ.get(
+    'ATTACHMENT_LOCAL_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
+)
+# Bucket GCS (vide = bucket par défaut du projet Firebase)
+ATTACHMENT_BUCKET = os.environ.get('ATTACHMENT_BUCKET', '')
+# Taille maximale d'une pièce jointe (octets)
+ATTACHMENT_MAX_SIZE = _env_int('ATTACHMENT_MAX_SIZE', 25 * 1024 * 1024)
+# Taille des morceaux d'upload conseillée aux clients (multiple de 256 Kio pour GCS)
+ATTACHMENT_CHUNK_SIZE = _env_int('ATTACHMENT_CHUNK_SIZE', 1024 * 1024)
+# Threads de traitement (métadonnées, miniatures)
+ATTACHMENT_WORKERS = _env_int('ATTACHMENT_WORKERS', 2)
+# Balayage des pièces jointes bloquées en `processing` ou jamais rattachées (secondes, 0 = désactivé)
+ATTACHMENT_SWEEP_INTERVAL = _env_int('ATTACHMENT_SWEEP_INTERVAL', 300)
+# Délai après lequel une pièce jointe en `processing` est relancée (secondes)
+ATTACHMENT_PROCESSING_TIMEOUT = _env_int('ATTACHMENT_PROCESSING_TIMEOUT', 600)
+# Durée de conservation d'une pièce jointe qu'aucun message n'a rattachée (secondes)
+ATTACHMENT_UNLINKED_TTL = _env_int('ATTACHMENT_UNLINKED_TTL', 24 * 3600)
+
+# --- Métriques ----------------------------------------------------------------
+
+# Jeton attendu par /metrics (en-tête "Authorization: Bearer <jeton>") ; vide = route désactivée
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# --- Logs ---------------------------------------------------------------------
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 'json' (une ligne JSON par événement) ou 'text'
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+# Taille de la file des logs ; au-delà, les événements sont abandonnés
+LOG_QUEUE_SIZE = _env_int('LOG_QUEUE_SIZE', 10000)
+# Échantillonnage des logs INFO/DEBUG par route, ex: "send_message=0.1,search_replacements=0.05"
+LOG_SAMPLING = os.environ.get('LOG_SAMPLING', '')
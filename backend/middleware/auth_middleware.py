@@ -1,6 +1,7 @@
 from functools import wraps
 from flask import request, jsonify
-from firebase_admin import auth
+from middleware.metrics import trace_stage
+from middleware.token_verifier import token_verifier
 
 def verify_firebase_token(f):
     @wraps(f)
@@ -11,7 +12,8 @@ def verify_firebase_token(f):
         try:
             auth_header = request.headers["Authorization"]
             token = auth_header.split(" ")[1]
-            decoded_token = auth.verify_id_token(token)
+            with trace_stage('token_verification'):
+                decoded_token = token_verifier.verify(token)
             request.user = decoded_token
             return f(*args, **kwargs)
         except Exception as e:
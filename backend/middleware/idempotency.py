@@ -0,0 +1,255 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request
+
+from config import settings
+from config.logging_config import get_logger
+
+logger = get_logger('idempotency')
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Durée maximale de réservation d'une clé en cours de traitement (Redis) : un worker
+# arrêté en plein traitement ne bloque pas la clé au-delà
+IN_FLIGHT_TTL = 60
+
+
+class IdempotencyCache:
+    """Cache LRU borné des réponses déjà servies, indexé par (uid, clé d'idempotence).
+
+    Une requête rejouée avec la même clé reçoit la réponse d'origine sans
+    être réexécutée. Une clé en cours de traitement est marquée pour
+    qu'un doublon concurrent ne s'exécute pas en parallèle.
+    """
+
+    def __init__(self, max_size=10000, ttl=86400):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+        self.evictions = 0
+
+    def begin(self, key, fingerprint):
+        """Retourner ('replay', réponse), ('conflict', None), ('busy', None) ou ('new', None)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                if entry[0] != fingerprint:
+                    self.conflicts += 1
+                    return 'conflict', None
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return 'replay', entry[1]
+            if key in self._in_flight:
+                return 'busy', None
+            self._in_flight[key] = fingerprint
+            self.misses += 1
+            return 'new', None
+
+    def complete(self, key, fingerprint, response):
+        """Enregistrer la réponse (statut, corps, type MIME) d'une requête terminée"""
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._entries[key] = (fingerprint, response, time.monotonic() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def abandon(self, key):
+        """Libérer une clé dont le traitement a échoué : la requête pourra être rejouée"""
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'inFlight': len(self._in_flight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'conflicts': self.conflicts,
+            'evictions': self.evictions
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Supprimer la réservation seulement si elle est toujours la nôtre
+_REDIS_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisIdempotencyCache:
+    """Réponses idempotentes partagées entre processus et instances (Redis).
+
+    Même interface que IdempotencyCache. Une clé est réservée par SET NX le
+    temps du traitement, puis remplacée par la réponse pour `ttl` secondes.
+    Si Redis est injoignable, le cache local au processus prend le relais.
+    """
+
+    def __init__(self, url, ttl=86400, fallback=None, prefix='elio:idem:'):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._release = self._client.register_script(_REDIS_RELEASE_SCRIPT)
+        self._ttl = ttl
+        self._fallback = fallback or IdempotencyCache(ttl=ttl)
+        self._prefix = prefix
+        # Valeurs de réservation posées par ce processus, pour abandon()
+        self._reservations = {}
+        self._lock = threading.Lock()
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+
+    def _redis_key(self, key):
+        uid, idempotency_key = key
+        return self._prefix + hashlib.sha256(f'{uid}\n{idempotency_key}'.encode('utf-8')).hexdigest()
+
+    def _on_error(self, e):
+        self.errors += 1
+        if self.errors % 100 == 1:
+            logger.warning("Redis indisponible, idempotence locale au processus", extra={'error': str(e)})
+
+    def begin(self, key, fingerprint):
+        redis_key = self._redis_key(key)
+        reservation = json.dumps({'inFlight': uuid.uuid4().hex, 'fingerprint': fingerprint})
+        try:
+            if self._client.set(redis_key, reservation, nx=True, ex=IN_FLIGHT_TTL):
+                with self._lock:
+                    self._reservations[key] = reservation
+                    self.misses += 1
+                return 'new', None
+            stored = self._client.get(redis_key)
+        except Exception as e:
+            self._on_error(e)
+            return self._fallback.begin(key, fingerprint)
+        if stored is None:
+            # Réservation expirée entre SET et GET : le client peut réessayer
+            return 'busy', None
+        entry = json.loads(stored)
+        if 'inFlight' in entry:
+            return 'busy', None
+        if entry['fingerprint'] != fingerprint:
+            with self._lock:
+                self.conflicts += 1
+            return 'conflict', None
+        with self._lock:
+            self.hits += 1
+        return 'replay', (entry['status'], base64.b64decode(entry['body']), entry['mimetype'])
+
+    def complete(self, key, fingerprint, response):
+        status, body, mimetype = response
+        with self._lock:
+            reservation = self._reservations.pop(key, None)
+        if reservation is None:
+            # Clé prise en charge par le cache local (Redis indisponible au début)
+            self._fallback.complete(key, fingerprint, response)
+            return
+        entry = {
+            'fingerprint': fingerprint, 'status': status,
+            'body': base64.b64encode(body).decode('ascii'), 'mimetype': mimetype
+        }
+        try:
+            self._client.set(self._redis_key(key), json.dumps(entry), ex=self._ttl)
+        except Exception as e:
+            self._on_error(e)
+
+    def abandon(self, key):
+        with self._lock:
+            reservation = self._reservations.pop(key, None)
+        if reservation is None:
+            self._fallback.abandon(key)
+            return
+        try:
+            self._release(keys=[self._redis_key(key)], args=[reservation])
+        except Exception as e:
+            self._on_error(e)
+
+    def stats(self):
+        return {
+            'inFlight': len(self._reservations),
+            'hits': self.hits,
+            'misses': self.misses,
+            'conflicts': self.conflicts,
+            'errors': self.errors,
+            'localSize': len(self._fallback)
+        }
+
+
+def _create_cache():
+    local_cache = IdempotencyCache(max_size=settings.IDEMPOTENCY_CACHE_SIZE, ttl=settings.IDEMPOTENCY_TTL)
+    if settings.IDEMPOTENCY_STORE == 'redis':
+        try:
+            return RedisIdempotencyCache(settings.RATE_LIMIT_REDIS_URL, settings.IDEMPOTENCY_TTL, local_cache)
+        except ImportError:
+            logger.warning("Paquet redis absent, idempotence locale au processus")
+    return local_cache
+
+
+idempotency_cache = _create_cache()
+
+
+def idempotent(f):
+    """Rejouer la réponse d'origine d'une requête répétée avec le même Idempotency-Key.
+
+    À placer après verify_firebase_token : la clé est propre à chaque utilisateur.
+    Les réponses 5xx ne sont pas conservées, la requête peut alors être retentée.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            return f(*args, **kwargs)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} is too long'}), 400
+
+        key = (request.user['uid'], idempotency_key)
+        fingerprint = hashlib.sha256(
+            request.method.encode('utf-8') + b' ' + request.path.encode('utf-8') + b'\n' + request.get_data()
+        ).hexdigest()
+
+        state, cached = idempotency_cache.begin(key, fingerprint)
+        if state == 'replay':
+            status, body, mimetype = cached
+            response = Response(body, status=status, mimetype=mimetype)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        if state == 'conflict':
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+        if state == 'busy':
+            return jsonify({'error': 'A request with this idempotency key is already in progress'}), 409
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_cache.abandon(key)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            idempotency_cache.abandon(key)
+        else:
+            idempotency_cache.complete(key, fingerprint, (response.status_code, response.get_data(), response.mimetype))
+        return response
+
+    return decorated_function
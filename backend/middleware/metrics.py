@@ -0,0 +1,173 @@
+import hmac
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, jsonify, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+from config import settings
+
+# Seaux adaptés à une API dont la plupart des appels durent de 1 ms à 1 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 500)
+
+REQUEST_LATENCY = Histogram(
+    'elio_request_duration_seconds', 'Durée de traitement des requêtes HTTP',
+    ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    'elio_stage_duration_seconds', "Durée des étapes internes d'une requête",
+    ['endpoint', 'stage'], buckets=LATENCY_BUCKETS
+)
+FIRESTORE_CALL_LATENCY = Histogram(
+    'elio_firestore_call_duration_seconds', 'Durée de chaque appel Firestore',
+    ['endpoint', 'operation'], buckets=LATENCY_BUCKETS
+)
+FIRESTORE_DOCUMENTS = Counter(
+    'elio_firestore_documents_total', 'Documents Firestore lus ou écrits',
+    ['endpoint', 'kind']
+)
+FIRESTORE_REQUEST_ROUND_TRIPS = Histogram(
+    'elio_firestore_round_trips_per_request', 'Allers-retours Firestore par requête',
+    ['endpoint'], buckets=COUNT_BUCKETS
+)
+FIRESTORE_REQUEST_READS = Histogram(
+    'elio_firestore_reads_per_request', 'Documents lus par requête',
+    ['endpoint'], buckets=COUNT_BUCKETS
+)
+FIRESTORE_REQUEST_WRITES = Histogram(
+    'elio_firestore_writes_per_request', 'Documents écrits par requête',
+    ['endpoint'], buckets=COUNT_BUCKETS
+)
+
+
+class FirestoreCall:
+    """Compteurs d'un appel Firestore, renseignés par l'appelant"""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.reads = 0
+        self.writes = 0
+
+
+class RequestStats:
+    def __init__(self):
+        self.round_trips = 0
+        self.reads = 0
+        self.writes = 0
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'background'
+
+
+@contextmanager
+def trace_firestore(operation):
+    """Chronométrer un aller-retour Firestore et compter les documents lus/écrits"""
+    call = FirestoreCall(operation)
+    start = time.perf_counter()
+    try:
+        yield call
+    finally:
+        endpoint = _endpoint()
+        FIRESTORE_CALL_LATENCY.labels(endpoint, operation).observe(time.perf_counter() - start)
+        if call.reads:
+            FIRESTORE_DOCUMENTS.labels(endpoint, 'read').inc(call.reads)
+        if call.writes:
+            FIRESTORE_DOCUMENTS.labels(endpoint, 'write').inc(call.writes)
+        stats = g.get('firestore_stats') if has_request_context() else None
+        if stats is not None:
+            stats.round_trips += 1
+            stats.reads += call.reads
+            stats.writes += call.writes
+
+
+@contextmanager
+def trace_stage(stage):
+    """Chronométrer une étape d'une requête (ex: vérification du token)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(_endpoint(), stage).observe(time.perf_counter() - start)
+
+
+class _StatsCollector:
+    """Exposer les statistiques des caches et du pool comme des gauges"""
+
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, name, stats_func):
+        self._sources[name] = stats_func
+
+    def collect(self):
+        for name, stats_func in self._sources.items():
+            try:
+                stats = stats_func()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    gauge = GaugeMetricFamily(f"elio_{name}_{_snake_case(key)}", f"{name}: {key}")
+                    gauge.add_metric([], value)
+                    yield gauge
+
+
+def _snake_case(name):
+    return ''.join('_' + c.lower() if c.isupper() else c for c in name)
+
+
+stats_collector = _StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(name, stats_func):
+    """Publier un dictionnaire de statistiques numériques sur /metrics"""
+    stats_collector.register(name, stats_func)
+
+
+def init_metrics(app):
+    """Installer le middleware de mesure et la route /metrics"""
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+        g.firestore_stats = RequestStats()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.get('request_start')
+        if start is None or request.endpoint == 'metrics':
+            return response
+        endpoint = request.endpoint or 'unknown'
+        method = request.method
+        status = str(response.status_code)
+        stats = g.get('firestore_stats')
+
+        def record():
+            # Appelé à la fermeture de la réponse : les réponses diffusées en flux
+            # (stream_with_context) font leurs appels Firestore après after_request
+            REQUEST_LATENCY.labels(endpoint, method, status).observe(time.perf_counter() - start)
+            if stats is not None:
+                FIRESTORE_REQUEST_ROUND_TRIPS.labels(endpoint).observe(stats.round_trips)
+                FIRESTORE_REQUEST_READS.labels(endpoint).observe(stats.reads)
+                FIRESTORE_REQUEST_WRITES.labels(endpoint).observe(stats.writes)
+
+        response.call_on_close(record)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        # Métriques internes : réservées au collecteur qui connaît METRICS_TOKEN
+        if not settings.METRICS_TOKEN:
+            return jsonify({'error': 'Not found'}), 404
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+            return jsonify({'error': 'Invalid metrics token'}), 401
+        return Response(generate_latest(REGISTRY), content_type=CONTENT_TYPE_LATEST)
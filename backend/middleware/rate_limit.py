@@ -0,0 +1,198 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import wraps
+
+from flask import jsonify, request
+from prometheus_client import Counter
+
+from config import settings
+from config.logging_config import get_logger
+
+logger = get_logger('rate_limit')
+
+RATE_LIMITED = Counter(
+    'elio_rate_limited_requests_total', 'Requêtes rejetées par la limitation de débit',
+    ['scope']
+)
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+
+def parse_limit(value):
+    """Convertir "60/minute" en (débit en jetons par seconde, capacité du seau)"""
+    count, _, period = value.strip().partition('/')
+    count = int(count)
+    seconds = _PERIODS[period.strip().rstrip('s')]
+    if count <= 0:
+        raise ValueError(f"Invalid rate limit: {value}")
+    return count / seconds, count
+
+
+def parse_overrides(value):
+    """Lire RATE_LIMITS, ex: "send_message=120/minute,search_replacements=20/minute" """
+    overrides = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        scope, _, limit = item.partition('=')
+        overrides[scope.strip()] = parse_limit(limit)
+    return overrides
+
+
+class TokenBucketStore(ABC):
+    """Interface d'un stockage de seaux à jetons"""
+
+    @abstractmethod
+    def consume(self, key, rate, capacity, cost=1):
+        """Retirer `cost` jetons du seau. Retourne (autorisé, secondes avant nouvel essai)"""
+
+    def stats(self):
+        return {}
+
+
+class LocalTokenBucketStore(TokenBucketStore):
+    """Seaux à jetons en mémoire du processus.
+
+    Un seau est un couple (jetons, horodatage) rempli paresseusement à chaque
+    appel. Les seaux redevenus pleins sont équivalents à des seaux absents :
+    ils sont supprimés lors d'un balayage périodique pour borner la mémoire.
+    """
+
+    def __init__(self, sweep_interval=1024):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._operations = 0
+        self.rejections = 0
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now, rate, capacity)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now, rate, capacity)
+                self.rejections += 1
+                allowed, retry_after = False, (cost - tokens) / rate
+
+            self._operations += 1
+            if self._operations % self._sweep_interval == 0:
+                self._sweep(now)
+        return allowed, retry_after
+
+    def _sweep(self, now):
+        full = [
+            key for key, (tokens, updated_at, rate, capacity) in self._buckets.items()
+            if tokens + (now - updated_at) * rate >= capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+
+    def stats(self):
+        return {'buckets': len(self._buckets), 'rejections': self.rejections}
+
+
+# Seau à jetons atomique côté Redis, horodaté par l'horloge du serveur Redis
+_REDIS_CONSUME_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisTokenBucketStore(TokenBucketStore):
+    """Seaux à jetons partagés entre processus et instances (Redis).
+
+    Si Redis est injoignable, la requête est autorisée et la décision est
+    déléguée au stockage local, pour ne jamais bloquer l'API sur le limiteur.
+    """
+
+    def __init__(self, url, fallback=None, prefix='elio:rl:'):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.2)
+        self._script = self._client.register_script(_REDIS_CONSUME_SCRIPT)
+        self._fallback = fallback or LocalTokenBucketStore()
+        self._prefix = prefix
+        self.errors = 0
+        self.rejections = 0
+
+    def consume(self, key, rate, capacity, cost=1):
+        try:
+            allowed, retry_after = self._script(keys=[self._prefix + key], args=[rate, capacity, cost])
+        except Exception as e:
+            self.errors += 1
+            if self.errors % 100 == 1:
+                logger.warning("Redis indisponible, limitation de débit locale", extra={'error': str(e)})
+            return self._fallback.consume(key, rate, capacity, cost)
+        if not allowed:
+            self.rejections += 1
+        return bool(allowed), float(retry_after)
+
+    def stats(self):
+        return {'errors': self.errors, 'rejections': self.rejections, **self._fallback.stats()}
+
+
+def _create_store():
+    if settings.RATE_LIMIT_STORE == 'redis':
+        try:
+            return RedisTokenBucketStore(settings.RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            logger.warning("Paquet redis absent, limitation de débit locale au processus")
+    return LocalTokenBucketStore()
+
+
+rate_limit_store = _create_store()
+_overrides = parse_overrides(settings.RATE_LIMITS)
+
+
+def rate_limit(limit, scope=None):
+    """Limiter le débit d'une route par utilisateur, ex: @rate_limit('60/minute').
+
+    À placer après verify_firebase_token : le seau est indexé par l'uid de
+    request.user. La limite peut être redéfinie par route via RATE_LIMITS.
+    """
+    def decorator(f):
+        name = scope or f.__name__
+        rate, capacity = _overrides.get(name) or parse_limit(limit)
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not settings.RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
+            allowed, retry_after = rate_limit_store.consume(f"{name}:{request.user['uid']}", rate, capacity)
+            if not allowed:
+                RATE_LIMITED.labels(name).inc()
+                response = jsonify({'error': 'Too many requests'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+import firebase_admin
+from firebase_admin import auth
+from google.auth import jwt
+
+from config import settings
+from config.logging_config import get_logger
+
+# Certificats publics utilisés par Firebase Auth pour signer les ID tokens
+CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+CLOCK_SKEW_SECONDS = 10
+
+logger = get_logger('auth')
+
+
+class PublicKeyCache:
+    """Cache en mémoire des certificats publics Google.
+
+    Les certificats sont rechargés par un thread d'arrière-plan avant leur
+    expiration (en-tête Cache-Control), de sorte que la vérification d'un
+    token ne bloque jamais sur un appel réseau, sauf au tout premier chargement.
+    """
+
+    def __init__(self, url=CERTS_URL, min_refresh_interval=60, fetch_timeout=5):
+        self._url = url
+        self._min_refresh_interval = min_refresh_interval
+        self._fetch_timeout = fetch_timeout
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._certs = None
+        self._refresh_at = 0
+        self._thread = None
+        self.refresh_count = 0
+        self.refresh_errors = 0
+
+    def get(self):
+        certs = self._certs
+        if certs is None:
+            with self._lock:
+                if self._certs is None:
+                    self._fetch()
+                certs = self._certs
+        self._ensure_refresher()
+        return certs
+
+    def request_refresh(self):
+        """Demander un rechargement anticipé (clé inconnue, rotation en cours)"""
+        self._wakeup.set()
+
+    def _fetch(self):
+        with urllib.request.urlopen(self._url, timeout=self._fetch_timeout) as response:
+            certs = json.loads(response.read().decode('utf-8'))
+            cache_control = response.headers.get('Cache-Control', '')
+        match = re.search(r'max-age=(\d+)', cache_control)
+        max_age = int(match.group(1)) if match else 3600
+        self._certs = certs
+        # Rafraîchir un peu avant l'expiration annoncée par Google
+        self._refresh_at = time.time() + max(self._min_refresh_interval, max_age * 0.9)
+        self.refresh_count += 1
+
+    def _ensure_refresher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refresh_loop, name='certs-refresher', daemon=True)
+                self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            delay = max(self._min_refresh_interval, self._refresh_at - time.time())
+            early = self._wakeup.wait(delay)
+            self._wakeup.clear()
+            try:
+                self._fetch()
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("Échec du rafraîchissement des certificats Firebase", extra={'error': str(e)})
+                self._refresh_at = time.time() + self._min_refresh_interval
+            if early:
+                # Éviter de marteler l'endpoint si des clés inconnues arrivent en rafale
+                time.sleep(self._min_refresh_interval)
+
+    @property
+    def key_ids(self):
+        return set(self._certs or ())
+
+
+class VerifiedTokenCache:
+    """Cache LRU borné des tokens déjà vérifiés, indexé par hash du token.
+
+    Chaque entrée expire au `exp` du token lui-même.
+    """
+
+    def __init__(self, max_size=10000):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, key, claims):
+        expires_at = claims.get('exp', 0)
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TokenVerifier:
+    """Vérification des ID tokens Firebase avec cache local"""
+
+    def __init__(self, cache_size=10000, min_refresh_interval=60):
+        self.cache = VerifiedTokenCache(cache_size)
+        self.public_keys = PublicKeyCache(min_refresh_interval=min_refresh_interval)
+        self._project_id = None
+
+    @property
+    def project_id(self):
+        if self._project_id is None:
+            self._project_id = firebase_admin.get_app().project_id
+        return self._project_id
+
+    def verify(self, token):
+        key = self.cache.key(token)
+        claims = self.cache.get(key)
+        if claims is not None:
+            return claims
+        claims = self._verify_signature(token)
+        self.cache.put(key, claims)
+        return claims
+
+    def _verify_signature(self, token):
+        # Benchmarks : tokens factices acceptés uniquement face à l'émulateur Firestore
+        if settings.AUTH_STUB and os.environ.get('FIRESTORE_EMULATOR_HOST'):
+            return _stub_claims(token)
+
+        # L'émulateur Auth émet des tokens non signés : déléguer au SDK
+        if os.environ.get('FIREBASE_AUTH_EMULATOR_HOST'):
+            return auth.verify_id_token(token)
+
+        kid = jwt.decode_header(token).get('kid')
+        certs = self.public_keys.get()
+        if kid not in certs:
+            # Rotation des clés : rafraîchir en arrière-plan et laisser le SDK vérifier
+            self.public_keys.request_refresh()
+            return auth.verify_id_token(token)
+
+        claims = jwt.decode(
+            token,
+            certs=certs,
+            audience=self.project_id,
+            clock_skew_in_seconds=CLOCK_SKEW_SECONDS
+        )
+        if claims.get('iss') != ISSUER_PREFIX + self.project_id:
+            raise ValueError('Firebase ID token has incorrect "iss" (issuer) claim.')
+        subject = claims.get('sub')
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError('Firebase ID token has an invalid "sub" (subject) claim.')
+        claims['uid'] = subject
+        return claims
+
+    def stats(self):
+        return {
+            'size': len(self.cache),
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+            'evictions': self.cache.evictions,
+            'expirations': self.cache.expirations,
+            'certsRefreshCount': self.public_keys.refresh_count,
+            'certsRefreshErrors': self.public_keys.refresh_errors
+        }
+
+
+def _stub_claims(token):
+    """Claims d'un token factice "stub:<uid>" (benchmarks contre l'émulateur)"""
+    prefix, _, uid = token.partition(':')
+    if prefix != 'stub' or not uid or len(uid) > 128:
+        raise ValueError('Invalid stub token, expected "stub:<uid>"')
+    return {'uid': uid, 'sub': uid, 'email': f'{uid}@bench.local', 'exp': int(time.time()) + 3600}
+
+
+token_verifier = TokenVerifier(
+    cache_size=settings.TOKEN_CACHE_SIZE,
+    min_refresh_interval=settings.CERTS_MIN_REFRESH_INTERVAL
+)
@@ -0,0 +1,211 @@
+import re
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, redirect, send_file
+from google.api_core.exceptions import FailedPrecondition
+from middleware.auth_middleware import verify_firebase_token
+from middleware.idempotency import idempotent
+from middleware.rate_limit import rate_limit
+from config import settings
+from config.database import get_db
+from config.logging_config import get_logger
+from middleware.metrics import trace_firestore
+from services.attachment_processor import attachment_processor, thumbnail_path
+from services.attachment_storage import IncompleteChunk, attachment_storage
+from services.conversation_cache import conversation_cache
+
+attachment_bp = Blueprint('attachment', __name__)
+logger = get_logger('routes.attachment')
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+MAX_FILE_NAME_LENGTH = 255
+# Champs internes jamais renvoyés aux clients
+PRIVATE_FIELDS = ('storagePath', 'uploadSession')
+# Seules les images matricielles décodées par Pillow sont affichables dans le navigateur ;
+# tout le reste (HTML, SVG...) est téléchargé, pour ne jamais s'exécuter sur l'origine de l'API
+INLINE_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+
+@attachment_bp.route('/attachments', methods=['POST'])
+@verify_firebase_token
+@rate_limit('30/minute')
+@idempotent
+def create_attachment():
+    try:
+        data = request.json
+        if not data or not data.get('conversationId') or not data.get('fileName'):
+            return jsonify({'error': 'Missing required fields. Required: [conversationId, fileName, size]'}), 400
+        size = data.get('size')
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            return jsonify({'error': 'size must be a positive integer'}), 400
+        if size > settings.ATTACHMENT_MAX_SIZE:
+            return jsonify({'error': f'Attachment too large, maximum is {settings.ATTACHMENT_MAX_SIZE} bytes'}), 413
+
+        db = get_db()
+        uid = request.user['uid']
+        conversation_id = data['conversationId']
+        is_participant = conversation_cache.is_participant(db, conversation_id, uid)
+        if is_participant is None:
+            return jsonify({'error': 'Conversation not found'}), 404
+        if not is_participant:
+            return jsonify({'error': 'User not authorized for this conversation'}), 403
+
+        attachment_ref = db.collection('attachments').document()
+        content_type = data.get('contentType') or 'application/octet-stream'
+        storage_path = f'{conversation_id}/{attachment_ref.id}'
+        now = datetime.utcnow()
+        attachment = {
+            'id': attachment_ref.id,
+            'ownerId': uid,
+            'conversationId': conversation_id,
+            'fileName': str(data['fileName'])[:MAX_FILE_NAME_LENGTH],
+            'contentType': content_type,
+            'size': size,
+            'received': 0,
+            'status': 'uploading',
+            'storagePath': storage_path,
+            'uploadSession': attachment_storage.create_upload(storage_path, content_type, size),
+            # Explicite pour que le balayage trouve les pièces jointes non rattachées
+            'messageId': None,
+            'createdAt': now,
+            'updatedAt': now
+        }
+        with trace_firestore('set') as call:
+            attachment_ref.set(attachment)
+            call.writes = 1
+
+        logger.info("Upload de pièce jointe ouvert", extra={'attachmentId': attachment_ref.id, 'size': size})
+        return jsonify({**_public(attachment), 'chunkSize': settings.ATTACHMENT_CHUNK_SIZE}), 201
+
+    except Exception:
+        logger.exception("Erreur lors de la création de la pièce jointe")
+        return jsonify({'error': 'Failed to create attachment'}), 500
+
+@attachment_bp.route('/attachments/<attachment_id>/content', methods=['PUT'])
+@verify_firebase_token
+@rate_limit('600/minute')
+def upload_chunk(attachment_id):
+    try:
+        db = get_db()
+        attachment_ref = db.collection('attachments').document(attachment_id)
+        with trace_firestore('get') as call:
+            snapshot = attachment_ref.get()
+            call.reads = 1
+        if not snapshot.exists:
+            return jsonify({'error': 'Attachment not found'}), 404
+        attachment = snapshot.to_dict()
+        if attachment['ownerId'] != request.user['uid']:
+            return jsonify({'error': 'Not authorized to upload this attachment'}), 403
+        if attachment['status'] != 'uploading':
+            return jsonify({'error': 'Upload already completed', 'status': attachment['status']}), 409
+
+        match = CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+        if not match:
+            return jsonify({'error': 'Content-Range header required: bytes <start>-<end>/<size>'}), 400
+        start, end, total = (int(value) for value in match.groups())
+        length = end - start + 1
+        if total != attachment['size'] or end < start or end >= total:
+            return jsonify({'error': 'Invalid Content-Range'}), 400
+        if start != attachment['received']:
+            # Morceau hors séquence (reprise après coupure) : le client repart de `received`
+            return jsonify({'error': 'Unexpected offset', 'received': attachment['received']}), 409
+        if request.content_length != length:
+            return jsonify({'error': 'Content-Length does not match Content-Range'}), 400
+        if length > settings.ATTACHMENT_CHUNK_SIZE:
+            return jsonify({'error': f'Chunk too large, maximum is {settings.ATTACHMENT_CHUNK_SIZE} bytes'}), 413
+        if end + 1 < total and length % attachment_storage.chunk_alignment:
+            return jsonify({'error': f'Chunk size must be a multiple of {attachment_storage.chunk_alignment} bytes'}), 400
+
+        # Le corps est copié par blocs vers le stockage, sans être chargé en mémoire
+        try:
+            received = attachment_storage.write_chunk(
+                attachment['storagePath'], attachment['uploadSession'], start, length, total, request.stream
+            )
+        except IncompleteChunk:
+            return jsonify({'error': 'Incomplete chunk', 'received': attachment['received']}), 400
+
+        update = {'received': received, 'updatedAt': datetime.utcnow()}
+        if received >= total:
+            update['status'] = 'processing'
+        try:
+            with trace_firestore('update') as call:
+                attachment_ref.update(update, option=db.write_option(last_update_time=snapshot.update_time))
+                call.writes = 1
+        except FailedPrecondition:
+            return jsonify({'error': 'Concurrent upload, retry'}), 409
+
+        attachment.update(update)
+        if received >= total:
+            attachment_processor.submit(db, attachment_id, attachment)
+            logger.info("Upload de pièce jointe terminé", extra={'attachmentId': attachment_id})
+        return jsonify(_public(attachment)), 200
+
+    except Exception:
+        logger.exception("Erreur lors de l'upload de la pièce jointe")
+        return jsonify({'error': 'Failed to upload attachment'}), 500
+
+@attachment_bp.route('/attachments/<attachment_id>', methods=['GET'])
+@verify_firebase_token
+@rate_limit('120/minute')
+def get_attachment(attachment_id):
+    try:
+        attachment, error = _readable_attachment(attachment_id)
+        if error:
+            return error
+        return jsonify(_public(attachment)), 200
+
+    except Exception:
+        logger.exception("Erreur lors de la lecture de la pièce jointe")
+        return jsonify({'error': 'Failed to get attachment'}), 500
+
+@attachment_bp.route('/attachments/<attachment_id>/content', methods=['GET'])
+@verify_firebase_token
+@rate_limit('120/minute')
+def download_attachment(attachment_id):
+    try:
+        attachment, error = _readable_attachment(attachment_id)
+        if error:
+            return error
+        if attachment['status'] != 'ready':
+            return jsonify({'error': 'Attachment not ready', 'status': attachment['status']}), 409
+
+        metadata = attachment.get('metadata') or {}
+        path, file_name = attachment['storagePath'], attachment['fileName']
+        inline = attachment['contentType'] in INLINE_CONTENT_TYPES and 'width' in metadata
+        mimetype = attachment['contentType'] if inline else 'application/octet-stream'
+        if request.args.get('thumbnail') == '1':
+            if not metadata.get('thumbnail'):
+                return jsonify({'error': 'No thumbnail for this attachment'}), 404
+            # Miniature produite par le backend : toujours un JPEG
+            path, mimetype, inline = thumbnail_path(path), 'image/jpeg', True
+
+        # GCS : redirection vers une URL signée, le fichier ne transite pas par l'API
+        url = attachment_storage.download_url(path, file_name, mimetype, inline)
+        if url:
+            return redirect(url)
+        response = send_file(
+            attachment_storage.local_path(path), mimetype=mimetype,
+            as_attachment=not inline, download_name=file_name, conditional=True
+        )
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+    except Exception:
+        logger.exception("Erreur lors du téléchargement de la pièce jointe")
+        return jsonify({'error': 'Failed to download attachment'}), 500
+
+def _readable_attachment(attachment_id):
+    """Lire une pièce jointe visible par l'utilisateur : propriétaire ou participant de la conversation"""
+    db = get_db()
+    with trace_firestore('get') as call:
+        snapshot = db.collection('attachments').document(attachment_id).get()
+        call.reads = 1
+    if not snapshot.exists:
+        return None, (jsonify({'error': 'Attachment not found'}), 404)
+    attachment = snapshot.to_dict()
+    uid = request.user['uid']
+    if attachment['ownerId'] != uid and not conversation_cache.is_participant(db, attachment['conversationId'], uid):
+        return None, (jsonify({'error': 'Not authorized to read this attachment'}), 403)
+    return attachment, None
+
+def _public(attachment):
+    return {key: value for key, value in attachment.items() if key not in PRIVATE_FIELDS}
@@ -1,12 +1,33 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from datetime import datetime, timedelta
+import base64
+import json
 from middleware.auth_middleware import verify_firebase_token
+from middleware.rate_limit import rate_limit
+from config.database import get_db
+from config.logging_config import get_logger
 from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from middleware.metrics import trace_firestore
+from middleware.response_layer import dumps
+from services.batch_writer import BatchWriter, MAX_BATCH_OPERATIONS
+from services.conversation_cache import conversation_cache
+from services.history_cache import history_cache
 
 message_bp = Blueprint('message', __name__)
+logger = get_logger('routes.message')
+
+REQUIRED_MESSAGE_FIELDS = ['conversationId', 'type', 'content']
+# Une opération est réservée à la mise à jour de la conversation dans chaque batch
+MAX_BULK_ITEMS = MAX_BATCH_OPERATIONS - 1
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+DEFAULT_INBOX_SIZE = 20
+MAX_MESSAGE_ATTACHMENTS = 10
 
 @message_bp.route('/send_message', methods=['POST'])
 @verify_firebase_token
+@rate_limit('60/minute')
 def send_message():
     try:
         data = request.json
@@ -14,87 +35,103 @@ def send_message():
             return jsonify({'error': 'Missing message data'}), 400
 
         # Validation des champs requis
-        required_fields = ['conversationId', 'type', 'content']
-        if not all(field in data for field in required_fields):
-            return jsonify({'error': f'Missing required fields. Required: {required_fields}'}), 400
+        if not all(field in data for field in REQUIRED_MESSAGE_FIELDS):
+            return jsonify({'error': f'Missing required fields. Required: {REQUIRED_MESSAGE_FIELDS}'}), 400
 
-        # Initialiser Firestore
-        db = firestore.client()
-        
-        # Créer le document message
-        message_data = {
-            'senderId': request.user['uid'],  # ID de l'utilisateur depuis le token
-            'createdAt': datetime.utcnow(),
-            'readBy': [request.user['uid']],  # Le sender a déjà lu le message
-            'type': data['type'],
-            'content': data['content'],
-            'conversationId': data['conversationId']
-        }
-
-        # Ajouter les pièces jointes si présentes
-        if 'attachments' in data:
-            message_data['attachments'] = data['attachments']
-
-        # Vérifier que la conversation existe
+        # Client Firestore partagé
+        db = get_db()
         conversation_ref = db.collection('conversations').document(data['conversationId'])
-        conversation = conversation_ref.get()
-        
-        if not conversation.exists:
-            return jsonify({'error': 'Conversation not found'}), 404
 
-        # Vérifier que l'utilisateur fait partie de la conversation
-        conversation_data = conversation.to_dict()
-        if request.user['uid'] not in conversation_data.get('participants', []):
+        # Vérifier l'appartenance à la conversation (cache mémoire, sans lecture en général)
+        participants = conversation_cache.get_participants(db, data['conversationId'])
+        if participants is None:
+            return jsonify({'error': 'Conversation not found'}), 404
+        if request.user['uid'] not in participants:
             return jsonify({'error': 'User not authorized for this conversation'}), 403
 
-        # Ajouter le message à la sous-collection messages de la conversation
+        attachments, error = _resolve_attachments(db, data, request.user['uid'])
+        if error:
+            return error
+
+        # Un seul horodatage pour le message et le lastMessage de la conversation
+        now = datetime.utcnow()
+
+        # Créer le document message
         message_ref = conversation_ref.collection('messages').document()
-        message_data['id'] = message_ref.id
-        message_ref.set(message_data)
-
-        # Mettre à jour la date de dernière activité de la conversation
-        conversation_ref.update({
-            'lastActivity': datetime.utcnow(),
-            'lastMessage': {
-                'content': data['content'][:100] if data['type'] == 'user' else 'Nouveau message',
-                'senderId': request.user['uid'],
-                'timestamp': datetime.utcnow()
-            }
+        message_data = _build_message(message_ref, data, request.user['uid'], now)
+        if attachments:
+            # À la suite des éventuelles pièces jointes en ligne des anciens clients
+            message_data['attachments'] = message_data.get('attachments', []) + [
+                _attachment_reference(attachment) for attachment, _ in attachments
+            ]
+
+        # Écriture du message et mise à jour de la conversation en un seul commit
+        batch = db.batch()
+        batch.set(message_ref, message_data)
+        batch.update(conversation_ref, {
+            'lastActivity': now,
+            'lastMessage': _build_last_message(message_data, 'Nouveau message'),
+            **_unread_increments(participants, {request.user['uid']}, 1)
         })
+        # Rattacher les pièces jointes au message ; la précondition empêche
+        # qu'une même pièce jointe soit rattachée à deux messages
+        for _, snapshot in attachments:
+            batch.update(
+                snapshot.reference, {'messageId': message_ref.id},
+                option=db.write_option(last_update_time=snapshot.update_time)
+            )
+        try:
+            with trace_firestore('commit') as call:
+                batch.commit()
+                call.writes = 2 + len(attachments)
+        except NotFound:
+            # La conversation a été supprimée depuis sa mise en cache
+            conversation_cache.invalidate(data['conversationId'])
+            return jsonify({'error': 'Conversation not found'}), 404
+        except FailedPrecondition:
+            return jsonify({'error': 'Attachment already used by another message'}), 409
 
-        print(f"✉️ Message envoyé dans la conversation {data['conversationId']}")
-        print(f"👤 Expéditeur: {request.user['uid']}")
-        print(f"📝 Type: {data['type']}")
+        history_cache.invalidate(data['conversationId'])
+        logger.info("Message envoyé", extra={
+            'conversationId': data['conversationId'],
+            'senderId': request.user['uid'],
+            'type': data['type']
+        })
 
         return jsonify(message_data), 201
 
-    except Exception as e:
-        print("❌ Erreur lors de l'envoi du message:", str(e))
+    except Exception:
+        logger.exception("Erreur lors de l'envoi du message")
         return jsonify({'error': 'Failed to send message'}), 500
 
 @message_bp.route('/delete_message/<conversation_id>/<message_id>', methods=['DELETE'])
 @verify_firebase_token
+@rate_limit('60/minute')
 def delete_message(conversation_id, message_id):
     try:
-        # Initialiser Firestore
-        db = firestore.client()
+        # Client Firestore partagé
+        db = get_db()
         
         # Références aux documents
         conversation_ref = db.collection('conversations').document(conversation_id)
         message_ref = conversation_ref.collection('messages').document(message_id)
         
-        # Vérifier que la conversation existe
-        conversation = conversation_ref.get()
-        if not conversation.exists:
+        # Vérifier que la conversation existe et que l'utilisateur en fait partie
+        is_participant = conversation_cache.is_participant(db, conversation_id, request.user['uid'])
+        if is_participant is None:
             return jsonify({'error': 'Conversation not found'}), 404
-            
-        # Vérifier que l'utilisateur fait partie de la conversation
-        conversation_data = conversation.to_dict()
-        if request.user['uid'] not in conversation_data.get('participants', []):
+        if not is_participant:
             return jsonify({'error': 'User not authorized for this conversation'}), 403
-            
-        # Récupérer le message
-        message = message_ref.get()
+
+        # Lire le message et la conversation en un seul aller-retour
+        with trace_firestore('get_all') as call:
+            snapshots = {snap.reference.path: snap for snap in db.get_all([message_ref, conversation_ref])}
+            call.reads = 2
+        message = snapshots[message_ref.path]
+        conversation = snapshots[conversation_ref.path]
+        if not conversation.exists:
+            conversation_cache.invalidate(conversation_id)
+            return jsonify({'error': 'Conversation not found'}), 404
         if not message.exists:
             return jsonify({'error': 'Message not found'}), 404
             
@@ -102,41 +139,646 @@ def delete_message(conversation_id, message_id):
         message_data = message.to_dict()
         if message_data['senderId'] != request.user['uid']:
             return jsonify({'error': 'Not authorized to delete this message'}), 403
+
+        result = None
+        conversation_data = conversation.to_dict() or {}
+        if not _is_last_message(conversation_data.get('lastMessage'), message_id, message_data):
+            # Cas courant : lastMessage inchangé. La précondition sur la conversation
+            # garantit qu'elle n'a pas été modifiée (envoi, autre suppression) depuis la lecture.
+            batch = db.batch()
+            batch.delete(message_ref)
+            batch.update(
+                conversation_ref,
+                {'updatedAt': datetime.utcnow(), **_unread_decrements(conversation_data, [message_data])},
+                option=db.write_option(last_update_time=conversation.update_time)
+            )
+            try:
+                with trace_firestore('commit') as call:
+                    batch.commit()
+                    call.writes = 2
+                result = 'deleted'
+            except FailedPrecondition:
+                result = None
+
+        if result is None:
+            # Le message était le dernier (ou la conversation a changé) :
+            # suppression et recalcul de lastMessage dans une même transaction
+            with trace_firestore('transaction') as call:
+                result = _delete_and_recompute(db.transaction(), conversation_ref, message_ref, request.user['uid'])
+                call.reads, call.writes = 2, 2
+
+        if result == 'conversation_not_found':
+            conversation_cache.invalidate(conversation_id)
+            return jsonify({'error': 'Conversation not found'}), 404
+        if result == 'message_not_found':
+            return jsonify({'error': 'Message not found'}), 404
+        if result == 'forbidden':
+            return jsonify({'error': 'Not authorized to delete this message'}), 403
+        history_cache.invalidate(conversation_id)
             
-        # Supprimer le message
-        message_ref.delete()
-        
-        # Si c'était le dernier message de la conversation, mettre à jour lastMessage
-        last_message = None
-        messages = conversation_ref.collection('messages').order_by(
-            'createdAt', direction=firestore.Query.DESCENDING
-        ).limit(1).stream()
-        
-        for msg in messages:
-            last_message = msg.to_dict()
-            break
-            
-        if last_message:
-            conversation_ref.update({
-                'lastMessage': {
-                    'content': last_message.get('content', '')[:100] if last_message.get('type') == 'user' else 'Message précédent',
-                    'senderId': last_message.get('senderId'),
-                    'timestamp': last_message.get('createdAt')
-                }
-            })
-        else:
-            # Aucun message restant
-            conversation_ref.update({
-                'lastMessage': None
-            })
-            
-        print(f"🗑️ Message supprimé")
-        print(f"💬 Conversation: {conversation_id}")
-        print(f"📝 Message ID: {message_id}")
-        print(f"👤 Supprimé par: {request.user['uid']}")
+        logger.info("Message supprimé", extra={
+            'conversationId': conversation_id,
+            'messageId': message_id,
+            'deletedBy': request.user['uid']
+        })
         
         return jsonify({'message': 'Message deleted successfully'}), 200
         
-    except Exception as e:
-        print("❌ Erreur lors de la suppression du message:", str(e))
-        return jsonify({'error': 'Failed to delete message'}), 500 
\ No newline at end of file
+    except Exception:
+        logger.exception("Erreur lors de la suppression du message")
+        return jsonify({'error': 'Failed to delete message'}), 500 
+
+
+@message_bp.route('/send_messages', methods=['POST'])
+@verify_firebase_token
+@rate_limit('10/minute')
+def send_messages():
+    try:
+        items, error = _get_bulk_items(request.json)
+        if error:
+            return error
+
+        uid = request.user['uid']
+        db = get_db()
+        results = [None] * len(items)
+        memberships = {}
+        groups = {}
+        now = datetime.utcnow()
+
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not all(field in item for field in REQUIRED_MESSAGE_FIELDS):
+                results[index] = _item_error(index, 400, f'Missing required fields. Required: {REQUIRED_MESSAGE_FIELDS}')
+                continue
+            if 'attachmentIds' in item:
+                results[index] = _item_error(index, 400, 'attachmentIds are only supported by send_message')
+                continue
+            conversation_id = item['conversationId']
+            status = _membership_status(db, memberships, conversation_id, uid)
+            if status:
+                results[index] = status(index)
+                continue
+            message_ref = db.collection('conversations').document(conversation_id).collection('messages').document()
+            # Décalage d'une microseconde par message pour conserver l'ordre d'envoi
+            message_data = _build_message(message_ref, item, uid, now + timedelta(microseconds=index))
+            groups.setdefault(conversation_id, []).append((index, message_ref, message_data))
+
+        # Un groupe par conversation : messages + mise à jour de lastMessage, atomiques
+        writer = BatchWriter(db)
+        for conversation_id, entries in groups.items():
+            last = entries[-1][2]
+            participants = conversation_cache.get_participants(db, conversation_id) or ()
+            operations = [('set', message_ref, message_data) for _, message_ref, message_data in entries]
+            operations.append(('update', db.collection('conversations').document(conversation_id), {
+                'lastActivity': last['createdAt'],
+                'lastMessage': _build_last_message(last, 'Nouveau message'),
+                **_unread_increments(participants, {uid}, len(entries))
+            }))
+            writer.add(conversation_id, operations)
+        failures = writer.commit()
+
+        for conversation_id, entries in groups.items():
+            failure = failures.get(conversation_id)
+            if isinstance(failure, NotFound):
+                conversation_cache.invalidate(conversation_id)
+            elif failure is None:
+                history_cache.invalidate(conversation_id)
+            for index, _, message_data in entries:
+                if failure is None:
+                    results[index] = {'index': index, 'status': 201, 'message': message_data}
+                else:
+                    results[index] = _item_failure(index, failure)
+
+        logger.info("Envoi groupé", extra={'items': len(items), 'succeeded': sum(r['status'] == 201 for r in results)})
+        return jsonify(_bulk_response(results)), 200
+
+    except Exception:
+        logger.exception("Erreur lors de l'envoi groupé des messages")
+        return jsonify({'error': 'Failed to send messages'}), 500
+
+@message_bp.route('/delete_messages', methods=['POST'])
+@verify_firebase_token
+@rate_limit('10/minute')
+def delete_messages():
+    try:
+        items, error = _get_bulk_items(request.json)
+        if error:
+            return error
+
+        uid = request.user['uid']
+        db = get_db()
+        results = [None] * len(items)
+        targets = _resolve_message_items(db, items, uid, results)
+        if not targets:
+            return jsonify(_bulk_response(results)), 200
+
+        # Lire tous les messages et leurs conversations en un seul aller-retour
+        snapshots = _get_all_by_path(db, targets)
+        now = datetime.utcnow()
+        writer = BatchWriter(db)
+        groups = {}
+
+        for conversation_id, entries in targets.items():
+            conversation_ref = db.collection('conversations').document(conversation_id)
+            conversation = snapshots[conversation_ref.path]
+            if not conversation.exists:
+                conversation_cache.invalidate(conversation_id)
+                for index, _ in entries:
+                    results[index] = _item_error(index, 404, 'Conversation not found')
+                continue
+
+            deletable = {}
+            for index, message_ref in entries:
+                message = snapshots[message_ref.path]
+                if not message.exists:
+                    results[index] = _item_error(index, 404, 'Message not found')
+                elif (message.to_dict() or {}).get('senderId') != uid:
+                    results[index] = _item_error(index, 403, 'Not authorized to delete this message')
+                else:
+                    deletable.setdefault(message_ref.id, (message_ref, message.to_dict(), []))[2].append(index)
+            if not deletable:
+                continue
+
+            conversation_data = conversation.to_dict() or {}
+            update = {'updatedAt': now, **_unread_decrements(conversation_data, [data for _, data, _ in deletable.values()])}
+            last_message = conversation_data.get('lastMessage')
+            if any(_is_last_message(last_message, message_id, data) for message_id, (_, data, _) in deletable.items()):
+                update['lastMessage'] = _previous_last_message(conversation_ref, set(deletable))
+
+            operations = [('delete', message_ref) for message_ref, _, _ in deletable.values()]
+            # La précondition détecte toute modification concurrente de la conversation
+            operations.append(('update', conversation_ref, update, {
+                'option': db.write_option(last_update_time=conversation.update_time)
+            }))
+            writer.add(conversation_id, operations)
+            groups[conversation_id] = [index for _, _, indices in deletable.values() for index in indices]
+
+        failures = writer.commit()
+        for conversation_id, indices in groups.items():
+            failure = failures.get(conversation_id)
+            if failure is None:
+                history_cache.invalidate(conversation_id)
+            for index in indices:
+                results[index] = {'index': index, 'status': 200} if failure is None else _item_failure(index, failure)
+
+        logger.info("Suppression groupée", extra={'items': len(items), 'succeeded': sum(r['status'] == 200 for r in results)})
+        return jsonify(_bulk_response(results)), 200
+
+    except Exception:
+        logger.exception("Erreur lors de la suppression groupée des messages")
+        return jsonify({'error': 'Failed to delete messages'}), 500
+
+@message_bp.route('/mark_as_read', methods=['POST'])
+@verify_firebase_token
+@rate_limit('120/minute')
+def mark_as_read():
+    try:
+        items, error = _get_bulk_items(request.json)
+        if error:
+            return error
+
+        uid = request.user['uid']
+        db = get_db()
+        results = [None] * len(items)
+        targets = _resolve_message_items(db, items, uid, results)
+        if not targets:
+            return jsonify(_bulk_response(results)), 200
+
+        snapshots = _get_all_by_path(db, targets)
+        writer = BatchWriter(db)
+        groups = {}
+
+        for conversation_id, entries in targets.items():
+            conversation_ref = db.collection('conversations').document(conversation_id)
+            conversation = snapshots[conversation_ref.path]
+            if not conversation.exists:
+                conversation_cache.invalidate(conversation_id)
+                for index, _ in entries:
+                    results[index] = _item_error(index, 404, 'Conversation not found')
+                continue
+
+            unread = {}
+            for index, message_ref in entries:
+                message = snapshots[message_ref.path]
+                if not message.exists:
+                    results[index] = _item_error(index, 404, 'Message not found')
+                elif uid in ((message.to_dict() or {}).get('readBy') or []):
+                    # Déjà lu : aucune écriture nécessaire
+                    results[index] = {'index': index, 'status': 200}
+                else:
+                    unread.setdefault(message_ref.id, (message_ref, message.update_time, []))[2].append(index)
+            if not unread:
+                continue
+
+            # Les préconditions empêchent deux lectures concurrentes de décrémenter deux fois
+            # le compteur, recalculé à partir de la valeur lue
+            operations = [
+                ('update', message_ref, {'readBy': firestore.ArrayUnion([uid])},
+                 {'option': db.write_option(last_update_time=update_time)})
+                for message_ref, update_time, _ in unread.values()
+            ]
+            operations.append(('update', conversation_ref,
+                               _unread_decrement(conversation.to_dict() or {}, uid, len(unread)),
+                               {'option': db.write_option(last_update_time=conversation.update_time)}))
+            writer.add(conversation_id, operations)
+            groups[conversation_id] = [index for _, _, indices in unread.values() for index in indices]
+
+        failures = writer.commit()
+        for conversation_id, indices in groups.items():
+            failure = failures.get(conversation_id)
+            if failure is None:
+                history_cache.invalidate(conversation_id)
+            for index in indices:
+                results[index] = {'index': index, 'status': 200} if failure is None else _item_failure(index, failure)
+
+        return jsonify(_bulk_response(results)), 200
+
+    except Exception:
+        logger.exception("Erreur lors du marquage des messages comme lus")
+        return jsonify({'error': 'Failed to mark messages as read'}), 500
+
+@message_bp.route('/get_messages/<conversation_id>', methods=['GET'])
+@verify_firebase_token
+@rate_limit('120/minute')
+def get_messages(conversation_id):
+    try:
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+        cursor = request.args.get('cursor')
+        try:
+            after = _decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        db = get_db()
+        is_participant = conversation_cache.is_participant(db, conversation_id, request.user['uid'])
+        if is_participant is None:
+            return jsonify({'error': 'Conversation not found'}), 404
+        if not is_participant:
+            return jsonify({'error': 'User not authorized for this conversation'}), 403
+
+        # Première page : servie depuis le cache si possible
+        generation = None
+        if after is None:
+            cached = history_cache.get(conversation_id, limit)
+            if cached is not None:
+                return Response(cached, mimetype='application/json')
+            generation = history_cache.generation(conversation_id)
+
+        # Pagination par clé sur (createdAt, id), du plus récent au plus ancien
+        query = db.collection('conversations').document(conversation_id).collection('messages').order_by(
+            'createdAt', direction=firestore.Query.DESCENDING
+        ).order_by('__name__', direction=firestore.Query.DESCENDING).limit(limit + 1)
+        if after is not None:
+            query = query.start_after(list(after))
+
+        return Response(
+            stream_with_context(_stream_message_page(query, limit, conversation_id, generation)),
+            mimetype='application/json'
+        )
+
+    except Exception:
+        logger.exception("Erreur lors de la lecture de l'historique")
+        return jsonify({'error': 'Failed to get messages'}), 500
+
+@message_bp.route('/inbox', methods=['GET'])
+@verify_firebase_token
+@rate_limit('120/minute')
+def get_inbox():
+    try:
+        try:
+            limit = int(request.args.get('limit', DEFAULT_INBOX_SIZE))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+        cursor = request.args.get('cursor')
+        try:
+            after = _decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        uid = request.user['uid']
+        db = get_db()
+
+        # Une seule requête par page : les compteurs de non-lus sont dénormalisés
+        # dans la conversation, aucun parcours des sous-collections messages
+        query = db.collection('conversations').where(
+            'participants', 'array_contains', uid
+        ).order_by(
+            'lastActivity', direction=firestore.Query.DESCENDING
+        ).order_by('__name__', direction=firestore.Query.DESCENDING).limit(limit + 1)
+        if after is not None:
+            query = query.start_after(list(after))
+
+        conversations = []
+        has_more = False
+        last = None
+        with trace_firestore('query') as call:
+            for doc in query.stream():
+                if len(conversations) == limit:
+                    has_more = True
+                    break
+                data = doc.to_dict() or {}
+                unread_counts = data.pop('unreadCounts', None) or {}
+                data['id'] = doc.id
+                data['unreadCount'] = max(0, unread_counts.get(uid, 0))
+                conversations.append(data)
+                last = (data.get('lastActivity'), doc.id)
+            call.reads = max(1, len(conversations) + has_more)
+
+        next_cursor = _encode_cursor(*last) if has_more else None
+        return Response(dumps({'conversations': conversations, 'nextCursor': next_cursor}), mimetype='application/json')
+
+    except Exception:
+        logger.exception("Erreur lors de la lecture de la boîte de réception")
+        return jsonify({'error': 'Failed to get inbox'}), 500
+
+def _build_message(message_ref, data, uid, created_at):
+    """Construire le document d'un nouveau message"""
+    message_data = {
+        'id': message_ref.id,
+        'senderId': uid,  # ID de l'utilisateur depuis le token
+        'createdAt': created_at,
+        'readBy': [uid],  # Le sender a déjà lu le message
+        'type': data['type'],
+        'content': data['content'],
+        'conversationId': data['conversationId']
+    }
+    # Pièces jointes en ligne des anciens clients, recopiées telles quelles
+    if 'attachments' in data:
+        message_data['attachments'] = data['attachments']
+    return message_data
+
+def _attachment_reference(attachment):
+    """Référence d'une pièce jointe téléversée, au format de TextMessage.attachments (src/types/messages.ts)"""
+    content_type = attachment['contentType']
+    if content_type.startswith('image/'):
+        attachment_type = 'image'
+    elif content_type == 'application/pdf':
+        attachment_type = 'pdf'
+    else:
+        attachment_type = 'document'
+    reference = {
+        'type': attachment_type,
+        # URL stable de l'API ; le contenu est servi (ou redirigé vers une URL signée) après authentification
+        'url': f"/attachments/{attachment['id']}/content",
+        'name': attachment['fileName'],
+        'size': attachment['size'],
+        'mimeType': content_type,
+        'id': attachment['id']
+    }
+    if attachment.get('metadata'):
+        reference['metadata'] = attachment['metadata']
+    return reference
+
+def _resolve_attachments(db, data, uid):
+    """Lire en un seul get_all les pièces jointes référencées par `attachmentIds`"""
+    attachment_ids = data.get('attachmentIds') or []
+    if not isinstance(attachment_ids, list) or not all(isinstance(i, str) and i for i in attachment_ids):
+        return None, (jsonify({'error': 'attachmentIds must be a list of IDs'}), 400)
+    attachment_ids = list(dict.fromkeys(attachment_ids))
+    if len(attachment_ids) > MAX_MESSAGE_ATTACHMENTS:
+        return None, (jsonify({'error': f'Too many attachments, maximum is {MAX_MESSAGE_ATTACHMENTS}'}), 400)
+    if not attachment_ids:
+        return [], None
+
+    refs = [db.collection('attachments').document(attachment_id) for attachment_id in attachment_ids]
+    with trace_firestore('get_all') as call:
+        snapshots = {snap.id: snap for snap in db.get_all(refs)}
+        call.reads = len(refs)
+
+    attachments = []
+    for attachment_id in attachment_ids:
+        snapshot = snapshots.get(attachment_id)
+        attachment = snapshot.to_dict() if snapshot is not None and snapshot.exists else None
+        if attachment is None:
+            return None, (jsonify({'error': f'Attachment not found: {attachment_id}'}), 404)
+        if attachment['ownerId'] != uid or attachment['conversationId'] != data['conversationId']:
+            return None, (jsonify({'error': f'Attachment not usable in this conversation: {attachment_id}'}), 403)
+        if attachment['status'] != 'ready':
+            return None, (jsonify({'error': f'Attachment not ready: {attachment_id}', 'status': attachment['status']}), 409)
+        if attachment.get('messageId'):
+            return None, (jsonify({'error': f'Attachment already used by another message: {attachment_id}'}), 409)
+        attachments.append((attachment, snapshot))
+    return attachments, None
+
+def _build_last_message(message, fallback_label):
+    """Résumé d'un message stocké dans le champ lastMessage de la conversation"""
+    return {
+        'messageId': message.get('id'),
+        'content': message.get('content', '')[:100] if message.get('type') == 'user' else fallback_label,
+        'senderId': message.get('senderId'),
+        'timestamp': message.get('createdAt')
+    }
+
+def _is_last_message(last_message, message_id, message_data):
+    """Vérifier si le message correspond au lastMessage stocké de la conversation"""
+    if not last_message:
+        return False
+    if last_message.get('messageId'):
+        return last_message['messageId'] == message_id
+    # Anciens lastMessage sans messageId : comparer expéditeur et horodatage
+    return (
+        last_message.get('senderId') == message_data.get('senderId')
+        and last_message.get('timestamp') == message_data.get('createdAt')
+    )
+
+def _unread_field(uid):
+    """Chemin du compteur de messages non lus d'un participant"""
+    return firestore.FieldPath('unreadCounts', uid).to_api_repr()
+
+def _unread_increments(participants, excluded_uids, amount):
+    """Incrémenter le compteur de non-lus des participants (hors expéditeur)"""
+    return {
+        _unread_field(participant): firestore.Increment(amount)
+        for participant in participants if participant not in excluded_uids
+    }
+
+def _unread_decrements(conversation_data, messages):
+    """Décrémenter le compteur des participants qui n'avaient pas lu les messages supprimés.
+
+    La nouvelle valeur est calculée à partir du compteur lu (jamais sous zéro) : l'appelant
+    doit écrire sous précondition ou dans une transaction sur cette même lecture.
+    """
+    decrements = {}
+    for participant in conversation_data.get('participants') or []:
+        count = sum(
+            1 for message in messages
+            if participant != message.get('senderId') and participant not in (message.get('readBy') or [])
+        )
+        if count:
+            decrements.update(_unread_decrement(conversation_data, participant, count))
+    return decrements
+
+def _unread_decrement(conversation_data, uid, count):
+    """Compteur de non-lus d'un participant diminué de `count`, borné à zéro"""
+    current = (conversation_data.get('unreadCounts') or {}).get(uid, 0)
+    return {_unread_field(uid): max(0, current - count)}
+
+def _get_bulk_items(data):
+    """Extraire la liste `messages` d'une requête groupée"""
+    items = (data or {}).get('messages') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'error': 'Missing messages array'}), 400)
+    if len(items) > MAX_BULK_ITEMS:
+        return None, (jsonify({'error': f'Too many messages, maximum is {MAX_BULK_ITEMS}'}), 400)
+    return items, None
+
+def _membership_status(db, memberships, conversation_id, uid):
+    """Retourner une fabrique de résultat d'erreur si l'utilisateur n'a pas accès"""
+    if conversation_id not in memberships:
+        memberships[conversation_id] = conversation_cache.is_participant(db, conversation_id, uid)
+    if memberships[conversation_id] is None:
+        return lambda index: _item_error(index, 404, 'Conversation not found')
+    if not memberships[conversation_id]:
+        return lambda index: _item_error(index, 403, 'User not authorized for this conversation')
+    return None
+
+def _resolve_message_items(db, items, uid, results):
+    """Valider des éléments {conversationId, messageId} et les regrouper par conversation"""
+    memberships = {}
+    targets = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('conversationId') or not item.get('messageId'):
+            results[index] = _item_error(index, 400, 'Missing required fields. Required: [conversationId, messageId]')
+            continue
+        status = _membership_status(db, memberships, item['conversationId'], uid)
+        if status:
+            results[index] = status(index)
+            continue
+        message_ref = db.collection('conversations').document(item['conversationId']).collection('messages').document(item['messageId'])
+        targets.setdefault(item['conversationId'], []).append((index, message_ref))
+    return targets
+
+def _get_all_by_path(db, targets):
+    """Lire en un seul get_all les messages ciblés et leurs conversations"""
+    refs = {}
+    for conversation_id, entries in targets.items():
+        conversation_ref = db.collection('conversations').document(conversation_id)
+        refs[conversation_ref.path] = conversation_ref
+        for _, message_ref in entries:
+            refs[message_ref.path] = message_ref
+    with trace_firestore('get_all') as call:
+        snapshots = {snap.reference.path: snap for snap in db.get_all(list(refs.values()))}
+        call.reads = len(refs)
+    return snapshots
+
+def _previous_last_message(conversation_ref, excluded_ids):
+    """Trouver le message le plus récent qui ne fait pas partie des messages supprimés"""
+    recent = conversation_ref.collection('messages').order_by(
+        'createdAt', direction=firestore.Query.DESCENDING
+    ).limit(len(excluded_ids) + 1)
+    with trace_firestore('query') as call:
+        messages = list(recent.stream())
+        call.reads = max(1, len(messages))
+    for msg in messages:
+        if msg.id not in excluded_ids:
+            previous = msg.to_dict()
+            previous.setdefault('id', msg.id)
+            return _build_last_message(previous, 'Message précédent')
+    return None
+
+def _item_error(index, status, error):
+    return {'index': index, 'status': status, 'error': error}
+
+def _item_failure(index, error):
+    """Traduire l'échec d'un commit en résultat par élément"""
+    if isinstance(error, NotFound):
+        return _item_error(index, 404, 'Conversation or message not found')
+    if isinstance(error, FailedPrecondition):
+        return _item_error(index, 409, 'Conversation changed concurrently, retry')
+    return _item_error(index, 500, 'Write failed')
+
+def _bulk_response(results):
+    succeeded = sum(1 for result in results if result['status'] < 400)
+    return {'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded}
+
+def _stream_message_page(query, limit, conversation_id, generation):
+    """Générer le JSON d'une page de messages au fil de la lecture Firestore"""
+    # La première page est aussi conservée pour le cache
+    chunks = [] if generation is not None else None
+
+    def emit(chunk):
+        if chunks is not None:
+            chunks.append(chunk)
+        return chunk
+
+    try:
+        yield emit('{"messages":[')
+        count = 0
+        last = None
+        has_more = False
+        with trace_firestore('query') as call:
+            for doc in query.stream():
+                if count == limit:
+                    has_more = True
+                    break
+                message = doc.to_dict()
+                message.setdefault('id', doc.id)
+                yield emit((',' if count else '') + dumps(message))
+                last = (message.get('createdAt'), doc.id)
+                count += 1
+            call.reads = max(1, count + has_more)
+        next_cursor = _encode_cursor(*last) if has_more else None
+        yield emit('],"nextCursor":' + json.dumps(next_cursor) + '}')
+    except Exception:
+        # Les en-têtes sont déjà envoyés : on ne peut que tronquer la réponse
+        logger.exception("Erreur pendant le streaming de l'historique", extra={'conversationId': conversation_id})
+        return
+
+    if chunks is not None:
+        history_cache.put(conversation_id, limit, ''.join(chunks), generation)
+
+def _encode_cursor(created_at, message_id):
+    """Curseur opaque encodant la position (createdAt, id) du dernier message renvoyé"""
+    payload = json.dumps({'t': created_at.isoformat() if created_at else None, 'id': message_id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        created_at = datetime.fromisoformat(payload['t']) if payload['t'] else None
+        return created_at, payload['id']
+    except (KeyError, TypeError, UnicodeError, json.JSONDecodeError, base64.binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+@firestore.transactional
+def _delete_and_recompute(transaction, conversation_ref, message_ref, uid):
+    snapshots = {snap.reference.path: snap for snap in transaction.get_all([message_ref, conversation_ref])}
+    conversation = snapshots[conversation_ref.path]
+    message = snapshots[message_ref.path]
+    if not conversation.exists:
+        return 'conversation_not_found'
+    if not message.exists:
+        return 'message_not_found'
+
+    message_data = message.to_dict()
+    if message_data.get('senderId') != uid:
+        return 'forbidden'
+
+    conversation_data = conversation.to_dict() or {}
+    update = {'updatedAt': datetime.utcnow(), **_unread_decrements(conversation_data, [message_data])}
+    if _is_last_message(conversation_data.get('lastMessage'), message_ref.id, message_data):
+        # Les deux messages les plus récents : le premier est celui qu'on supprime
+        recent = conversation_ref.collection('messages').order_by(
+            'createdAt', direction=firestore.Query.DESCENDING
+        ).limit(2)
+        previous = None
+        for msg in transaction.get(recent):
+            if msg.id != message_ref.id:
+                previous = msg.to_dict()
+                previous.setdefault('id', msg.id)
+                break
+        # Aucun message restant : lastMessage à None
+        update['lastMessage'] = _build_last_message(previous, 'Message précédent') if previous else None
+
+    transaction.delete(message_ref)
+    transaction.update(conversation_ref, update)
+    return 'deleted'
@@ -0,0 +1,36 @@
+from flask import Blueprint, Response, jsonify, request
+from middleware.auth_middleware import verify_firebase_token
+from middleware.rate_limit import rate_limit
+from config.database import get_db
+from config.logging_config import get_logger
+from services.reference_data import reference_data
+
+reference_bp = Blueprint('reference', __name__)
+logger = get_logger('routes.reference')
+
+# Délai maximal d'attente du premier snapshot d'une collection de référence
+REFERENCE_READY_TIMEOUT = 10
+
+@reference_bp.route('/reference/<collection_name>', methods=['GET'])
+@verify_firebase_token
+@rate_limit('60/minute')
+def get_reference_data(collection_name):
+    try:
+        if collection_name not in reference_data:
+            return jsonify({'error': 'Unknown reference collection'}), 404
+
+        collection = reference_data[collection_name]
+        collection.start(get_db())
+        if not collection.wait_until_ready(REFERENCE_READY_TIMEOUT):
+            return jsonify({'error': 'Reference data is not loaded yet'}), 503
+
+        body, etag = collection.payload()
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Le client doit revalider à chaque fois : 304 sans corps si rien n'a changé
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+
+    except Exception:
+        logger.exception("Erreur lors de la lecture des données de référence", extra={'collection': collection_name})
+        return jsonify({'error': 'Failed to get reference data'}), 500
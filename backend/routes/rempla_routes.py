@@ -1,95 +1,131 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
 from middleware.auth_middleware import verify_firebase_token
-from firebase_admin import firestore
-import google.cloud.exceptions
+from middleware.rate_limit import rate_limit
+from config.database import get_db
+from config.logging_config import get_logger
+from services.replacement_index import replacement_index, parse_date
+from services.feed_engine import feed_engine
+from services.geo_index import geo_index, parse_coordinates
+from services.reference_data import reference_data
 
 rempla_bp = Blueprint('rempla', __name__)
+logger = get_logger('routes.rempla')
+
+# Délai maximal d'attente du premier snapshot de la collection replacements
+INDEX_READY_TIMEOUT = 10
+# Rayon maximal accepté pour une recherche géographique
+MAX_RADIUS_KM = 500
+DEFAULT_FEED_SIZE = 20
+MAX_FEED_SIZE = 100
 
 @rempla_bp.route('/search_replacements', methods=['POST'])
 @verify_firebase_token
+@rate_limit('30/minute')
 def search_replacements():
     try:
         # Récupérer les données de la requête
-        data = request.json
+        data = request.json or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         profession_id = data.get('professionId')
-        establishment_ids = data.get('establishmentIds', [])
-
-        print(f"\n🔍 Recherche avec:")
-        print(f"- Profession: {profession_id}")
-        print(f"- Établissements: {establishment_ids}")
+        if profession_id is not None and not isinstance(profession_id, str):
+            return jsonify({'error': 'professionId must be a string'}), 400
+        establishment_ids = data.get('establishmentIds') or []
+        specialty_ids = data.get('specialtyIds') or []
+        for field, ids in (('establishmentIds', establishment_ids), ('specialtyIds', specialty_ids)):
+            if not _is_string_list(ids):
+                return jsonify({'error': f'{field} must be a list of strings'}), 400
 
-        # Test simple de lecture Firestore
         try:
-            print("\n📊 Test de connexion Firestore...")
-            db = firestore.client()
-            print("✅ Client Firestore obtenu")
-        except Exception as e:
-            print("❌ Erreur de connexion:", str(e))
-            raise
+            start_date = parse_date(data.get('startDate'))
+            end_date = parse_date(data.get('endDate'))
+        except ValueError:
+            return jsonify({'error': 'Invalid date format, expected ISO 8601'}), 400
 
-        try:
-            print("\n📚 Test de lecture collection...")
-            replacements_ref = db.collection('replacements')
-            print("✅ Référence collection obtenue")
-        except Exception as e:
-            print("❌ Erreur d'accès collection:", str(e))
-            raise
+        if start_date and end_date and start_date > end_date:
+            return jsonify({'error': 'startDate must be before endDate'}), 400
+
+        location = data.get('location')
+        radius_km = data.get('radiusKm')
+        origin = None
+        if location is not None or radius_km is not None:
+            origin = parse_coordinates(location) if isinstance(location, dict) else None
+            if origin is None:
+                return jsonify({'error': 'location must be {latitude, longitude}'}), 400
+            if isinstance(radius_km, bool) or not isinstance(radius_km, (int, float)) \
+                    or not 0 < radius_km <= MAX_RADIUS_KM:
+                return jsonify({'error': f'radiusKm must be between 0 and {MAX_RADIUS_KM}'}), 400
+
+        distances = None
+        if origin is not None:
+            # Index des coordonnées, alimenté par le listener des établissements
+            establishments = reference_data['establishments']
+            establishments.start(get_db())
+            if not establishments.wait_until_ready(INDEX_READY_TIMEOUT):
+                return jsonify({'error': 'Search index is not ready yet'}), 503
+            distances = geo_index.within_radius(origin[0], origin[1], radius_km)
+            if establishment_ids:
+                allowed = set(establishment_ids)
+                distances = {eid: d for eid, d in distances.items() if eid in allowed}
+            if not distances:
+                return jsonify([]), 200
+            establishment_ids = list(distances)
+
+        # L'index est alimenté par un listener Firestore, démarré au premier appel
+        replacement_index.start(get_db())
+        if not replacement_index.wait_until_ready(INDEX_READY_TIMEOUT):
+            return jsonify({'error': 'Search index is not ready yet'}), 503
+
+        results = replacement_index.search(
+            profession_id=profession_id,
+            establishment_ids=establishment_ids,
+            specialty_ids=specialty_ids,
+            start_date=start_date,
+            end_date=end_date
+        )
+
+        if distances is not None:
+            for result in results:
+                result['distanceKm'] = round(distances[result['establishmentId']], 2)
+            # Tri stable : à distance égale, l'ordre par startDate est conservé
+            results.sort(key=lambda result: result['distanceKm'])
+
+        logger.debug("Recherche de remplacements", extra={'results': len(results)})
+        return jsonify(results), 200
 
+    except Exception:
+        logger.exception("Erreur lors de la recherche de remplacements")
+        return jsonify({'error': 'Failed to search replacements'}), 500
+
+def _is_string_list(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+@rempla_bp.route('/feed', methods=['GET'])
+@verify_firebase_token
+@rate_limit('120/minute')
+def get_feed():
+    try:
         try:
-            print("\n🔎 Test lecture simple...")
-            # Test de lecture sans stream d'abord
-            collection_path = replacements_ref._path
-            print(f"Collection path: {collection_path}")
-            
-            # Essai avec get() au lieu de stream()
-            docs = replacements_ref.limit(1).get()
-            all_docs = list(docs)
-            print(f"✅ Nombre de documents trouvés: {len(all_docs)}")
-        except google.cloud.exceptions.NotFound as e:
-            print("❌ Collection non trouvée:", str(e))
-            raise
-        except Exception as e:
-            print("❌ Erreur de lecture:", str(e))
-            raise
-
-        if len(all_docs) > 0:
-            print("\n📄 Premier document:")
-            doc = all_docs[0]
-            print(f"- ID: {doc.id}")
-            print(f"- Data: {doc.to_dict()}")
-        else:
-            print("\n📝 Création document test...")
-            test_doc = {
-                'professionId': profession_id,
-                'establishmentId': establishment_ids[0],
-                'startDate': datetime.now(),
-                'endDate': datetime.now(),
-                'status': 'open',
-                'createdAt': datetime.now(),
-                'updatedAt': datetime.now()
-            }
-            try:
-                doc_ref = replacements_ref.add(test_doc)
-                print(f"✅ Document test créé: {doc_ref[1].id}")
-            except Exception as e:
-                print("❌ Erreur création document:", str(e))
-                raise
-
-        return jsonify({
-            "status": "success",
-            "message": "Test de lecture effectué",
-            "count": len(all_docs)
-        })
-
-    except Exception as e:
-        print(f"\n❌ Erreur finale: {str(e)}")
-        print(f"Type: {type(e)}")
-        import traceback
-        print("Traceback complet:")
-        print(traceback.format_exc())
-        return jsonify({
-            "status": "error",
-            "message": "Une erreur est survenue",
-            "error": str(e)
-        }), 500
\ No newline at end of file
+            limit = int(request.args.get('limit', DEFAULT_FEED_SIZE))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit or offset'}), 400
+        if not 1 <= limit <= MAX_FEED_SIZE or offset < 0:
+            return jsonify({'error': f'limit must be between 1 and {MAX_FEED_SIZE}'}), 400
+
+        replacement_index.start(get_db())
+        if not replacement_index.wait_until_ready(INDEX_READY_TIMEOUT):
+            return jsonify({'error': 'Search index is not ready yet'}), 503
+
+        # Au plus une lecture (profil) ; aucune lorsque le fil est déjà en mémoire
+        page = feed_engine.get_page(get_db(), request.user['uid'], offset, limit)
+        if page is None:
+            return jsonify({'error': 'User not found'}), 404
+        replacements, total = page
+
+        next_offset = offset + limit if offset + limit < total else None
+        return jsonify({'replacements': replacements, 'total': total, 'nextOffset': next_offset}), 200
+
+    except Exception:
+        logger.exception("Erreur lors de la lecture du fil de remplacements")
+        return jsonify({'error': 'Failed to get feed'}), 500
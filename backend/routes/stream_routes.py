@@ -0,0 +1,114 @@
+import threading
+import time
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from middleware.auth_middleware import verify_firebase_token
+from middleware.rate_limit import rate_limit
+from middleware.response_layer import dumps
+from config import settings
+from config.database import get_db
+from config.logging_config import get_logger
+from services.conversation_cache import conversation_cache
+from services.push_hub import push_hub
+
+stream_bp = Blueprint('stream', __name__)
+logger = get_logger('routes.stream')
+
+MAX_STREAM_CONVERSATIONS = 50
+# Commentaire SSE envoyé en l'absence d'événement : garde la connexion ouverte
+# et permet de détecter la déconnexion du client
+HEARTBEAT_INTERVAL = 15
+RETRY_MS = 3000
+
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+@stream_bp.route('/stream', methods=['GET'])
+@verify_firebase_token
+@rate_limit('30/minute')
+def stream_messages():
+    global _open_streams
+    try:
+        conversation_ids = list(dict.fromkeys(
+            filter(None, (cid.strip() for cid in request.args.get('conversationIds', '').split(',')))
+        ))
+        if not conversation_ids:
+            return jsonify({'error': 'conversationIds is required'}), 400
+        if len(conversation_ids) > MAX_STREAM_CONVERSATIONS:
+            return jsonify({'error': f'At most {MAX_STREAM_CONVERSATIONS} conversations per stream'}), 400
+
+        db = get_db()
+        for conversation_id in conversation_ids:
+            is_participant = conversation_cache.is_participant(db, conversation_id, request.user['uid'])
+            if is_participant is None:
+                return jsonify({'error': f'Conversation not found: {conversation_id}'}), 404
+            if not is_participant:
+                return jsonify({'error': 'User not authorized for this conversation'}), 403
+
+        with _streams_lock:
+            if _open_streams >= settings.PUSH_MAX_STREAMS:
+                response = jsonify({'error': 'Too many open streams'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(RETRY_MS // 1000)
+                return response
+            _open_streams += 1
+
+        try:
+            subscription = push_hub.subscribe(db, request.user['uid'], conversation_ids)
+        except Exception:
+            _release_stream()
+            raise
+
+        response = Response(stream_with_context(_event_stream(subscription)), mimetype='text/event-stream')
+        # Libération à la fermeture de la réponse, appelée par le serveur même si le
+        # générateur n'a jamais démarré (HEAD, client parti avant le premier morceau)
+        response.call_on_close(_release_once(subscription))
+        response.headers['Cache-Control'] = 'no-cache'
+        # Désactiver la mise en tampon des proxys (nginx)
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except Exception:
+        logger.exception("Erreur lors de l'ouverture du flux temps réel")
+        return jsonify({'error': 'Failed to open stream'}), 500
+
+def _release_stream():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+def _release_once(subscription):
+    """Fonction de libération du listener et de la place de flux, sans effet au second appel"""
+    released = threading.Lock()
+
+    def release():
+        if released.acquire(blocking=False):
+            push_hub.unsubscribe(subscription)
+            _release_stream()
+    return release
+
+def _event_stream(subscription):
+    """Générer les événements SSE d'un abonnement jusqu'à la déconnexion du client.
+
+    Le flux se termine après PUSH_MAX_STREAM_SECONDS ; EventSource se reconnecte seul.
+    """
+    yield f'retry: {RETRY_MS}\n\n'
+    deadline = time.monotonic() + settings.PUSH_MAX_STREAM_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        event = subscription.get(min(HEARTBEAT_INTERVAL, remaining))
+        if subscription.overflowed:
+            # Le client a pris trop de retard : il doit se reconnecter et relire l'historique
+            yield 'event: overflow\ndata: {}\n\n'
+            return
+        if subscription.revoked:
+            # L'utilisateur a été retiré de la conversation : se reconnecter sans elle
+            yield f'event: revoked\ndata: {dumps({"conversationId": subscription.revoked})}\n\n'
+            return
+        if event is None:
+            yield ': ping\n\n'
+            continue
+        event_type, payload = event
+        yield f'event: {event_type}\ndata: {dumps(payload)}\n\n'
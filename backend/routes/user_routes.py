@@ -2,17 +2,31 @@
 
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+from google.api_core.exceptions import Conflict
 from middleware.auth_middleware import verify_firebase_token
-from firebase_admin import firestore
+from middleware.rate_limit import rate_limit
+from middleware.idempotency import idempotent
+from config.database import get_db
+from middleware.metrics import trace_firestore
+from config.logging_config import get_logger
+from services.feed_engine import feed_engine
+from services.reference_data import reference_data
+from services.update_coalescer import user_updates
 
 user_bp = Blueprint('user', __name__)
+logger = get_logger('routes.user')
+
+# Délai maximal d'attente du chargement des données de référence
+REFERENCE_READY_TIMEOUT = 10
 
 @user_bp.route('/create_user', methods=['POST'])
 @verify_firebase_token
+@rate_limit('10/minute')
+@idempotent
 def create_user():
     try:
-        # Initialiser Firestore
-        db = firestore.client()
+        # Client Firestore partagé
+        db = get_db()
         
         # Le token décodé est maintenant disponible dans request.user
         firebase_user = request.user
@@ -28,24 +42,36 @@ def create_user():
             "onboardingStep": 0
         }
         
-        # Sauvegarder dans Firestore
-        db.collection('users').document(firebase_user['uid']).set(user_document)
+        # Créer seulement si absent : une requête rejouée ne réinitialise pas le profil
+        user_ref = db.collection('users').document(firebase_user['uid'])
+        try:
+            with trace_firestore('create') as call:
+                user_ref.create(user_document)
+                call.writes = 1
+        except Conflict:
+            with trace_firestore('get') as call:
+                existing = user_ref.get()
+                call.reads = 1
+            logger.info("Utilisateur déjà existant", extra={'uid': firebase_user['uid']})
+            return jsonify(existing.to_dict() or {}), 200
         
-        print("User created in Firestore:", user_document)
+        logger.info("Utilisateur créé", extra={'uid': firebase_user['uid']})
         return jsonify(user_document), 201
         
-    except Exception as e:
-        print("Error creating user:", str(e))
+    except Exception:
+        logger.exception("Erreur lors de la création de l'utilisateur")
         return jsonify({'error': 'Failed to create user'}), 500
 
 @user_bp.route('/update_user/<uid>', methods=['PUT'])
 @verify_firebase_token
+@rate_limit('60/minute')
+@idempotent
 def update_user(uid):
     try:
         if request.user['uid'] != uid:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        db = firestore.client()
+        db = get_db()
         data = request.json
         
         # Valider les champs autorisés
@@ -60,17 +86,56 @@ def update_user(uid):
             if key in allowed_fields
         }
         
-        # Ajouter updatedAt
-        update_data['updatedAt'] = datetime.utcnow()
-        
         if not update_data:
             return jsonify({'error': 'No valid fields to update'}), 400
+
+        # Vérifier les références sans lecture Firestore (données en mémoire)
+        error = _validate_references(db, update_data)
+        if error is not None:
+            return jsonify({'error': error[0]}), error[1]
+
+        # Ajouter updatedAt
+        update_data['updatedAt'] = datetime.utcnow()
             
-        db.collection('users').document(uid).update(update_data)
+        if user_updates.window > 0:
+            # Les patchs rapprochés d'un même utilisateur partent en une seule écriture
+            user_updates.start(db)
+            user_updates.submit(uid, update_data)
+        else:
+            with trace_firestore('update') as call:
+                db.collection('users').document(uid).update(update_data)
+                call.writes = 1
         
-        print("User updated in Firestore:", update_data)
+        # Reconstruire le fil de remplacements si la profession ou les spécialités changent
+        feed_engine.update_profile(uid, update_data)
+
+        logger.info("Utilisateur mis à jour", extra={'uid': uid, 'fields': sorted(update_data)})
         return jsonify(update_data), 200
         
-    except Exception as e:
-        print("Error updating user:", str(e))
-        return jsonify({'error': 'Failed to update user'}), 500
\ No newline at end of file
+    except Exception:
+        logger.exception("Erreur lors de la mise à jour de l'utilisateur")
+        return jsonify({'error': 'Failed to update user'}), 500
+
+def _validate_references(db, update_data):
+    """Retourner (message, statut) si professionId ou specialityIds est invalide"""
+    checks = []
+    if update_data.get('professionId') is not None:
+        profession_id = update_data['professionId']
+        if not isinstance(profession_id, str):
+            return 'professionId must be a string', 400
+        checks.append(('professions', [profession_id]))
+    if 'specialityIds' in update_data:
+        speciality_ids = update_data['specialityIds']
+        if not isinstance(speciality_ids, list) or not all(isinstance(i, str) for i in speciality_ids):
+            return 'specialityIds must be a list of strings', 400
+        checks.append(('specialties', speciality_ids))
+
+    for collection_name, ids in checks:
+        collection = reference_data[collection_name]
+        collection.start(db)
+        if not collection.wait_until_ready(REFERENCE_READY_TIMEOUT):
+            return 'Reference data is not loaded yet', 503
+        missing = collection.missing(ids)
+        if missing:
+            return f"Unknown {collection_name}: {', '.join(missing)}", 400
+    return None
@@ -0,0 +1,123 @@
+# ELIO_Backend/scripts/backfill_unread_counts.py
+#
+# Recalcul du champ `unreadCounts` des conversations, à lancer après le déploiement :
+#   python scripts/backfill_unread_counts.py                 # recalcul de toutes les conversations
+#   python scripts/backfill_unread_counts.py --missing-only  # conversations sans unreadCounts
+#   python scripts/backfill_unread_counts.py --dry-run       # affichage sans écriture
+#
+# Le recalcul complet est le mode par défaut : une fois le code déployé, les conversations
+# actives reçoivent `unreadCounts` dès le premier envoi, avec des compteurs qui ne tiennent
+# compte que des messages postérieurs au déploiement. Le script peut être relancé sans risque.
+#
+# Pour chaque participant, le compteur est le nombre de messages qu'il n'a pas envoyés
+# et qui ne portent pas son uid dans `readBy`. L'écriture est faite sous précondition
+# sur la conversation lue : si un message est envoyé pendant le calcul, la conversation
+# est recalculée.
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.api_core.exceptions import FailedPrecondition, NotFound  # noqa: E402
+
+PAGE_SIZE = 500
+MAX_ATTEMPTS = 5
+
+
+def count_unread(conversation_ref, participants):
+    """Compter les non-lus de chaque participant (une lecture par message, champs projetés)"""
+    counts = {uid: 0 for uid in participants}
+    messages = conversation_ref.collection('messages').select(['senderId', 'readBy']).stream()
+    for message in messages:
+        data = message.to_dict() or {}
+        read_by = data.get('readBy') or []
+        for uid in participants:
+            if uid != data.get('senderId') and uid not in read_by:
+                counts[uid] += 1
+    return counts
+
+
+def backfill_conversation(db, conversation_id, options):
+    """Retourner 'updated', 'skipped' ou 'missing'"""
+    conversation_ref = db.collection('conversations').document(conversation_id)
+    for attempt in range(MAX_ATTEMPTS):
+        conversation = conversation_ref.get()
+        if not conversation.exists:
+            return 'missing'
+        data = conversation.to_dict() or {}
+        if 'unreadCounts' in data and options.missing_only:
+            return 'skipped'
+        counts = count_unread(conversation_ref, data.get('participants') or [])
+        if options.dry_run:
+            print(f"  {conversation_id} : {counts}")
+            return 'updated'
+        try:
+            conversation_ref.update(
+                {'unreadCounts': counts},
+                option=db.write_option(last_update_time=conversation.update_time)
+            )
+            return 'updated'
+        except FailedPrecondition:
+            # Conversation modifiée pendant le calcul (nouveau message, lecture) : recommencer
+            time.sleep(0.2 * (attempt + 1))
+        except NotFound:
+            return 'missing'
+    raise RuntimeError(f"Conversation {conversation_id} modifiée en continu, réessayer plus tard")
+
+
+def conversation_ids(db):
+    """IDs de toutes les conversations, par pages ordonnées sur l'ID"""
+    last = None
+    while True:
+        query = db.collection('conversations').select([]).order_by('__name__').limit(PAGE_SIZE)
+        if last is not None:
+            query = query.start_after(last)
+        page = list(query.stream())
+        for snapshot in page:
+            yield snapshot.id
+        if len(page) < PAGE_SIZE:
+            return
+        last = page[-1]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Initialiser unreadCounts sur les conversations existantes")
+    parser.add_argument('--missing-only', action='store_true',
+                        help="Ignorer les conversations qui ont déjà unreadCounts (incorrect après le déploiement)")
+    parser.add_argument('--dry-run', action='store_true', help='Afficher les compteurs sans les écrire')
+    parser.add_argument('--workers', type=int, default=8, help='Conversations traitées en parallèle (défaut: 8)')
+    return parser.parse_args(argv)
+
+
+def main():
+    options = parse_args()
+    from config.database import get_db
+
+    db = get_db()
+    started_at = time.monotonic()
+    results = {'updated': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        futures = {
+            executor.submit(backfill_conversation, db, conversation_id, options): conversation_id
+            for conversation_id in conversation_ids(db)
+        }
+        for future, conversation_id in futures.items():
+            try:
+                results[future.result()] += 1
+            except Exception as e:
+                results['failed'] += 1
+                print(f"  Échec pour {conversation_id} : {e}")
+
+    print(
+        f"{results['updated']} conversation(s) mise(s) à jour, {results['skipped']} déjà initialisée(s), "
+        f"{results['failed']} échec(s) en {time.monotonic() - started_at:.1f} s"
+    )
+    return 1 if results['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,737 @@
+# ELIO_Backend/scripts/bulk_loader.py
+#
+# Chargement en masse de Firestore (émulateur par défaut) :
+#   # Jeu de données synthétique à l'échelle de la production
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/bulk_loader.py generate \
+#       --establishments 20000 --replacements 1000000 --users 200000 --conversations 300000
+#   # Import d'un export CSV ou JSONL (une ligne = un document)
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/bulk_loader.py import \
+#       --file establishments.jsonl --collection establishments
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/bulk_loader.py import \
+#       --file messages.csv --collection 'conversations/{conversationId}/messages'
+#
+# Les documents sont écrits par lots (WriteBatch de 500 opérations au plus),
+# validés en parallèle. L'avancement est enregistré dans un fichier de reprise :
+# après une erreur ou une interruption, relancer la même commande avec --resume
+# reprend au premier lot non validé. Les écritures sont des `set` sur des IDs
+# déterministes : rejouer un lot ne crée pas de doublon.
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from google.api_core.exceptions import (  # noqa: E402
+    Aborted, DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable
+)
+from services.batch_writer import BatchWriter  # noqa: E402
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bulk_loader_checkpoint.json')
+CHECKPOINT_VERSION = 1
+# Intervalle minimal entre deux écritures du fichier de reprise et deux affichages
+CHECKPOINT_INTERVAL = 2
+PROGRESS_INTERVAL = 5
+
+# Erreurs Firestore pour lesquelles un lot est renvoyé après un délai
+TRANSIENT_ERRORS = (Aborted, DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable)
+
+# Champs convertis en dates lors d'un import
+DATE_FIELD_SUFFIXES = ('Date', 'At')
+DATE_FIELDS = {'lastActivity', 'timestamp'}
+# Les nombres avec zéro initial (codes postaux, téléphones) restent des chaînes
+NUMBER = re.compile(r'^-?(0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?$')
+
+
+# --- Données synthétiques -----------------------------------------------------------
+
+# Ville, latitude, longitude, poids (population approximative en centaines de milliers)
+CITIES = [
+    ('Paris', 48.8566, 2.3522, 21), ('Marseille', 43.2965, 5.3698, 9), ('Lyon', 45.7640, 4.8357, 5),
+    ('Toulouse', 43.6047, 1.4442, 5), ('Nice', 43.7102, 7.2620, 3), ('Nantes', 47.2184, -1.5536, 3),
+    ('Montpellier', 43.6108, 3.8767, 3), ('Strasbourg', 48.5734, 7.7521, 3), ('Bordeaux', 44.8378, -0.5792, 3),
+    ('Lille', 50.6292, 3.0573, 2), ('Rennes', 48.1173, -1.6778, 2), ('Reims', 49.2583, 4.0317, 2),
+    ('Toulon', 43.1242, 5.9280, 2), ('Grenoble', 45.1885, 5.7245, 2), ('Dijon', 47.3220, 5.0415, 1),
+    ('Angers', 47.4784, -0.5632, 1), ('Brest', 48.3904, -4.4861, 1), ('Limoges', 45.8336, 1.2611, 1),
+    ('Clermont-Ferrand', 45.7772, 3.0870, 1), ('Rouen', 49.4432, 1.0999, 1), ('Ajaccio', 41.9192, 8.7386, 1)
+]
+CITY_WEIGHTS = [city[3] for city in CITIES]
+
+PROFESSIONS = [
+    ('Infirmier', ['Soins généraux', 'Urgences', 'Bloc opératoire', 'Réanimation', 'Pédiatrie']),
+    ('Médecin généraliste', ['Médecine générale', 'Gériatrie', 'Médecine du sport']),
+    ('Masseur-kinésithérapeute', ['Rééducation', 'Kinésithérapie respiratoire', 'Neurologie']),
+    ('Sage-femme', ['Salle de naissance', 'Suivi prénatal']),
+    ('Manipulateur en radiologie', ['Scanner', 'IRM', 'Radiologie conventionnelle', 'Échographie']),
+    ('Aide-soignant', ['EHPAD', 'Soins de suite', 'Médecine']),
+    ('Pharmacien', ['Officine', 'Pharmacie hospitalière'])
+]
+
+ESTABLISHMENT_TYPES = ['Hôpital', 'Clinique', 'Centre de santé', 'EHPAD', 'Cabinet', 'Centre hospitalier']
+STREETS = ['Rue de la République', 'Avenue Jean Jaurès', 'Boulevard Victor Hugo', 'Rue Pasteur',
+           'Avenue de la Gare', 'Rue du Général de Gaulle', 'Place de la Mairie', 'Rue Nationale']
+FIRST_NAMES = ['Camille', 'Léa', 'Manon', 'Chloé', 'Inès', 'Sarah', 'Julie', 'Emma', 'Lucas', 'Hugo',
+               'Thomas', 'Nathan', 'Louis', 'Jules', 'Gabriel', 'Arthur', 'Paul', 'Claire', 'Alice', 'David']
+LAST_NAMES = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy',
+              'Moreau', 'Simon', 'Laurent', 'Lefebvre', 'Michel', 'Garcia', 'Roux', 'Fournier', 'Dumas']
+PERIODS = ['day', 'night', 'weekend']
+MESSAGES = [
+    'Bonjour, le remplacement est-il toujours disponible ?',
+    'Oui, il est toujours disponible. Quelles sont vos disponibilités ?',
+    'Je suis disponible sur toute la période indiquée.',
+    'Parfait, pouvez-vous nous envoyer votre CV ?',
+    'Quels sont les horaires de travail ?',
+    'Les horaires sont de 8h à 18h, avec une garde un week-end sur deux.',
+    "Merci pour votre retour, je vous confirme ma disponibilité.",
+    'Le logement est-il fourni ?',
+    "Pouvons-nous nous appeler demain pour en discuter ?",
+    'Très bien, à demain.'
+]
+REPLACEMENT_STATUSES = [('open', 70), ('pending', 10), ('confirmed', 15), ('cancelled', 5)]
+
+# Spécialités synthétiques : (ID, ID de profession)
+SPECIALTIES = [
+    (f'spc{i}_{j}', f'prf{i}') for i, (_, specialties) in enumerate(PROFESSIONS) for j in range(len(specialties))
+]
+
+
+def establishment_id(index):
+    return f'est{index:07d}'
+
+
+def replacement_id(index):
+    return f'rep{index:08d}'
+
+
+def user_id(index):
+    return f'user{index:07d}'
+
+
+def conversation_id(index):
+    return f'conv{index:07d}'
+
+
+class Generator:
+    """Documents synthétiques générés de façon déterministe, lot par lot.
+
+    Chaque lot a son propre générateur aléatoire (graine, étape, numéro de
+    lot) : un lot peut être régénéré à l'identique lors d'une reprise sans
+    rejouer les lots précédents.
+    """
+
+    def __init__(self, db, options):
+        self.db = db
+        self.options = options
+        self.base_date = datetime.fromisoformat(options.base_date).replace(tzinfo=timezone.utc)
+
+    def rng(self, stage, chunk_index):
+        return random.Random(f'{self.options.seed}:{stage}:{chunk_index}')
+
+    def stages(self):
+        """(nom, nombre de documents de premier niveau, fonction de génération d'un document)"""
+        options = self.options
+        return [
+            ('professions', len(PROFESSIONS), self.profession),
+            ('specialties', len(SPECIALTIES), self.specialty),
+            ('establishments', options.establishments, self.establishment),
+            ('users', options.users, self.user),
+            ('replacements', options.replacements, self.replacement),
+            ('conversations', options.conversations, self.conversation)
+        ]
+
+    def _timestamps(self, rng, max_age_days=365):
+        created_at = self.base_date - timedelta(days=rng.uniform(1, max_age_days))
+        return {'createdAt': created_at, 'updatedAt': created_at + timedelta(hours=rng.uniform(0, 48))}
+
+    def profession(self, rng, index):
+        name, _ = PROFESSIONS[index]
+        doc_id = f'prf{index}'
+        return doc_id, [('set', self.db.collection('professions').document(doc_id), {
+            'id': doc_id, 'name': name, 'description': name, **self._timestamps(rng)
+        })]
+
+    def specialty(self, rng, index):
+        doc_id, profession_id = SPECIALTIES[index]
+        profession_index, specialty_index = (int(part) for part in doc_id[3:].split('_'))
+        name = PROFESSIONS[profession_index][1][specialty_index]
+        return doc_id, [('set', self.db.collection('specialties').document(doc_id), {
+            'id': doc_id, 'name': name, 'description': name,
+            'slug': re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-'),
+            'professionId': profession_id, 'isActive': True, **self._timestamps(rng)
+        })]
+
+    def establishment(self, rng, index):
+        doc_id = establishment_id(index)
+        city, latitude, longitude, _ = rng.choices(CITIES, weights=CITY_WEIGHTS)[0]
+        kind = rng.choice(ESTABLISHMENT_TYPES)
+        profession_count = rng.randint(1, 4)
+        return doc_id, [('set', self.db.collection('establishments').document(doc_id), {
+            'id': doc_id,
+            'name': f'{kind} {rng.choice(LAST_NAMES)} - {city}',
+            'address': f'{rng.randint(1, 250)} {rng.choice(STREETS)}, {city}',
+            'description': f'{kind} situé à {city}',
+            # Dispersion gaussienne autour du centre-ville (~15 km)
+            'coordinates': {
+                'latitude': round(latitude + rng.gauss(0, 0.12), 6),
+                'longitude': round(longitude + rng.gauss(0, 0.16), 6)
+            },
+            'professionIds': [f'prf{i}' for i in rng.sample(range(len(PROFESSIONS)), profession_count)],
+            'image': rng.randint(1, 40),
+            **self._timestamps(rng, max_age_days=1000)
+        })]
+
+    def user(self, rng, index):
+        uid = user_id(index)
+        profession_index = rng.randrange(len(PROFESSIONS))
+        specialty_count = len(PROFESSIONS[profession_index][1])
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return uid, [('set', self.db.collection('users').document(uid), {
+            'uid': uid,
+            'email': f'{first_name}.{last_name}{index}@example.com'.lower(),
+            'firstName': first_name,
+            'lastName': last_name,
+            'birthDate': self.base_date - timedelta(days=rng.randint(22 * 365, 65 * 365)),
+            'professionId': f'prf{profession_index}',
+            'specialityIds': [
+                f'spc{profession_index}_{j}' for j in rng.sample(range(specialty_count), rng.randint(0, min(2, specialty_count)))
+            ],
+            'role': 'user',
+            'isProfileComplete': True,
+            'onboardingStep': 3,
+            **self._timestamps(rng)
+        })]
+
+    def replacement(self, rng, index):
+        doc_id = replacement_id(index)
+        profession_index = rng.randrange(len(PROFESSIONS))
+        profession_name, specialties = PROFESSIONS[profession_index]
+        specialty_index = rng.randrange(len(specialties))
+        start = self.base_date + timedelta(days=rng.randint(-30, 180))
+        status = rng.choices([s for s, _ in REPLACEMENT_STATUSES], weights=[w for _, w in REPLACEMENT_STATUSES])[0]
+        return doc_id, [('set', self.db.collection('replacements').document(doc_id), {
+            'id': doc_id,
+            'title': f'Remplacement {profession_name} - {specialties[specialty_index]}',
+            'name': specialties[specialty_index],
+            'description': f'Remplacement {profession_name.lower()} pour congés',
+            'establishmentId': establishment_id(rng.randrange(self.options.establishments)),
+            'professionId': f'prf{profession_index}',
+            'specialtyId': f'spc{profession_index}_{specialty_index}',
+            'startDate': start,
+            'endDate': start + timedelta(days=rng.randint(1, 21)),
+            'status': status,
+            'urgency': 'high' if rng.random() < 0.15 else 'normal',
+            'workload': {'hoursPerWeek': rng.choice([20, 28, 35, 39, 48])},
+            'rate': {'hourly': rng.randint(25, 90), 'currency': 'EUR'},
+            'periods': sorted(rng.sample(PERIODS, rng.randint(1, len(PERIODS)))),
+            **self._timestamps(rng, max_age_days=60)
+        })]
+
+    def conversation(self, rng, index):
+        """Conversation et ses messages, écrits dans un même commit"""
+        doc_id = conversation_id(index)
+        conversation_ref = self.db.collection('conversations').document(doc_id)
+        participants = [user_id(i) for i in rng.sample(range(self.options.users), 2)]
+        timestamps = self._timestamps(rng, max_age_days=90)
+        message_count = rng.randint(0, 2 * self.options.messages_per_conversation)
+        # Chaque participant a lu les messages jusqu'à un certain point
+        read_until = {uid: rng.randint(0, message_count) for uid in participants}
+
+        operations = []
+        created_at = timestamps['createdAt']
+        unread_counts = {uid: 0 for uid in participants}
+        last_message = None
+        for position in range(message_count):
+            created_at += timedelta(minutes=rng.expovariate(1 / 90))
+            sender_id = rng.choice(participants)
+            message_ref = conversation_ref.collection('messages').document(f'msg{position:04d}')
+            read_by = [uid for uid in participants if uid == sender_id or position < read_until[uid]]
+            for uid in participants:
+                if uid not in read_by:
+                    unread_counts[uid] += 1
+            message = {
+                'id': message_ref.id,
+                'senderId': sender_id,
+                'createdAt': created_at,
+                'readBy': read_by,
+                'type': 'user',
+                'content': rng.choice(MESSAGES),
+                'conversationId': doc_id
+            }
+            operations.append(('set', message_ref, message))
+            last_message = {
+                'messageId': message_ref.id,
+                'content': message['content'][:100],
+                'senderId': sender_id,
+                'timestamp': created_at
+            }
+
+        conversation = {
+            'id': doc_id,
+            'participants': participants,
+            'establishmentId': establishment_id(rng.randrange(self.options.establishments)),
+            'status': 'active' if rng.random() < 0.85 else 'closed',
+            'lastActivity': created_at,
+            'unreadCounts': unread_counts,
+            **timestamps
+        }
+        if self.options.replacements:
+            conversation['replacementId'] = replacement_id(rng.randrange(self.options.replacements))
+        if last_message:
+            conversation['lastMessage'] = last_message
+            conversation['updatedAt'] = created_at
+        operations.insert(0, ('set', conversation_ref, conversation))
+        return doc_id, operations
+
+    def chunks(self, stage, count, build, start_chunk):
+        """Lots à partir de `start_chunk` : (numéro, fonction construisant les groupes du lot)"""
+        chunk_size = self.options.chunk_size
+        for chunk_index in range(start_chunk, (count + chunk_size - 1) // chunk_size):
+            def make(chunk_index=chunk_index):
+                rng = self.rng(stage, chunk_index)
+                first = chunk_index * chunk_size
+                return [build(rng, index) for index in range(first, min(first + chunk_size, count))]
+            yield chunk_index, make
+
+
+# --- Import CSV / JSONL --------------------------------------------------------------
+
+def is_date_field(key):
+    return key in DATE_FIELDS or key.endswith(DATE_FIELD_SUFFIXES)
+
+
+def parse_date(value):
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return value
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def convert_value(key, value):
+    """Dates ISO 8601 des champs de date converties en datetime, récursivement"""
+    if isinstance(value, dict):
+        return {k: convert_value(k, v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [convert_value(key, item) for item in value]
+    if isinstance(value, str) and is_date_field(key):
+        return parse_date(value)
+    return value
+
+
+def convert_csv_cell(value):
+    """Typer une cellule CSV : booléens, nombres et JSON (listes, objets)"""
+    if value in ('true', 'false'):
+        return value == 'true'
+    if NUMBER.match(value):
+        return float(value) if any(c in value for c in '.eE') else int(value)
+    if value[:1] in ('[', '{'):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def csv_row_to_document(row):
+    """Les colonnes `a.b` deviennent des champs imbriqués ; les cellules vides sont ignorées"""
+    document = {}
+    for column, value in row.items():
+        if column is None or value is None or value == '':
+            continue
+        target = document
+        *parents, leaf = column.split('.')
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = convert_csv_cell(value)
+    return document
+
+
+def read_rows(path):
+    """Documents du fichier, dans l'ordre, selon son extension (.csv ou .jsonl)"""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield csv_row_to_document(row)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def count_rows(path):
+    return sum(1 for _ in read_rows(path))
+
+
+class Importer:
+    """Documents d'un export CSV ou JSONL, découpés en lots de `chunk_size` lignes"""
+
+    def __init__(self, db, options):
+        self.db = db
+        self.options = options
+        self.file_key = os.path.basename(options.file)
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def document(self, index, row):
+        try:
+            collection = self.options.collection.format(**row)
+        except (KeyError, IndexError):
+            with self._lock:
+                self.rejected += 1
+                if self.rejected <= 10:
+                    print(f"Ligne {index + 1} ignorée : champ manquant pour le chemin {self.options.collection}")
+            return None
+        doc_id = row.get(self.options.id_field)
+        if not doc_id:
+            # ID déterministe : une reprise réécrit le même document
+            doc_id = hashlib.sha1(f'{self.file_key}:{index}'.encode('utf-8')).hexdigest()[:20]
+        ref = self.db.collection(collection).document(str(doc_id))
+        return ref.path, [('set', ref, {key: convert_value(key, value) for key, value in row.items()})]
+
+    def chunks(self, start_chunk):
+        chunk_size = self.options.chunk_size
+        rows = []
+        chunk_index = 0
+        skip = start_chunk * chunk_size
+        for index, row in enumerate(read_rows(self.options.file)):
+            if index < skip:
+                continue
+            rows.append((index, row))
+            if len(rows) == chunk_size:
+                yield start_chunk + chunk_index, self._make(rows)
+                rows = []
+                chunk_index += 1
+        if rows:
+            yield start_chunk + chunk_index, self._make(rows)
+
+    def _make(self, rows):
+        return lambda: [group for group in (self.document(index, row) for index, row in rows) if group]
+
+
+# --- Reprise et avancement --------------------------------------------------------------
+
+class Checkpoint:
+    """Fichier de reprise : pour chaque étape, nombre de lots consécutifs validés.
+
+    Les lots validés dans le désordre au-delà de ce point sont rejoués lors
+    d'une reprise ; c'est sans effet puisque les écritures sont idempotentes.
+    La date de référence de la génération y est conservée pour qu'une reprise
+    un autre jour produise les mêmes documents.
+    """
+
+    def __init__(self, path, fingerprint, stages=None, base_date=None):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.stages = stages or {}
+        self.base_date = base_date
+        self._done = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path, fingerprint)
+        if data.get('version') != CHECKPOINT_VERSION or data.get('fingerprint') != fingerprint:
+            raise SystemExit(
+                f"Le fichier de reprise {path} correspond à une autre commande : "
+                "relancer sans --resume pour repartir de zéro"
+            )
+        return cls(path, fingerprint, data.get('stages'), data.get('baseDate'))
+
+    def completed_chunks(self, stage):
+        return self.stages.get(stage, 0)
+
+    def mark_done(self, stage, chunk_index):
+        with self._lock:
+            done = self._done.setdefault(stage, set())
+            done.add(chunk_index)
+            watermark = self.stages.get(stage, 0)
+            while watermark in done:
+                done.discard(watermark)
+                watermark += 1
+            self.stages[stage] = watermark
+        self.save()
+
+    def save(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved_at < CHECKPOINT_INTERVAL:
+                return
+            self._saved_at = now
+            data = {
+                'version': CHECKPOINT_VERSION, 'fingerprint': self.fingerprint,
+                'baseDate': self.base_date, 'stages': dict(self.stages)
+            }
+            # Écriture atomique : le fichier n'est jamais lu à moitié écrit
+            temporary_path = f'{self.path}.tmp'
+            with open(temporary_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temporary_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Progress:
+    """Affichage périodique du nombre de documents écrits, du débit et du temps restant"""
+
+    def __init__(self, stage, total_chunks, start_chunk):
+        self.stage = stage
+        self.total_chunks = total_chunks
+        self.start_chunk = start_chunk
+        self.chunks = start_chunk
+        self.documents = 0
+        self.started_at = time.monotonic()
+        self._printed_at = self.started_at
+        self._lock = threading.Lock()
+
+    def add(self, documents):
+        with self._lock:
+            self.chunks += 1
+            self.documents += documents
+            now = time.monotonic()
+            if now - self._printed_at >= PROGRESS_INTERVAL:
+                self._printed_at = now
+                self.print()
+
+    def print(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        percent = 100 * self.chunks / self.total_chunks if self.total_chunks else 100
+        line = (
+            f"  {self.stage} : lot {self.chunks}/{self.total_chunks} ({percent:.1f} %), "
+            f"{self.documents} documents, {self.documents / elapsed:.0f} docs/s"
+        )
+        chunks_per_second = (self.chunks - self.start_chunk) / elapsed
+        if self.chunks < self.total_chunks and chunks_per_second > 0:
+            line += f", reste ~{(self.total_chunks - self.chunks) / chunks_per_second:.0f} s"
+        print(line, flush=True)
+
+
+# --- Écriture --------------------------------------------------------------------------
+
+class ChunkFailed(Exception):
+    """Un lot n'a pas pu être validé malgré les nouvelles tentatives"""
+
+
+def write_chunk(db, build, options):
+    """Construire puis valider un lot ; retourne le nombre de documents écrits"""
+    groups = build()
+    documents = sum(len(operations) for _, operations in groups)
+    attempt = 0
+    while groups:
+        writer = BatchWriter(db, max_operations=options.batch_size)
+        for key, operations in groups:
+            writer.add(key, operations)
+        failures = writer.commit()
+        if not failures:
+            break
+        error = next(iter(failures.values()))
+        if attempt >= options.max_retries or not all(isinstance(e, TRANSIENT_ERRORS) for e in failures.values()):
+            raise ChunkFailed(f"{len(failures)} groupe(s) en échec, ex: {next(iter(failures))}: {error}")
+        # Seuls les groupes en échec sont renvoyés, avec un délai croissant
+        groups = [(key, operations) for key, operations in groups if key in failures]
+        time.sleep(min(30, 0.5 * 2 ** attempt) * random.uniform(0.5, 1))
+        attempt += 1
+    return documents
+
+
+def run_stage(db, stage, chunks, total_chunks, checkpoint, options):
+    """Valider les lots d'une étape en parallèle, `workers` commits à la fois"""
+    start_chunk = checkpoint.completed_chunks(stage)
+    if start_chunk >= total_chunks:
+        print(f"  {stage} : déjà chargé ({total_chunks} lots)")
+        return
+    if start_chunk:
+        print(f"  {stage} : reprise au lot {start_chunk}/{total_chunks}")
+    progress = Progress(stage, total_chunks, start_chunk)
+
+    def collect(futures):
+        for future in futures:
+            chunk_index, documents = future.result()
+            checkpoint.mark_done(stage, chunk_index)
+            progress.add(documents)
+
+    def task(chunk_index, build):
+        return chunk_index, write_chunk(db, build, options)
+
+    executor = ThreadPoolExecutor(max_workers=options.workers)
+    pending = set()
+    try:
+        for chunk_index, build in chunks:
+            # Nombre de lots en mémoire borné : la génération suit le rythme des commits
+            if len(pending) >= options.workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(task, chunk_index, build))
+        done, pending = wait(pending)
+        collect(done)
+    except BaseException:
+        # Erreur ou interruption : terminer les commits en cours pour ne perdre aucun lot validé
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        for future in pending:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                chunk_index, documents = future.result()
+                checkpoint.mark_done(stage, chunk_index)
+        checkpoint.save(force=True)
+        raise
+    executor.shutdown(wait=True)
+    checkpoint.save(force=True)
+    progress.print()
+
+
+# --- Commandes --------------------------------------------------------------------------
+
+def fingerprint(options):
+    """Paramètres qui déterminent le contenu des lots : une reprise doit les conserver.
+
+    La date de référence n'en fait pas partie : sa valeur par défaut change chaque
+    jour, elle est conservée dans le fichier de reprise (voir resolve_base_date).
+    """
+    if options.command == 'import':
+        stat = os.stat(options.file)
+        values = [os.path.abspath(options.file), stat.st_size, int(stat.st_mtime), options.collection, options.id_field]
+    else:
+        values = [
+            options.seed, options.establishments, options.users,
+            options.replacements, options.conversations, options.messages_per_conversation
+        ]
+    return hashlib.sha1(json.dumps([options.command, options.chunk_size, *values]).encode('utf-8')).hexdigest()
+
+
+def resolve_base_date(checkpoint, options):
+    """Date de référence de la génération : celle du fichier de reprise lors d'une reprise"""
+    if checkpoint.base_date and options.base_date and options.base_date != checkpoint.base_date:
+        raise SystemExit(
+            f"--base-date {options.base_date} ne correspond pas à la reprise ({checkpoint.base_date}) : "
+            "relancer sans --resume pour repartir de zéro"
+        )
+    checkpoint.base_date = checkpoint.base_date or options.base_date or datetime.now(timezone.utc).date().isoformat()
+    return checkpoint.base_date
+
+
+def run_generate(db, checkpoint, options):
+    if options.conversations and options.users < 2:
+        raise SystemExit("--conversations nécessite au moins 2 utilisateurs (--users)")
+    if (options.replacements or options.conversations) and not options.establishments:
+        raise SystemExit("--replacements et --conversations nécessitent des établissements (--establishments)")
+    # Une conversation et ses messages sont validés dans un même WriteBatch
+    if 2 * options.messages_per_conversation + 1 > options.batch_size:
+        raise SystemExit(f"--messages-per-conversation doit être inférieur à {options.batch_size // 2}")
+
+    generator = Generator(db, options)
+    for stage, count, build in generator.stages():
+        if not count:
+            continue
+        total_chunks = (count + options.chunk_size - 1) // options.chunk_size
+        start_chunk = checkpoint.completed_chunks(stage)
+        run_stage(db, stage, generator.chunks(stage, count, build, start_chunk), total_chunks, checkpoint, options)
+
+
+def run_import(db, checkpoint, options):
+    print(f"Comptage des lignes de {options.file}...")
+    rows = count_rows(options.file)
+    total_chunks = (rows + options.chunk_size - 1) // options.chunk_size
+    importer = Importer(db, options)
+    stage = f'import:{options.collection}'
+    run_stage(db, stage, importer.chunks(checkpoint.completed_chunks(stage)), total_chunks, checkpoint, options)
+    if importer.rejected:
+        print(f"{importer.rejected} ligne(s) ignorée(s)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chargement en masse de Firestore (émulateur par défaut)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help='Générer un jeu de données synthétique')
+    generate.add_argument('--establishments', type=int, default=1000)
+    generate.add_argument('--users', type=int, default=5000)
+    generate.add_argument('--replacements', type=int, default=50000)
+    generate.add_argument('--conversations', type=int, default=10000)
+    generate.add_argument('--messages-per-conversation', type=int, default=10,
+                          help='Nombre moyen de messages par conversation (défaut: 10)')
+    generate.add_argument('--seed', type=int, default=42, help='Graine des tirages aléatoires')
+    generate.add_argument('--base-date',
+                          help="Date de référence des dates générées (défaut: aujourd'hui, ou celle de la reprise)")
+
+    import_parser = subparsers.add_parser('import', help='Importer un export CSV ou JSONL')
+    import_parser.add_argument('--file', required=True, help='Fichier .csv ou .jsonl (un document par ligne)')
+    import_parser.add_argument('--collection', required=True,
+                               help="Chemin de la collection, ex: establishments ou 'conversations/{conversationId}/messages'")
+    import_parser.add_argument('--id-field', default='id', help='Champ utilisé comme ID de document (défaut: id)')
+
+    for subparser in (generate, import_parser):
+        subparser.add_argument('--workers', type=int, default=8, help='Commits simultanés (défaut: 8)')
+        subparser.add_argument('--batch-size', type=int, default=500,
+                               help="Opérations par WriteBatch, 500 au plus (défaut: 500)")
+        subparser.add_argument('--chunk-size', type=int, default=500,
+                               help='Documents (ou lignes) par lot de reprise (défaut: 500)')
+        subparser.add_argument('--max-retries', type=int, default=5,
+                               help="Nouvelles tentatives d'un lot en cas d'erreur transitoire (défaut: 5)")
+        subparser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH,
+                               help='Fichier de reprise (défaut: scripts/.bulk_loader_checkpoint.json)')
+        subparser.add_argument('--resume', action='store_true', help='Reprendre à partir du fichier de reprise')
+        subparser.add_argument('--allow-production', action='store_true',
+                               help="Autoriser l'écriture hors émulateur (FIRESTORE_EMULATOR_HOST absent)")
+    options = parser.parse_args(argv)
+    if not 1 <= options.batch_size <= 500:
+        parser.error('--batch-size doit être compris entre 1 et 500')
+    return options
+
+
+def main():
+    options = parse_args()
+    if not os.environ.get('FIRESTORE_EMULATOR_HOST') and not options.allow_production:
+        print("FIRESTORE_EMULATOR_HOST n'est pas défini : utiliser --allow-production pour écrire dans Firestore")
+        return 2
+
+    from config.database import get_db
+
+    key = fingerprint(options)
+    if options.resume:
+        checkpoint = Checkpoint.load(options.checkpoint, key)
+    else:
+        checkpoint = Checkpoint(options.checkpoint, key)
+    if options.command == 'generate':
+        options.base_date = resolve_base_date(checkpoint, options)
+    started_at = time.monotonic()
+    print(f"Chargement ({options.command}), {options.workers} commits simultanés")
+    try:
+        if options.command == 'generate':
+            run_generate(get_db(), checkpoint, options)
+        else:
+            run_import(get_db(), checkpoint, options)
+    except KeyboardInterrupt:
+        print(f"\nInterrompu : relancer la même commande avec --resume (reprise : {options.checkpoint})")
+        return 130
+    except ChunkFailed as e:
+        print(f"\nÉchec d'un lot : {e}")
+        print(f"Relancer la même commande avec --resume (reprise : {options.checkpoint})")
+        return 1
+
+    checkpoint.remove()
+    print(f"Chargement terminé en {time.monotonic() - started_at:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
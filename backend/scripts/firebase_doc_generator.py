@@ -2,40 +2,216 @@ import firebase_admin
 from firebase_admin import firestore
 import sys
 import os
-from datetime import datetime
+import argparse
+import base64
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import json
+import threading
 import time
 
 # Ajouter le chemin du dossier parent pour importer la config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.firebase_config import app
 
-def detect_reference_type(value, all_collections):
+# Cache des structures déjà analysées (mode incrémental)
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".firebase_doc_cache.json")
+# Champs candidats pour détecter les documents modifiés depuis la dernière analyse
+WATERMARK_FIELDS = ("updatedAt", "createdAt")
+WATERMARK_SAFETY_MARGIN = timedelta(minutes=5)
+
+# Appels Firestore simultanés, tous threads confondus (--concurrency)
+_firestore_slots = threading.BoundedSemaphore(8)
+
+def set_concurrency(concurrency):
+    global _firestore_slots
+    _firestore_slots = threading.BoundedSemaphore(concurrency)
+
+class BloomFilter:
+    """Filtre de Bloom pour tester l'appartenance d'un ID sans stocker tous les IDs"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.count = 0
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.sha256(value.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def saturated(self):
+        """Au-delà de sa capacité, le taux de faux positifs dépasse celui demandé"""
+        return self.count > self.capacity
+
+    def to_cache(self):
+        return {
+            "capacity": self.capacity,
+            "count": self.count,
+            "size": self.size,
+            "hashCount": self.hash_count,
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii")
+        }
+
+    @classmethod
+    def from_cache(cls, data):
+        bloom = cls.__new__(cls)
+        bloom.capacity = data["capacity"]
+        bloom.count = data["count"]
+        bloom.size = data["size"]
+        bloom.hash_count = data["hashCount"]
+        bloom.bits = bytearray(base64.b64decode(data["bits"]))
+        return bloom
+
+class ReferenceIndex:
+    """Index des IDs de documents de chaque collection racine.
+
+    Les IDs sont chargés une fois par collection (lecture des seuls noms de
+    documents), puis chaque valeur est résolue par un test d'appartenance local.
+    Au-delà de `bloom_threshold` IDs, la collection passe sur un filtre de Bloom.
+
+    En mode incrémental, l'index est repris du cache et seuls les documents
+    créés ou modifiés depuis le dernier passage sont lus. Les IDs des documents
+    supprimés restent dans l'index jusqu'au prochain chargement complet.
+    """
+
+    def __init__(self, bloom_threshold=100000, error_rate=0.001):
+        self.bloom_threshold = bloom_threshold
+        self.error_rate = error_rate
+        self.ids = {}
+        self.entries = {}
+
+    def _compact(self, ids):
+        if isinstance(ids, set) and len(ids) > self.bloom_threshold:
+            # Capacité doublée pour absorber les ajouts des passages incrémentaux suivants
+            bloom = BloomFilter(2 * len(ids), self.error_rate)
+            for doc_id in ids:
+                bloom.add(doc_id)
+            ids = bloom
+        return ids
+
+    def load_collection(self, collection_ref):
+        ids = set()
+        with _firestore_slots:
+            for doc in collection_ref.select(["__name__"]).stream():
+                ids.add(doc.id)
+        return self._compact(ids)
+
+    def refresh_collection(self, collection_ref, ids, watermark_field, since, page_size):
+        """Ajouter à `ids` les documents dont `watermark_field` est postérieur à `since`"""
+        base_query = collection_ref.where(watermark_field, ">", since).order_by(watermark_field).select([watermark_field])
+        last_doc = None
+        added = 0
+        while True:
+            query = base_query.limit(page_size)
+            if last_doc is not None:
+                query = query.start_after(last_doc)
+            with _firestore_slots:
+                page = list(query.stream())
+            for doc in page:
+                if doc.id not in ids:
+                    ids.add(doc.id)
+                    added += 1
+            if len(page) < page_size:
+                break
+            last_doc = page[-1]
+        return self._compact(ids), added
+
+    def _load_or_refresh(self, collection_ref, cached, watermark_field, options):
+        cached = cached or {}
+        since = cached.get("loadedAt")
+        if since and watermark_field:
+            try:
+                ids = self.deserialize_ids(cached["ids"])
+                ids, added = self.refresh_collection(collection_ref, ids, watermark_field,
+                                                     datetime.fromisoformat(since), options.page_size)
+                if not getattr(ids, "saturated", False):
+                    print(f"   🔑 {collection_ref.id}: {added} ID(s) ajouté(s) depuis {since}")
+                    return ids
+                print(f"   🔑 {collection_ref.id}: filtre de Bloom saturé, rechargement complet")
+            except Exception as e:
+                print(f"   ⚠️ {collection_ref.id}: index non rafraîchi, rechargement complet: {str(e)}")
+        return self.load_collection(collection_ref)
+
+    def load(self, collections, options, cached=None, watermark_fields=None):
+        """Charger les IDs de chaque collection.
+
+        `cached` est l'index sauvegardé au passage précédent et `watermark_fields`
+        le champ de reprise de chaque collection (cache des structures) ; sans eux,
+        ou pour une collection sans champ de reprise, tous les noms de documents sont lus.
+        """
+        cached = cached or {}
+        watermark_fields = watermark_fields or {}
+        # Marge de sécurité pour les écritures horodatées côté client pendant le chargement
+        loaded_at = (datetime.now(timezone.utc) - WATERMARK_SAFETY_MARGIN).isoformat()
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+            results = executor.map(
+                lambda collection: self._load_or_refresh(collection, cached.get(collection.id),
+                                                         watermark_fields.get(collection.id), options),
+                collections
+            )
+            for collection, ids in zip(collections, results):
+                self.ids[collection.id] = ids
+                self.entries[collection.id] = {"ids": self.serialize_ids(ids), "loadedAt": loaded_at}
+        print(f"🔑 Index des IDs chargé pour {len(self.ids)} collections en {time.time() - start_time:.2f} secondes")
+
+    @staticmethod
+    def serialize_ids(ids):
+        if isinstance(ids, BloomFilter):
+            return {"bloom": ids.to_cache()}
+        return {"set": sorted(ids)}
+
+    @staticmethod
+    def deserialize_ids(data):
+        if "bloom" in data:
+            return BloomFilter.from_cache(data["bloom"])
+        return set(data["set"])
+
+    def lookup(self, value):
+        for collection_id in sorted(self.ids):
+            if value in self.ids[collection_id]:
+                return collection_id
+        return None
+
+def detect_reference_type(value, reference_index):
     """Détecter si une valeur est une référence vers une autre collection"""
-    if isinstance(value, str):
-        # Vérifier si la valeur ressemble à un ID et correspond à une collection
-        for collection in all_collections:
-            if len(value) > 20 and any(doc.id == value for doc in collection.limit(1).stream()):
-                return collection.id
+    if isinstance(value, str) and value:
+        return reference_index.lookup(value)
     return None
 
-def analyze_document(doc, all_collections):
-
+def analyze_document(doc, reference_index):
     """Analyser la structure d'un document"""
     try:
         structure = {}
-        print(f"      🔍 Lecture des données du document...")
         data = doc.to_dict()
         if data:
-            print(f"      📄 Données trouvées: {len(data)} champs")
             for key, value in data.items():
-                print(f"      🏷️  Analyse du champ: {key}")
                 field_info = {"types": set(), "relations": set(), "example": None}
                 
                 if isinstance(value, dict):
                     field_info["types"].add("dict")
                     # Analyser le contenu du dictionnaire pour les références
                     for v in value.values():
-                        ref_type = detect_reference_type(v, all_collections)
+                        ref_type = detect_reference_type(v, reference_index)
                         if ref_type:
                             field_info["relations"].add(f"ref:{ref_type}")
                 
@@ -45,16 +221,16 @@ def analyze_document(doc, all_collections):
                         field_info["types"].add(f"list[{element_type}]")
                         # Vérifier si la liste contient des références
                         for v in value:
-                            ref_type = detect_reference_type(v, all_collections)
+                            ref_type = detect_reference_type(v, reference_index)
                             if ref_type:
-                                field_info["relations"].add(f"ref:{ref_type}")ce
+                                field_info["relations"].add(f"ref:{ref_type}")
                     else:
                         field_info["types"].add("list")
                 
                 elif isinstance(value, (str, int, float, bool)):
                     field_info["types"].add(type(value).__name__)
                     # Vérifier si c'est une référence
-                    ref_type = detect_reference_type(value, all_collections)
+                    ref_type = detect_reference_type(value, reference_index)
                     if ref_type:
                         field_info["relations"].add(f"ref:{ref_type}")
                     # Stocker un exemple de valeur pour la documentation
@@ -74,74 +250,340 @@ def analyze_document(doc, all_collections):
                     field_info["types"].add("unknown")
                 
                 structure[key] = field_info
-                print(f"      ✅ Analyse du champ {key}: {field_info}")
 
         return structure
     except Exception as e:
         print(f"⚠️ Erreur lors de l'analyse du document: {str(e)}")
         return {}
 
-def analyze_collection(collection_ref, all_collections, processed_collections=None):
+def fetch_documents(collection_ref, sample_size, page_size, watermark_field=None, since=None):
+    """Récupérer jusqu'à `sample_size` documents, page par page.
+
+    Avec `since`, seuls les documents dont `watermark_field` est postérieur
+    au point de reprise sont lus.
+    """
+    docs = []
+    last_doc = None
+    if since is not None:
+        base_query = collection_ref.where(watermark_field, ">", since).order_by(watermark_field)
+    else:
+        base_query = collection_ref.order_by("__name__")
+    while len(docs) < sample_size:
+        query = base_query.limit(min(page_size, sample_size - len(docs)))
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        with _firestore_slots:
+            page = list(query.stream())
+        docs.extend(page)
+        if len(page) < page_size:
+            break
+        last_doc = page[-1]
+    return docs
 
-    """Analyser récursivement une collection"""
+def list_subcollections(doc):
+    with _firestore_slots:
+        return list(doc.reference.collections())
+
+def collection_key(collection_ref):
+    """Clé d'une collection indépendante des IDs de documents parents (ex: conversations/messages)"""
+    return "/".join(collection_ref._path[::2])
+
+def new_structure():
+    return {
+        "fields": {},
+        "relations": set(),
+        "examples": {}
+    }
+
+def merge_document_structure(structure, doc_structure):
+    """Fusionner la structure d'un document dans celle de sa collection"""
+    for field, field_info in doc_structure.items():
+        if field not in structure["fields"]:
+            structure["fields"][field] = {"types": set(), "relations": set(), "examples": set()}
+        structure["fields"][field]["types"].update(field_info["types"])
+        structure["fields"][field]["relations"].update(field_info.get("relations", set()))
+        if "example" in field_info and field_info["example"]:
+            structure["fields"][field]["examples"].add(field_info["example"])
+
+def detect_watermark_field(structure):
+    """Champ datetime utilisable comme point de reprise pour le mode incrémental"""
+    for field in WATERMARK_FIELDS:
+        if "datetime" in structure["fields"].get(field, {}).get("types", set()):
+            return field
+    return None
+
+def analyze_collection(collection_ref, reference_index, options, cached=None):
+    """Analyser une collection (sans ses sous-collections).
+
+    En mode incrémental, seuls les documents modifiés depuis le dernier
+    passage sont lus et fusionnés dans la structure en cache.
+    Retourne l'entrée de cache mise à jour et la liste des sous-collections
+    trouvées dans les documents lus.
+    """
+    collection_path = collection_key(collection_ref)
     try:
-        if processed_collections is None:
-            processed_collections = set()
-        
-        collection_path = collection_ref._path[0]
         print(f"📁 Analyse de la collection: {collection_path}")
-        
-        if collection_path in processed_collections:
-            return {}
-        
-        processed_collections.add(collection_path)
-        structure = {
-            "fields": {},
-            "relations": set(),
-            "examples": {}
-        }
+        since = None
+        watermark_field = None
+        structure = new_structure()
+        if options.incremental and cached and cached.get("highWaterMark"):
+            watermark_field = cached["watermarkField"]
+            since = datetime.fromisoformat(cached["highWaterMark"])
+            structure = deserialize_structure(cached["structure"])
         
         # Récupérer les documents
-        print(f"   📄 Récupération des documents...")
         start_time = time.time()
         try:
-            docs = list(collection_ref.limit(10).stream())  # Augmenté à 10 pour plus de données
-
-            print(f"   ✅ {len(docs)} documents récupérés en {time.time() - start_time:.2f} secondes")
+            docs = fetch_documents(collection_ref, options.sample_size, options.page_size, watermark_field, since)
+            mode = f"modifiés depuis {since.isoformat()}" if since else "récupérés"
+            print(f"   ✅ {collection_path}: {len(docs)} documents {mode} en {time.time() - start_time:.2f} secondes")
         except Exception as e:
-            print(f"   ⚠️ Erreur lors de la récupération des documents: {str(e)}")
-            return {}
+            print(f"   ⚠️ Erreur lors de la récupération des documents de {collection_path}: {str(e)}")
+            return cached, []
         
         for doc in docs:
-            print(f"   📝 Analyse du document: {doc.id}")
-            doc_structure = analyze_document(doc, all_collections)
-            print(f"   📊 Structure trouvée: {len(doc_structure)} champs")
-            
-            # Fusionner la structure avec les structures précédentes
-            for field, field_info in doc_structure.items():
-                if field not in structure["fields"]:
-                    structure["fields"][field] = {"types": set(), "relations": set(), "examples": set()}
-                structure["fields"][field]["types"].update(field_info["types"])
-                structure["fields"][field]["relations"].update(field_info.get("relations", set()))
-                if "example" in field_info and field_info["example"]:
-                    structure["fields"][field]["examples"].add(field_info["example"])
-            
-            # Vérifier les sous-collections
-            print(f"   🔍 Recherche de sous-collections pour {doc.id}...")
-            subcollections = list(doc.reference.collections())
-            if subcollections:
-                print(f"   📚 {len(subcollections)} sous-collections trouvées")
-                for subcoll in subcollections:
-                    sub_structure = analyze_collection(subcoll, all_collections, processed_collections)
-                    if sub_structure:
-                        subcoll_name = subcoll.id
-                        structure[f"subcollection_{subcoll_name}"] = sub_structure
+            merge_document_structure(structure, analyze_document(doc, reference_index))
+        
+        # Lister les sous-collections de chaque document en parallèle ; le sémaphore global
+        # borne le nombre total d'appels Firestore simultanés à --concurrency
+        subcollections = []
+        with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+            for doc_subcollections in executor.map(list_subcollections, docs):
+                subcollections.extend(doc_subcollections)
         
         print(f"📊 Structure finale de la collection {collection_path}: {len(structure['fields'])} champs")
-        return structure
+        return cache_entry(structure, options), subcollections
     except Exception as e:
         print(f"⚠️ Erreur lors de l'analyse de la collection {collection_path}: {str(e)}")
-        return {}
+        return cached, []
+
+def refresh_collection_group(db, key, reference_index, options, cached):
+    """Mettre à jour une sous-collection en cache via une requête de groupe de collections.
+
+    Utile lorsque aucun document parent n'a été modifié (ex: nouveaux messages
+    d'une conversation). Nécessite un index de groupe sur le champ de reprise.
+    """
+    if not cached.get("highWaterMark"):
+        return cached
+    name = key.rsplit("/", 1)[-1]
+    since = datetime.fromisoformat(cached["highWaterMark"])
+    try:
+        docs = [
+            doc for doc in fetch_documents(db.collection_group(name), options.sample_size, options.page_size,
+                                           cached["watermarkField"], since)
+            if collection_key(doc.reference.parent) == key
+        ]
+    except Exception as e:
+        print(f"   ⚠️ Groupe {key} non rafraîchi (index de groupe manquant ?): {str(e)}")
+        return cached
+    print(f"   ✅ {key}: {len(docs)} documents modifiés (groupe de collections)")
+    structure = deserialize_structure(cached["structure"])
+    for doc in docs:
+        merge_document_structure(structure, analyze_document(doc, reference_index))
+    return cache_entry(structure, options)
+
+def crawl(db, collections, reference_index, options, cache):
+    """Analyser les collections et sous-collections en parallèle, niveau par niveau.
+
+    Au plus `options.concurrency` collections sont analysées simultanément.
+    Chaque sous-collection (ex: conversations/messages) n'est analysée qu'une fois.
+    Les entrées de `cache` sont mises à jour sur place.
+    """
+    processed = set()
+    level = []
+    for collection in collections:
+        key = collection_key(collection)
+        if key not in processed:
+            processed.add(key)
+            level.append(collection)
+
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        while level:
+            print(f"\n🚀 Analyse de {len(level)} collection(s) en parallèle...")
+            futures = {
+                executor.submit(analyze_collection, collection, reference_index, options,
+                                cache.get(collection_key(collection))): collection
+                for collection in level
+            }
+            next_level = []
+            for future in as_completed(futures):
+                key = collection_key(futures[future])
+                entry, subcollections = future.result()
+                if entry:
+                    cache[key] = entry
+                for subcoll in subcollections:
+                    sub_key = collection_key(subcoll)
+                    if sub_key not in processed:
+                        processed.add(sub_key)
+                        next_level.append(subcoll)
+            level = next_level
+
+        # Sous-collections en cache qu'aucun document modifié n'a fait apparaître
+        if options.incremental:
+            pending = [key for key in cache if "/" in key and key not in processed]
+            if pending:
+                print(f"\n🔄 Rafraîchissement de {len(pending)} sous-collection(s) en cache...")
+            futures = {
+                executor.submit(refresh_collection_group, db, key, reference_index, options, cache[key]): key
+                for key in pending
+            }
+            for future in as_completed(futures):
+                cache[futures[future]] = future.result()
+
+    return assemble_structure({key: deserialize_structure(entry["structure"]) for key, entry in cache.items()})
+
+def assemble_structure(structures):
+    """Rattacher chaque sous-collection à la structure de sa collection parente"""
+    full_structure = {}
+    for key in sorted(structures, key=lambda k: k.count("/"), reverse=True):
+        structure = structures[key]
+        if not structure:
+            continue
+        if "/" in key:
+            parent_key, name = key.rsplit("/", 1)
+            if structures.get(parent_key):
+                structures[parent_key][f"subcollection_{name}"] = structure
+        else:
+            full_structure[key] = structure
+    return full_structure
+
+def cache_entry(structure, options):
+    """Entrée de cache d'une collection : structure fusionnée et point de reprise"""
+    watermark_field = detect_watermark_field(structure)
+    high_water_mark = None
+    if watermark_field:
+        # Marge de sécurité pour les écritures horodatées côté client pendant l'analyse
+        high_water_mark = (options.started_at - WATERMARK_SAFETY_MARGIN).isoformat()
+    return {
+        "structure": serialize_structure(structure),
+        "watermarkField": watermark_field,
+        "highWaterMark": high_water_mark
+    }
+
+def serialize_structure(structure):
+    return {
+        "fields": {
+            field: {name: sorted(values) for name, values in field_info.items()}
+            for field, field_info in structure.get("fields", {}).items()
+        },
+        "relations": sorted(structure.get("relations", set()))
+    }
+
+def deserialize_structure(data):
+    structure = new_structure()
+    structure["relations"] = set(data.get("relations", []))
+    for field, field_info in data.get("fields", {}).items():
+        structure["fields"][field] = {name: set(values) for name, values in field_info.items()}
+    return structure
+
+def load_cache(path):
+    """Retourner le cache des structures et celui de l'index des IDs"""
+    if not os.path.exists(path):
+        return {}, {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CACHE_VERSION:
+            print("⚠️ Version du cache incompatible, analyse complète")
+            return {}, {}
+        return data.get("collections", {}), data.get("referenceIndex", {})
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Cache illisible, analyse complète: {str(e)}")
+        return {}, {}
+
+def save_cache(path, cache, reference_index):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "collections": cache, "referenceIndex": reference_index.entries},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def prune_cache(cache, collections):
+    """Retirer du cache les collections racines supprimées et leurs sous-collections"""
+    root_ids = {collection.id for collection in collections}
+    removed = [key for key in cache if key.split("/", 1)[0] not in root_ids]
+    for key in removed:
+        del cache[key]
+    return removed
+
+# Descriptions des champs connus ; les champs absents sont laissés sans description
+COMMON_FIELD_DESCRIPTIONS = {
+    "id": "Identifiant unique",
+    "name": "Nom",
+    "description": "Description détaillée",
+    "icon": "Icône associée",
+    "status": "État",
+    "professionId": "Référence profession",
+    "specialtyId": "Référence spécialité",
+    "establishmentId": "Référence établissement",
+    "replacementId": "Référence remplacement",
+    "conversationId": "Référence conversation",
+    "createdAt": "Date de création",
+    "updatedAt": "Date de mise à jour",
+}
+FIELD_DESCRIPTIONS = {
+    "users": {
+        "uid": "Identifiant unique de l'utilisateur",
+        "email": "Adresse email de l'utilisateur",
+        "firstName": "Prénom de l'utilisateur",
+        "lastName": "Nom de l'utilisateur",
+        "birthDate": "Date de naissance",
+        "specialityIds": "Liste des spécialités de l'utilisateur",
+        "role": "Rôle de l'utilisateur",
+        "isProfileComplete": "État de complétion du profil",
+        "onboardingStep": "Étape d'onboarding actuelle",
+    },
+    "establishments": {
+        "name": "Nom de l'établissement",
+        "address": "Adresse complète",
+        "coordinates": "Coordonnées géographiques",
+        "professionIds": "Liste des professions disponibles",
+        "image": "ID de l'image",
+    },
+    "professions": {"name": "Nom de la profession"},
+    "specialties": {
+        "name": "Nom de la spécialité",
+        "slug": "Identifiant URL-friendly",
+        "isActive": "État d'activation",
+    },
+    "replacements": {
+        "title": "Titre de l'annonce",
+        "name": "Nom court",
+        "startDate": "Date de début",
+        "endDate": "Date de fin",
+        "status": "État du remplacement",
+        "urgency": "Niveau d'urgence",
+        "workload": "Détails charge de travail",
+        "rate": "Informations tarification",
+        "periods": "Périodes de travail",
+    },
+    "conversations": {
+        "lastMessage": "Dernier message",
+        "participants": "Liste des participants",
+        "status": "État de la conversation",
+        "lastActivity": "Dernière activité",
+        "unreadCounts": "Messages non lus par participant",
+    },
+    "messages": {
+        "senderId": "Expéditeur",
+        "content": "Contenu du message",
+        "readBy": "Utilisateurs ayant lu le message",
+        "attachments": "Pièces jointes",
+    },
+    "attachments": {
+        "ownerId": "Utilisateur ayant téléversé le fichier",
+        "fileName": "Nom du fichier",
+        "contentType": "Type MIME",
+        "size": "Taille en octets",
+        "messageId": "Message auquel la pièce jointe est rattachée",
+    },
+}
+
+def get_field_description(collection_name, field):
+    """Description d'un champ pour la documentation ('' si inconnue)"""
+    return FIELD_DESCRIPTIONS.get(collection_name, {}).get(field) or COMMON_FIELD_DESCRIPTIONS.get(field, "")
+
+MARKDOWN_ERROR = "# Erreur lors de la génération de la documentation\n\n"
 
 def generate_markdown(structure, collection_name="", level=0):
     """Générer la documentation en markdown"""
@@ -168,9 +610,12 @@ def generate_markdown(structure, collection_name="", level=0):
                                 relations.add(f"    {coll_name}-->{target_coll}\n")
             markdown += "".join(sorted(relations))
             markdown += "```\n\n## Détails des collections\n\n"
+            for coll_name, coll_structure in sorted(structure.items()):
+                markdown += generate_markdown(coll_structure, coll_name, level + 1)
+            return markdown
         
         if collection_name:
-            markdown += "#" * (level + 2) + f" Collection: `{collection_name}`\n\n"
+            markdown += "#" * (2 * level + 1) + f" Collection: `{collection_name}`\n\n"
             if level == 2:
                 markdown += "_Sous-collection_\n\n"
         
@@ -178,7 +623,7 @@ def generate_markdown(structure, collection_name="", level=0):
             print(f"📝 Génération markdown pour {collection_name or 'racine'}")
             # Documenter les champs
             if "fields" in structure and structure["fields"]:
-                markdown += "### Structure des documents\n\n"
+                markdown += "#" * (2 * level + 2) + " Structure des documents\n\n"
                 markdown += "| Champ | Type(s) | Relations | Description | Exemples |\n"
                 markdown += "|-------|----------|-----------|-------------|----------|\n"
                 for field, field_info in sorted(structure["fields"].items()):
@@ -187,11 +632,12 @@ def generate_markdown(structure, collection_name="", level=0):
                     description = get_field_description(collection_name, field)
                     examples = " / ".join(sorted(field_info.get("examples", set())))[:100]
                     markdown += f"| `{field}` | {type_str} | {relations_str} | {description} | {examples} |\n"
+                markdown += "\n"
             
             # Traiter les sous-collections
             subcollections = {k: v for k, v in structure.items() if k.startswith("subcollection_")}
             if subcollections:
-                markdown += "\n### Sous-collections\n\n"
+                markdown += "#" * (2 * level + 2) + " Sous-collections\n\n"
                 for field, sub_structure in subcollections.items():
                     subcoll_name = field.replace("subcollection_", "")
                     markdown += generate_markdown(sub_structure, subcoll_name, level + 1)
@@ -201,9 +647,27 @@ def generate_markdown(structure, collection_name="", level=0):
         return markdown
     except Exception as e:
         print(f"⚠️ Erreur lors de la génération du markdown: {str(e)}")
-        return "# Erreur lors de la génération de la documentation\n\n"
+        return MARKDOWN_ERROR
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Générer docs/firebase_structure.md à partir de Firestore")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Nombre maximal d'appels Firestore simultanés, toutes collections confondues (défaut: 8)")
+    parser.add_argument("--sample-size", type=int, default=10,
+                        help="Nombre de documents échantillonnés par collection (défaut: 10)")
+    parser.add_argument("--page-size", type=int, default=100,
+                        help="Taille des pages lors de la lecture des documents (défaut: 100)")
+    parser.add_argument("--bloom-threshold", type=int, default=100000,
+                        help="Nombre d'IDs au-delà duquel une collection est indexée par filtre de Bloom (défaut: 100000)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Ne lire que les documents modifiés depuis la dernière analyse (cache local)")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_PATH,
+                        help="Fichier de cache des structures (défaut: scripts/.firebase_doc_cache.json)")
+    return parser.parse_args(argv)
 
 def main():
+    options = parse_args()
+    set_concurrency(options.concurrency)
     try:
         print("\n🔥 Démarrage de l'analyse de la base de données Firebase...")
         
@@ -219,26 +683,39 @@ def main():
         print("\n📚 Récupération des collections racines...")
         try:
             collections = list(db.collections())
-            all_collections = collections  # Pour la détection des références
 
             print(f"📊 Nombre de collections trouvées: {len(collections)}")
         except Exception as e:
             print(f"❌ Erreur lors de la récupération des collections: {str(e)}")
             sys.exit(1)
         
-        # Analyser chaque collection
-        full_structure = {}
-        processed_collections = set()
+        # En mode incrémental, repartir des structures et de l'index déjà calculés
+        cache, index_cache = load_cache(options.cache_file) if options.incremental else ({}, {})
+        if options.incremental:
+            removed = prune_cache(cache, collections)
+            print(f"🗂️ Mode incrémental: {len(cache)} collection(s) en cache, {len(removed)} supprimée(s)")
         
-        for collection in collections:
-            print(f"\n🔍 Analyse de la collection racine: {collection.id}")
-            collection_structure = analyze_collection(collection, all_collections, processed_collections)
-            if collection_structure:
-                full_structure[collection.id] = collection_structure
+        # Charger les IDs de chaque collection pour la détection des références
+        reference_index = ReferenceIndex(bloom_threshold=options.bloom_threshold)
+        watermark_fields = {key: entry.get("watermarkField") for key, entry in cache.items() if "/" not in key}
+        reference_index.load(collections, options, index_cache, watermark_fields)
+        
+        # Analyser les collections en parallèle
+        options.started_at = datetime.now(timezone.utc)
+        start_time = time.time()
+        full_structure = crawl(db, collections, reference_index, options, cache)
+        print(f"\n⏱️ Analyse terminée en {time.time() - start_time:.2f} secondes")
+        
+        save_cache(options.cache_file, cache, reference_index)
+        print(f"💾 Cache mis à jour: {options.cache_file}")
         
         # Générer le markdown
         print("\n📝 Génération du markdown...")
         markdown = generate_markdown(full_structure)
+        if MARKDOWN_ERROR in markdown:
+            # Ne pas remplacer la documentation existante par la page d'erreur
+            print("\n❌ Génération du markdown échouée, docs/firebase_structure.md inchangé")
+            sys.exit(1)
         
         # Écrire dans le fichier
         docs_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "docs", "firebase_structure.md")
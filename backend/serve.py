@@ -0,0 +1,36 @@
+# ELIO_Backend/serve.py
+#
+# Point d'entrée de production :
+#   SERVER_MODE=sync  python serve.py   -> serveur Flask threadé
+#   SERVER_MODE=async python serve.py   -> uvicorn (ASGI)
+
+import sys
+from config import settings
+from config.logging_config import get_logger, setup_logging
+
+logger = get_logger('serve')
+
+
+def main():
+    setup_logging()
+    if settings.SERVER_MODE == 'async':
+        import uvicorn
+        logger.info("Démarrage en mode async (uvicorn)", extra={'host': settings.HOST, 'port': settings.PORT})
+        uvicorn.run(
+            'asgi:asgi_app',
+            host=settings.HOST,
+            port=settings.PORT,
+            workers=settings.ASYNC_WORKERS,
+            log_level='debug' if settings.DEBUG else 'info'
+        )
+    elif settings.SERVER_MODE == 'sync':
+        from app import app
+        logger.info("Démarrage en mode sync (Flask)", extra={'host': settings.HOST, 'port': settings.PORT})
+        app.run(host=settings.HOST, port=settings.PORT, debug=settings.DEBUG, threaded=True)
+    else:
+        logger.error("SERVER_MODE inconnu (valeurs possibles: sync, async)", extra={'serverMode': settings.SERVER_MODE})
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
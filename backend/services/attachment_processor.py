@@ -0,0 +1,211 @@
+import hashlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+from config import settings
+from config.logging_config import get_logger
+from middleware.metrics import trace_firestore
+from services.attachment_storage import COPY_BLOCK_SIZE, attachment_storage
+
+try:
+    from PIL import Image
+except ImportError:  # Dépendance optionnelle : pas de miniatures sans Pillow
+    Image = None
+
+logger = get_logger('services.attachment_processor')
+
+THUMBNAIL_SIZE = (320, 320)
+# Au-delà, l'image n'est pas décodée pour la miniature
+MAX_THUMBNAIL_SOURCE_SIZE = 20 * 1024 * 1024
+# Documents lus par requête lors d'un balayage
+SWEEP_PAGE_SIZE = 100
+
+
+def thumbnail_path(path):
+    return f'{path}.thumb.jpg'
+
+
+class AttachmentProcessor:
+    """Traitement des pièces jointes après upload, hors du thread de la requête.
+
+    Chaque pièce jointe terminée passe par un pool de threads qui calcule son
+    empreinte SHA-256, lit les dimensions des images et en produit une
+    miniature, puis passe le document au statut `ready` (ou `failed`).
+
+    Un balayage périodique relance les pièces jointes restées en `processing`
+    (worker arrêté pendant le traitement) et supprime celles qu'aucun message
+    n'a rattachées après `unlinked_ttl`.
+    """
+
+    def __init__(self, storage, max_workers=2, processing_timeout=600, unlinked_ttl=86400):
+        self._storage = storage
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='attachment')
+        self._lock = threading.Lock()
+        self._processing_timeout = timedelta(seconds=processing_timeout)
+        self._unlinked_ttl = timedelta(seconds=unlinked_ttl)
+        self._sweeper = None
+        self.queued = 0
+        self.processed = 0
+        self.failures = 0
+        self.retried = 0
+        self.deleted = 0
+
+    def submit(self, db, attachment_id, attachment):
+        with self._lock:
+            self.queued += 1
+        self._executor.submit(self._run, db, attachment_id, attachment)
+
+    def _run(self, db, attachment_id, attachment):
+        attachment_ref = db.collection('attachments').document(attachment_id)
+        try:
+            metadata = self._extract(attachment)
+            update = {'status': 'ready', 'metadata': metadata, 'processedAt': datetime.utcnow()}
+            with self._lock:
+                self.processed += 1
+        except Exception:
+            logger.exception("Erreur lors du traitement de la pièce jointe", extra={'attachmentId': attachment_id})
+            update = {'status': 'failed', 'processedAt': datetime.utcnow()}
+            with self._lock:
+                self.failures += 1
+        finally:
+            with self._lock:
+                self.queued -= 1
+
+        with trace_firestore('update') as call:
+            attachment_ref.update(update)
+            call.writes = 1
+
+    def _extract(self, attachment):
+        path = attachment['storagePath']
+        is_image = attachment.get('contentType', '').startswith('image/')
+        keep_image = is_image and Image is not None and attachment['size'] <= MAX_THUMBNAIL_SOURCE_SIZE
+
+        digest = hashlib.sha256()
+        image_bytes = io.BytesIO() if keep_image else None
+        with self._storage.open(path) as source:
+            while True:
+                block = source.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                if image_bytes is not None:
+                    image_bytes.write(block)
+
+        metadata = {'sha256': digest.hexdigest()}
+        if image_bytes is not None:
+            image_bytes.seek(0)
+            try:
+                metadata.update(self._thumbnail(path, image_bytes))
+            except Exception:
+                # Image illisible : la pièce jointe reste utilisable, sans miniature
+                logger.warning("Miniature impossible", extra={'storagePath': path})
+        return metadata
+
+    def _thumbnail(self, path, image_bytes):
+        with Image.open(image_bytes) as image:
+            metadata = {'width': image.width, 'height': image.height}
+            image.thumbnail(THUMBNAIL_SIZE)
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=80)
+        self._storage.save(thumbnail_path(path), output.getvalue(), 'image/jpeg')
+        metadata['thumbnail'] = True
+        return metadata
+
+    # --- Balayage des pièces jointes abandonnées -------------------------
+
+    def start_sweeper(self, db, interval):
+        """Lancer le balayage toutes les `interval` secondes (idempotent)"""
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop, args=(db, interval), name='attachment-sweeper', daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep_loop(self, db, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep(db)
+            except Exception:
+                logger.exception("Erreur lors du balayage des pièces jointes")
+
+    def sweep(self, db):
+        now = datetime.utcnow()
+        collection = db.collection('attachments')
+        stuck = collection.where('status', '==', 'processing').where('updatedAt', '<', now - self._processing_timeout)
+        for snapshot in self._stream(stuck):
+            self._retry(db, snapshot, now)
+        unlinked = collection.where('messageId', '==', None).where('updatedAt', '<', now - self._unlinked_ttl)
+        for snapshot in self._stream(unlinked):
+            self._delete(db, snapshot)
+
+    @staticmethod
+    def _stream(query):
+        """Lire les résultats page par page, ordonnés sur updatedAt"""
+        query = query.order_by('updatedAt')
+        last = None
+        while True:
+            page_query = query.limit(SWEEP_PAGE_SIZE)
+            if last is not None:
+                page_query = page_query.start_after(last)
+            with trace_firestore('query') as call:
+                page = list(page_query.stream())
+                call.reads = len(page)
+            yield from page
+            if len(page) < SWEEP_PAGE_SIZE:
+                return
+            last = page[-1]
+
+    def _retry(self, db, snapshot, now):
+        # La précondition réserve la pièce jointe : un seul worker la relance
+        try:
+            with trace_firestore('update') as call:
+                snapshot.reference.update(
+                    {'updatedAt': now}, option=db.write_option(last_update_time=snapshot.update_time)
+                )
+                call.writes = 1
+        except (FailedPrecondition, NotFound):
+            return
+        with self._lock:
+            self.retried += 1
+        logger.info("Traitement de pièce jointe relancé", extra={'attachmentId': snapshot.id})
+        self.submit(db, snapshot.id, snapshot.to_dict())
+
+    def _delete(self, db, snapshot):
+        # La précondition échoue si un message a rattaché la pièce jointe entre-temps
+        try:
+            with trace_firestore('delete') as call:
+                snapshot.reference.delete(option=db.write_option(last_update_time=snapshot.update_time))
+                call.writes = 1
+        except (FailedPrecondition, NotFound):
+            return
+        path = snapshot.get('storagePath')
+        self._storage.delete(path)
+        self._storage.delete(thumbnail_path(path))
+        with self._lock:
+            self.deleted += 1
+        logger.info("Pièce jointe non rattachée supprimée", extra={'attachmentId': snapshot.id})
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'processed': self.processed,
+            'failures': self.failures,
+            'retried': self.retried,
+            'deleted': self.deleted
+        }
+
+
+attachment_processor = AttachmentProcessor(
+    attachment_storage,
+    max_workers=settings.ATTACHMENT_WORKERS,
+    processing_timeout=settings.ATTACHMENT_PROCESSING_TIMEOUT,
+    unlinked_ttl=settings.ATTACHMENT_UNLINKED_TTL
+)
@@ -0,0 +1,161 @@
+import os
+from datetime import timedelta
+from urllib.parse import quote
+
+from config import settings
+
+# Taille des blocs copiés du flux de la requête vers le stockage
+COPY_BLOCK_SIZE = 64 * 1024
+# GCS impose des morceaux multiples de 256 Kio (sauf le dernier)
+GCS_CHUNK_ALIGNMENT = 256 * 1024
+
+
+class IncompleteChunk(Exception):
+    """Le client a envoyé moins d'octets qu'annoncé (connexion interrompue)"""
+
+
+class LocalDiskStorage:
+    """Stockage des pièces jointes sur le disque local (développement et tests)"""
+
+    chunk_alignment = 1
+
+    def __init__(self, root):
+        self._root = os.path.abspath(root)
+
+    def _path(self, path):
+        full_path = os.path.abspath(os.path.join(self._root, path))
+        if not full_path.startswith(self._root + os.sep):
+            raise ValueError(f"Invalid storage path: {path}")
+        return full_path
+
+    def create_upload(self, path, content_type, size):
+        full_path = self._path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.truncate(size)
+        return {}
+
+    def write_chunk(self, path, session, offset, length, total, stream):
+        """Écrire `length` octets du flux à `offset`. Retourne le nombre d'octets reçus au total"""
+        with open(self._path(path), 'r+b') as f:
+            f.seek(offset)
+            remaining = length
+            while remaining:
+                block = stream.read(min(COPY_BLOCK_SIZE, remaining))
+                if not block:
+                    raise IncompleteChunk(f"Expected {length} bytes, got {length - remaining}")
+                f.write(block)
+                remaining -= len(block)
+        return offset + length
+
+    def open(self, path):
+        return open(self._path(path), 'rb')
+
+    def save(self, path, data, content_type):
+        full_path = self._path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+
+    def delete(self, path):
+        try:
+            os.remove(self._path(path))
+        except FileNotFoundError:
+            pass
+
+    def download_url(self, path, file_name, content_type, inline):
+        # Pas d'URL directe : le fichier est servi par l'API
+        return None
+
+    def local_path(self, path):
+        return self._path(path)
+
+
+class _LimitedStream:
+    """Flux limité à `length` octets, lu par blocs pour ne jamais tout charger en mémoire"""
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        block = self._stream.read(min(size, COPY_BLOCK_SIZE))
+        if not block:
+            raise IncompleteChunk("Client disconnected during upload")
+        self._remaining -= len(block)
+        return block
+
+    def __len__(self):
+        return self._remaining
+
+
+class GCSStorage:
+    """Stockage des pièces jointes dans Cloud Storage via des sessions d'upload résumables.
+
+    Chaque morceau reçu est relayé en flux vers la session GCS, sans être
+    conservé en mémoire ni sur disque par le backend.
+    """
+
+    chunk_alignment = GCS_CHUNK_ALIGNMENT
+
+    def __init__(self, bucket_name):
+        from firebase_admin import storage
+        import requests
+
+        self._bucket = storage.bucket(bucket_name or None)
+        self._http = requests.Session()
+
+    def create_upload(self, path, content_type, size):
+        blob = self._bucket.blob(path)
+        session_url = blob.create_resumable_upload_session(content_type=content_type, size=size)
+        return {'sessionUrl': session_url}
+
+    def write_chunk(self, path, session, offset, length, total, stream):
+        headers = {
+            'Content-Length': str(length),
+            'Content-Range': f'bytes {offset}-{offset + length - 1}/{total}' if length else f'bytes */{total}'
+        }
+        response = self._http.put(session['sessionUrl'], data=_LimitedStream(stream, length), headers=headers)
+        if response.status_code in (200, 201):
+            return total
+        if response.status_code == 308:
+            # Range: bytes=0-N, absent si GCS n'a encore rien conservé
+            received = response.headers.get('Range')
+            return int(received.rsplit('-', 1)[1]) + 1 if received else 0
+        response.raise_for_status()
+        raise RuntimeError(f"Unexpected GCS upload status {response.status_code}")
+
+    def open(self, path):
+        return self._bucket.blob(path).open('rb')
+
+    def save(self, path, data, content_type):
+        self._bucket.blob(path).upload_from_string(data, content_type=content_type)
+
+    def delete(self, path):
+        blob = self._bucket.blob(path)
+        if blob.exists():
+            blob.delete()
+
+    def download_url(self, path, file_name, content_type, inline):
+        # Type et disposition imposés par l'URL signée, quel que soit le type enregistré sur l'objet
+        disposition = 'inline' if inline else f"attachment; filename*=UTF-8''{quote(file_name)}"
+        return self._bucket.blob(path).generate_signed_url(
+            expiration=timedelta(minutes=15), version='v4',
+            response_type=content_type, response_disposition=disposition
+        )
+
+    def local_path(self, path):
+        return None
+
+
+def _create_storage():
+    if settings.ATTACHMENT_STORAGE == 'gcs':
+        return GCSStorage(settings.ATTACHMENT_BUCKET)
+    return LocalDiskStorage(settings.ATTACHMENT_LOCAL_DIR)
+
+
+attachment_storage = _create_storage()
@@ -0,0 +1,80 @@
+from google.api_core.exceptions import GoogleAPICallError
+
+from middleware.metrics import trace_firestore
+
+# Limite Firestore du nombre d'opérations par WriteBatch
+MAX_BATCH_OPERATIONS = 500
+
+
+class BatchWriter:
+    """Regrouper des écritures Firestore en commits WriteBatch de 500 opérations max.
+
+    Les écritures sont ajoutées par groupes (une clé + une liste d'opérations).
+    Un groupe n'est jamais coupé entre deux batchs, ce qui garantit son
+    atomicité. Si un batch échoue, ses groupes sont rejoués un par un pour
+    isoler celui qui pose problème.
+    """
+
+    def __init__(self, db, max_operations=MAX_BATCH_OPERATIONS):
+        self._db = db
+        self._max_operations = max_operations
+        self._batches = [[]]
+        self._sizes = [0]
+
+    def add(self, key, operations):
+        """Ajouter un groupe d'opérations ('set'|'update'|'delete', ref, data, options)"""
+        operations = list(operations)
+        if len(operations) > self._max_operations:
+            raise ValueError(f"A group cannot exceed {self._max_operations} operations")
+        if self._sizes[-1] + len(operations) > self._max_operations:
+            self._batches.append([])
+            self._sizes.append(0)
+        self._batches[-1].append((key, operations))
+        self._sizes[-1] += len(operations)
+
+    def commit(self):
+        """Valider tous les batchs. Retourne {clé: exception} pour les groupes en échec"""
+        failures = {}
+        for groups in self._batches:
+            if not groups:
+                continue
+            try:
+                self._commit_groups(groups)
+            except GoogleAPICallError as e:
+                if len(groups) == 1:
+                    failures[groups[0][0]] = e
+                    continue
+                # Rejouer chaque groupe séparément pour n'échouer que le fautif
+                for key, operations in groups:
+                    try:
+                        self._commit_groups([(key, operations)])
+                    except GoogleAPICallError as group_error:
+                        failures[key] = group_error
+        self._batches = [[]]
+        self._sizes = [0]
+        return failures
+
+    def _commit_groups(self, groups):
+        batch = self._db.batch()
+        count = 0
+        for _, operations in groups:
+            for operation in operations:
+                kind, ref = operation[0], operation[1]
+                data = operation[2] if len(operation) > 2 else None
+                options = operation[3] if len(operation) > 3 else {}
+                if kind == 'set':
+                    batch.set(ref, data, **options)
+                elif kind == 'update':
+                    batch.update(ref, data, **options)
+                elif kind == 'delete':
+                    batch.delete(ref, **options)
+                else:
+                    raise ValueError(f"Unknown batch operation: {kind}")
+                count += 1
+        with trace_firestore('commit') as call:
+            batch.commit()
+            call.writes = count
+
+    @property
+    def operation_count(self):
+        return sum(self._sizes)
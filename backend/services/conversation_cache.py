@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+from middleware.metrics import trace_firestore
+
+
+class ConversationMembershipCache:
+    """Cache LRU borné des participants de chaque conversation.
+
+    Permet de vérifier qu'un utilisateur fait partie d'une conversation sans
+    relire le document `conversations/{id}` à chaque message. Les entrées
+    expirent après `ttl` secondes, ce qui borne le délai de prise en compte
+    d'une modification faite par un autre worker ; les écritures locales les
+    invalident explicitement.
+    """
+
+    def __init__(self, max_size=5000, ttl=60):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # --- Accès ------------------------------------------------------------
+
+    def get_participants(self, db, conversation_id):
+        """Retourner les participants de la conversation, ou None si elle n'existe pas"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(conversation_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        with trace_firestore('get') as call:
+            conversation = db.collection('conversations').document(conversation_id).get()
+            call.reads = 1
+
+        if not conversation.exists:
+            self.invalidate(conversation_id)
+            return None
+        participants = frozenset((conversation.to_dict() or {}).get('participants', []))
+        self.put(conversation_id, participants)
+        return participants
+
+    def is_participant(self, db, conversation_id, uid):
+        """Retourner None si la conversation n'existe pas, sinon un booléen"""
+        participants = self.get_participants(db, conversation_id)
+        if participants is None:
+            return None
+        return uid in participants
+
+    def put(self, conversation_id, participants):
+        with self._lock:
+            self._entries[conversation_id] = (frozenset(participants), time.monotonic() + self._ttl)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, conversation_id):
+        with self._lock:
+            if self._entries.pop(conversation_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+conversation_cache = ConversationMembershipCache()
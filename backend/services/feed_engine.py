@@ -0,0 +1,184 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from config import settings
+from middleware.metrics import trace_firestore
+from services.replacement_index import replacement_index
+
+_MAX_DATE = datetime.max.replace(tzinfo=timezone.utc)
+# Les remplacements urgents passent en tête du fil
+URGENCY_RANKS = {'high': 0}
+
+
+def rank_key(replacement_id, entry):
+    """Clé de tri du fil : urgence, puis date de début la plus proche"""
+    urgency = URGENCY_RANKS.get(entry['data'].get('urgency'), 1)
+    return (urgency, entry['start'] or _MAX_DATE, replacement_id)
+
+
+class _Feed:
+    """Fil classé d'un utilisateur : clés de tri maintenues dans une liste triée"""
+
+    def __init__(self, uid, profession_id, specialty_ids):
+        self.uid = uid
+        self.profession_id = profession_id
+        self.specialty_ids = frozenset(specialty_ids or ())
+        self.loaded_at = time.monotonic()
+        self.keys = {}
+        self.ranked = []
+
+    def matches(self, entry):
+        data = entry['data']
+        if not self.profession_id or data.get('professionId') != self.profession_id:
+            return False
+        # Sans spécialité déclarée, toute la profession correspond ; un remplacement
+        # sans spécialité correspond à tous les profils de la profession
+        specialty_id = data.get('specialtyId')
+        return not self.specialty_ids or not specialty_id or specialty_id in self.specialty_ids
+
+    def put(self, replacement_id, entry):
+        self.discard(replacement_id)
+        key = rank_key(replacement_id, entry)
+        self.keys[replacement_id] = key
+        insort(self.ranked, key)
+
+    def discard(self, replacement_id):
+        key = self.keys.pop(replacement_id, None)
+        if key is None:
+            return
+        position = bisect_left(self.ranked, key)
+        if position < len(self.ranked) and self.ranked[position] == key:
+            del self.ranked[position]
+
+    def page(self, offset, limit):
+        return [key[2] for key in self.ranked[offset:offset + limit]]
+
+
+class FeedEngine:
+    """Fils de remplacements matérialisés pour les utilisateurs actifs.
+
+    Le fil d'un utilisateur est construit à sa première consultation à partir
+    de l'index des remplacements ouverts, puis tenu à jour incrémentalement :
+    chaque changement de l'index ne touche que les fils des utilisateurs de
+    la profession concernée, et une mise à jour de profil reconstruit le fil.
+    Les profils sont relus après `profile_ttl` secondes pour prendre en compte
+    les modifications faites par d'autres processus.
+    """
+
+    def __init__(self, index, max_users=10000, profile_ttl=300):
+        self._index = index
+        self._max_users = max_users
+        self._profile_ttl = profile_ttl
+        self._lock = threading.RLock()
+        self._feeds = OrderedDict()
+        self._users_by_profession = {}
+        self.builds = 0
+        self.incremental_updates = 0
+        self.evictions = 0
+        index.add_change_callback(self._on_replacement_change)
+
+    # --- Accès ------------------------------------------------------------
+
+    def get_page(self, db, uid, offset, limit):
+        """Retourner (remplacements, total) du fil, ou None si l'utilisateur n'existe pas"""
+        feed = self._get_feed(db, uid)
+        if feed is None:
+            return None
+        with self._lock:
+            replacement_ids = feed.page(offset, limit)
+            total = len(feed.ranked)
+        return self._index.serialize_many(replacement_ids), total
+
+    def _get_feed(self, db, uid):
+        with self._lock:
+            feed = self._feeds.get(uid)
+            if feed is not None and time.monotonic() - feed.loaded_at < self._profile_ttl:
+                self._feeds.move_to_end(uid)
+                return feed
+
+        with trace_firestore('get') as call:
+            user = db.collection('users').document(uid).get()
+            call.reads = 1
+        if not user.exists:
+            self.forget(uid)
+            return None
+        profile = user.to_dict() or {}
+        return self.set_profile(uid, profile.get('professionId'), profile.get('specialityIds'))
+
+    # --- Mises à jour -----------------------------------------------------
+
+    def set_profile(self, uid, profession_id, specialty_ids):
+        """(Re)construire le fil d'un utilisateur à partir de son profil"""
+        feed = _Feed(uid, profession_id, specialty_ids)
+        with self._lock:
+            # Lecture de l'index sous le verrou : aucun changement ne peut être manqué
+            candidates = self._index.by_profession(profession_id) if profession_id else {}
+            self._detach(uid)
+            for replacement_id, entry in candidates.items():
+                if feed.matches(entry):
+                    feed.put(replacement_id, entry)
+            self._feeds[uid] = feed
+            if profession_id:
+                self._users_by_profession.setdefault(profession_id, set()).add(uid)
+            while len(self._feeds) > self._max_users:
+                evicted, _ = self._feeds.popitem(last=False)
+                self._detach(evicted)
+                self.evictions += 1
+            self.builds += 1
+        return feed
+
+    def update_profile(self, uid, patch):
+        """Appliquer un patch de profil (update_user) si l'utilisateur a un fil en mémoire"""
+        if 'professionId' not in patch and 'specialityIds' not in patch:
+            return
+        with self._lock:
+            feed = self._feeds.get(uid)
+            if feed is None:
+                return
+            profession_id = patch.get('professionId', feed.profession_id)
+            specialty_ids = patch.get('specialityIds', feed.specialty_ids)
+        self.set_profile(uid, profession_id, specialty_ids)
+
+    def forget(self, uid):
+        with self._lock:
+            self._detach(uid)
+
+    def _detach(self, uid):
+        feed = self._feeds.pop(uid, None)
+        if feed is None or not feed.profession_id:
+            return
+        users = self._users_by_profession.get(feed.profession_id)
+        if users is not None:
+            users.discard(uid)
+            if not users:
+                del self._users_by_profession[feed.profession_id]
+
+    def _on_replacement_change(self, replacement_id, previous, current):
+        professions = {entry['data'].get('professionId') for entry in (previous, current) if entry is not None}
+        with self._lock:
+            for profession_id in professions:
+                for uid in self._users_by_profession.get(profession_id, ()):
+                    feed = self._feeds[uid]
+                    if current is not None and feed.matches(current):
+                        feed.put(replacement_id, current)
+                    else:
+                        feed.discard(replacement_id)
+                    self.incremental_updates += 1
+
+    def stats(self):
+        return {
+            'users': len(self._feeds),
+            'builds': self.builds,
+            'incrementalUpdates': self.incremental_updates,
+            'evictions': self.evictions
+        }
+
+
+feed_engine = FeedEngine(
+    replacement_index,
+    max_users=settings.FEED_MAX_USERS,
+    profile_ttl=settings.FEED_PROFILE_TTL
+)
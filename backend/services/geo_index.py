@@ -0,0 +1,131 @@
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def parse_coordinates(value):
+    """Extraire (latitude, longitude) d'un dict {latitude, longitude} ou d'un GeoPoint"""
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        latitude, longitude = value.get('latitude'), value.get('longitude')
+    else:
+        latitude, longitude = getattr(value, 'latitude', None), getattr(value, 'longitude', None)
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_deltas(latitude, radius_km):
+    """Demi-largeurs (en degrés de latitude et de longitude) du rectangle contenant le cercle.
+
+    Calculées sur la même sphère que haversine_km : la longitude utilise
+    asin(sin(r/R) / cos φ) et non la latitude du centre, sans quoi le cercle
+    déborde du rectangle loin de l'équateur.
+    """
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    if angular_radius >= math.pi:
+        return 180.0, 180.0
+    delta_lat = math.degrees(angular_radius)
+    if abs(latitude) + delta_lat >= 90.0:
+        # Le cercle contient un pôle : toutes les longitudes sont concernées
+        return delta_lat, 180.0
+    ratio = math.sin(angular_radius) / math.cos(math.radians(latitude))
+    if ratio >= 1.0:
+        return delta_lat, 180.0
+    return delta_lat, math.degrees(math.asin(ratio))
+
+
+class GeoIndex:
+    """Index spatial en mémoire des établissements, sur une grille de cellules.
+
+    Chaque établissement est rangé dans la cellule (lat, lon) de `cell_size`
+    degrés qui le contient. Une recherche par rayon ne parcourt que les
+    cellules couvrant la zone demandée, puis filtre par distance réelle.
+    L'index est alimenté par le listener des établissements du magasin de
+    données de référence (voir services/reference_data.py).
+    """
+
+    def __init__(self, cell_size=0.1):
+        self._cell_size = cell_size
+        self._lock = threading.RLock()
+        self._points = {}
+        self._cells = {}
+
+    # --- Mise à jour de l'index -------------------------------------------
+
+    def _cell(self, latitude, longitude):
+        return (math.floor(latitude / self._cell_size), math.floor(longitude / self._cell_size))
+
+    def upsert(self, establishment_id, coordinates):
+        with self._lock:
+            self.remove(establishment_id)
+            point = parse_coordinates(coordinates)
+            if point is None:
+                return
+            self._points[establishment_id] = point
+            self._cells.setdefault(self._cell(*point), set()).add(establishment_id)
+
+    def remove(self, establishment_id):
+        with self._lock:
+            point = self._points.pop(establishment_id, None)
+            if point is None:
+                return
+            cell = self._cell(*point)
+            ids = self._cells.get(cell)
+            if ids is not None:
+                ids.discard(establishment_id)
+                if not ids:
+                    del self._cells[cell]
+
+    # --- Recherche --------------------------------------------------------
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """Retourner {id établissement: distance en km} dans le rayon demandé"""
+        delta_lat, delta_lon = bounding_deltas(latitude, radius_km)
+
+        min_lat = math.floor(max(-90.0, latitude - delta_lat) / self._cell_size)
+        max_lat = math.floor(min(90.0, latitude + delta_lat) / self._cell_size)
+        min_lon = math.floor((longitude - delta_lon) / self._cell_size)
+        max_lon = math.floor((longitude + delta_lon) / self._cell_size)
+        lon_cells_per_turn = round(360 / self._cell_size)
+
+        with self._lock:
+            cell_count = (max_lat - min_lat + 1) * (max_lon - min_lon + 1)
+            if cell_count >= len(self._cells):
+                # Rayon très large : parcourir directement les cellules occupées
+                candidates = self._points.keys()
+            else:
+                candidates = []
+                for lat_cell in range(min_lat, max_lat + 1):
+                    for lon_cell in range(min_lon, max_lon + 1):
+                        # Gérer le passage de l'antiméridien
+                        wrapped = (lon_cell + lon_cells_per_turn // 2) % lon_cells_per_turn - lon_cells_per_turn // 2
+                        candidates.extend(self._cells.get((lat_cell, wrapped), ()))
+
+            results = {}
+            for establishment_id in candidates:
+                point_lat, point_lon = self._points[establishment_id]
+                distance = haversine_km(latitude, longitude, point_lat, point_lon)
+                if distance <= radius_km:
+                    results[establishment_id] = distance
+        return results
+
+    def __len__(self):
+        return len(self._points)
+
+
+geo_index = GeoIndex()
@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class HotPageCache:
+    """Cache LRU de la page la plus récente de chaque conversation.
+
+    La plupart des écrans de chat ouvrent la dernière page de messages :
+    on garde donc le corps JSON déjà sérialisé de cette page (pour la
+    dernière taille de page demandée). Les entrées sont
+    invalidées par les routes d'écriture ; le TTL borne la fraîcheur
+    lorsque plusieurs workers écrivent.
+    """
+
+    def __init__(self, max_size=1000, ttl=30):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Génération par conversation : empêche de stocker une page devenue obsolète
+        self._generations = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id, limit):
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None and entry[0] == limit and entry[2] > time.monotonic():
+                self._entries.move_to_end(conversation_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def generation(self, conversation_id):
+        with self._lock:
+            return self._generations.get(conversation_id, 0)
+
+    def put(self, conversation_id, limit, body, generation):
+        with self._lock:
+            if self._generations.get(conversation_id, 0) != generation:
+                return
+            self._entries[conversation_id] = (limit, body, time.monotonic() + self._ttl)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, conversation_id):
+        with self._lock:
+            self._generations[conversation_id] = self._generations.get(conversation_id, 0) + 1
+            self._generations.move_to_end(conversation_id)
+            while len(self._generations) > self._max_size * 10:
+                self._generations.popitem(last=False)
+            self._entries.pop(conversation_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+history_cache = HotPageCache()
@@ -0,0 +1,200 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+from config.logging_config import get_logger
+from services.conversation_cache import conversation_cache
+from services.reference_data import serialize_value
+
+logger = get_logger('services.push_hub')
+
+# Type d'événement envoyé aux abonnés pour chaque type de changement Firestore
+EVENT_TYPES = {
+    'ADDED': 'message_added',
+    'MODIFIED': 'message_updated',
+    'REMOVED': 'message_deleted'
+}
+
+
+class Subscription:
+    """File d'événements d'un client connecté, abonné à une ou plusieurs conversations"""
+
+    def __init__(self, uid, conversation_ids, max_queue):
+        self.uid = uid
+        self.conversation_ids = tuple(conversation_ids)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+        # Conversation dont l'utilisateur a été retiré : le flux doit être fermé
+        self.revoked = None
+
+    def push(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Client trop lent : il sera déconnecté et devra se reconnecter
+            self.overflowed = True
+
+    def revoke(self, conversation_id):
+        self.revoked = conversation_id
+        # Réveiller le flux en attente d'un événement
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def get(self, timeout):
+        """Retourner le prochain événement, ou None après `timeout` secondes"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _Channel:
+    """Listener Firestore d'une conversation et ses abonnés"""
+
+    def __init__(self, db):
+        self.db = db
+        self.watch = None
+        self.subscribers = set()
+        self.idle_since = None
+
+
+class PushHub:
+    """Diffusion en temps réel des messages aux participants connectés.
+
+    Un seul listener Firestore est ouvert par conversation suivie, quel que
+    soit le nombre de clients connectés : chaque changement de la
+    sous-collection `messages` est recopié dans la file de chaque abonné.
+    Le listener d'une conversation sans abonné est fermé après `linger`
+    secondes, pour absorber les reconnexions. L'appartenance des abonnés à
+    la conversation est revérifiée (cache des participants) à chaque
+    diffusion : un participant retiré ne reçoit plus rien.
+    """
+
+    def __init__(self, max_queue=100, linger=30):
+        self._max_queue = max_queue
+        self._linger = linger
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._reaper = None
+        self.events = 0
+        self.overflows = 0
+        self.revocations = 0
+
+    def subscribe(self, db, uid, conversation_ids):
+        subscription = Subscription(uid, conversation_ids, self._max_queue)
+        with self._lock:
+            for conversation_id in subscription.conversation_ids:
+                channel = self._channels.get(conversation_id)
+                if channel is None:
+                    channel = self._channels[conversation_id] = _Channel(db)
+                    channel.watch = self._listen(db, conversation_id)
+                channel.subscribers.add(subscription)
+                channel.idle_since = None
+            self._ensure_reaper()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        now = time.monotonic()
+        with self._lock:
+            for conversation_id in subscription.conversation_ids:
+                channel = self._channels.get(conversation_id)
+                if channel is None:
+                    continue
+                channel.subscribers.discard(subscription)
+                if not channel.subscribers:
+                    channel.idle_since = now
+
+    def _listen(self, db, conversation_id):
+        # Seuls les messages postérieurs à l'ouverture du listener sont suivis
+        query = db.collection('conversations').document(conversation_id).collection('messages').where(
+            'createdAt', '>=', datetime.utcnow()
+        )
+
+        def on_snapshot(col_snapshot, changes, read_time):
+            self._dispatch(conversation_id, changes)
+
+        return query.on_snapshot(on_snapshot)
+
+    def _dispatch(self, conversation_id, changes):
+        with self._lock:
+            channel = self._channels.get(conversation_id)
+            subscribers = list(channel.subscribers) if channel is not None else []
+        if not subscribers:
+            return
+        subscribers = self._authorized(channel.db, conversation_id, subscribers)
+        if not subscribers:
+            return
+        for change in changes:
+            doc = change.document
+            if change.type.name == 'REMOVED':
+                payload = {'id': doc.id, 'conversationId': conversation_id}
+            else:
+                payload = serialize_value(doc.to_dict() or {})
+                payload.setdefault('id', doc.id)
+            event = (EVENT_TYPES[change.type.name], payload)
+            self.events += 1
+            for subscription in subscribers:
+                if subscription.overflowed:
+                    continue
+                subscription.push(event)
+                if subscription.overflowed:
+                    self.overflows += 1
+
+    def _authorized(self, db, conversation_id, subscribers):
+        """Révoquer les abonnés qui ne sont plus participants et retourner les autres"""
+        try:
+            participants = conversation_cache.get_participants(db, conversation_id) or frozenset()
+        except Exception:
+            # Appartenance invérifiable : ne rien diffuser, les clients se reconnectent et relisent l'historique
+            logger.exception("Vérification des participants impossible", extra={'conversationId': conversation_id})
+            for subscription in subscribers:
+                subscription.overflowed = True
+                subscription.revoke(None)
+            return []
+        authorized = []
+        for subscription in subscribers:
+            if subscription.uid in participants:
+                authorized.append(subscription)
+            else:
+                subscription.revoke(conversation_id)
+                self.revocations += 1
+        return authorized
+
+    def _ensure_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, name='push-hub-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1, self._linger / 2))
+            now = time.monotonic()
+            with self._lock:
+                idle = [
+                    conversation_id for conversation_id, channel in self._channels.items()
+                    if channel.idle_since is not None and now - channel.idle_since >= self._linger
+                ]
+                watches = [self._channels.pop(conversation_id).watch for conversation_id in idle]
+            for watch in watches:
+                try:
+                    watch.unsubscribe()
+                except Exception:
+                    logger.exception("Échec de la fermeture d'un listener de conversation")
+
+    def stats(self):
+        with self._lock:
+            channels = len(self._channels)
+            subscriptions = len({s for channel in self._channels.values() for s in channel.subscribers})
+        return {
+            'channels': channels,
+            'subscriptions': subscriptions,
+            'events': self.events,
+            'overflows': self.overflows,
+            'revocations': self.revocations
+        }
+
+
+push_hub = PushHub()
@@ -0,0 +1,166 @@
+import hashlib
+import threading
+from datetime import datetime
+
+from google.cloud.firestore import DocumentReference, GeoPoint
+
+from middleware.response_layer import dumps_bytes
+from services.geo_index import geo_index
+
+# Collections de référence : peu volumineuses et rarement modifiées
+REFERENCE_COLLECTIONS = ('professions', 'specialties', 'establishments')
+
+
+def serialize_value(value):
+    """Convertir une valeur Firestore en valeur JSON"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, GeoPoint):
+        return {'latitude': value.latitude, 'longitude': value.longitude}
+    if isinstance(value, DocumentReference):
+        return value.path
+    if isinstance(value, dict):
+        return {key: serialize_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [serialize_value(item) for item in value]
+    return value
+
+
+class ReferenceCollection:
+    """Copie en mémoire d'une collection de référence.
+
+    Le contenu est tenu à jour par un listener Firestore. Le corps JSON et
+    son ETag sont calculés à la première demande puis conservés jusqu'au
+    prochain changement de la collection.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._watch = None
+        self._docs = {}
+        self._payload = None
+        self._change_callbacks = []
+        self.version = 0
+
+    # --- Cycle de vie -----------------------------------------------------
+
+    def start(self, db):
+        """Attacher le listener Firestore (idempotent)"""
+        if self._watch is not None:
+            return
+        with self._lock:
+            if self._watch is None:
+                self._watch = db.collection(self.name).on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        with self._lock:
+            if self._watch is not None:
+                self._watch.unsubscribe()
+                self._watch = None
+            self._ready.clear()
+
+    def wait_until_ready(self, timeout=10):
+        return self._ready.wait(timeout)
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def add_change_callback(self, callback):
+        """Être notifié de chaque changement : callback(doc_id, data), data à None si supprimé"""
+        self._change_callbacks.append(callback)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        updates = []
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    self._docs.pop(doc.id, None)
+                    updates.append((doc.id, None))
+                else:
+                    data = doc.to_dict() or {}
+                    self._docs[doc.id] = serialize_value(data)
+                    updates.append((doc.id, data))
+            if changes:
+                self._payload = None
+                self.version += 1
+        for doc_id, data in updates:
+            for callback in self._change_callbacks:
+                callback(doc_id, data)
+        self._ready.set()
+
+    # --- Accès ------------------------------------------------------------
+
+    def get(self, doc_id):
+        return self._docs.get(doc_id)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def missing(self, doc_ids):
+        """Retourner les IDs absents de la collection"""
+        docs = self._docs
+        return [doc_id for doc_id in doc_ids if doc_id not in docs]
+
+    def payload(self):
+        """Retourner (corps JSON, ETag) de la collection complète"""
+        payload = self._payload
+        if payload is not None:
+            return payload
+        with self._lock:
+            if self._payload is None:
+                items = [dict(data, id=doc_id) for doc_id, data in sorted(self._docs.items())]
+                body = dumps_bytes(items)
+                self._payload = (body, hashlib.sha1(body).hexdigest())
+            return self._payload
+
+    def __len__(self):
+        return len(self._docs)
+
+
+class ReferenceDataStore:
+    """Professions, spécialités et établissements chargés en mémoire"""
+
+    def __init__(self, names=REFERENCE_COLLECTIONS):
+        self.collections = {name: ReferenceCollection(name) for name in names}
+
+    def start(self, db):
+        for collection in self.collections.values():
+            collection.start(db)
+
+    def stop(self):
+        for collection in self.collections.values():
+            collection.stop()
+
+    def wait_until_ready(self, timeout=10):
+        return all(collection.wait_until_ready(timeout) for collection in self.collections.values())
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    def __contains__(self, name):
+        return name in self.collections
+
+    def stats(self):
+        stats = {}
+        for name, collection in self.collections.items():
+            stats[f'{name}Size'] = len(collection)
+            stats[f'{name}Version'] = collection.version
+            stats[f'{name}Ready'] = collection.is_ready()
+        return stats
+
+
+reference_data = ReferenceDataStore()
+
+
+def _update_geo_index(establishment_id, data):
+    if data is None:
+        geo_index.remove(establishment_id)
+    else:
+        geo_index.upsert(establishment_id, data.get('coordinates'))
+
+
+# L'index géographique est alimenté par le listener des établissements
+reference_data['establishments'].add_change_callback(_update_geo_index)
@@ -0,0 +1,242 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+
+_MIN_DATE = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def parse_date(value):
+    """Convertir une date ISO (ou un datetime Firestore) en datetime UTC"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str):
+        # fromisoformat ne gère pas le suffixe 'Z' avant Python 3.11
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    else:
+        raise ValueError(f"Date invalide: {value!r}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def serialize_replacement(replacement_id, data):
+    """Préparer un remplacement pour la réponse JSON (dates au format ISO)"""
+    result = {'id': replacement_id}
+    for key, value in data.items():
+        result[key] = value.isoformat() if isinstance(value, datetime) else value
+    return result
+
+
+class ReplacementIndex:
+    """Index en mémoire des remplacements ouverts.
+
+    Les remplacements sont indexés par profession, spécialité et
+    établissement, et deux listes triées sur startDate / endDate permettent
+    de filtrer par période avec une recherche dichotomique. L'index est
+    alimenté par un listener Firestore limité aux remplacements ouverts :
+    un remplacement qui change de statut arrive comme REMOVED.
+    """
+
+    SEARCHABLE_STATUS = 'open'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._watch = None
+        self._docs = {}
+        self._by_profession = {}
+        self._by_specialty = {}
+        self._by_establishment = {}
+        # Listes triées de tuples (date, id)
+        self._by_start = []
+        self._by_end = []
+        self._change_callbacks = []
+
+    # --- Cycle de vie -----------------------------------------------------
+
+    def start(self, db):
+        """Attacher le listener Firestore (idempotent)"""
+        with self._lock:
+            if self._watch is not None:
+                return
+            query = db.collection('replacements').where('status', '==', self.SEARCHABLE_STATUS)
+            self._watch = query.on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        with self._lock:
+            if self._watch is not None:
+                self._watch.unsubscribe()
+                self._watch = None
+            self._ready.clear()
+
+    def wait_until_ready(self, timeout=10):
+        """Attendre le premier snapshot complet de la collection"""
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def add_change_callback(self, callback):
+        """Être notifié de chaque changement : callback(id, ancienne entrée, nouvelle entrée).
+
+        Une entrée est un dict {'data', 'start', 'end'}, ou None si le
+        remplacement n'est pas (ou plus) ouvert.
+        """
+        self._change_callbacks.append(callback)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        updates = []
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                previous = self._docs.get(doc.id)
+                if change.type.name == 'REMOVED':
+                    self.remove(doc.id)
+                else:
+                    self.upsert(doc.id, doc.to_dict() or {})
+                current = self._docs.get(doc.id)
+                if previous is not None or current is not None:
+                    updates.append((doc.id, previous, current))
+        for replacement_id, previous, current in updates:
+            for callback in self._change_callbacks:
+                callback(replacement_id, previous, current)
+        self._ready.set()
+
+    # --- Mise à jour de l'index -------------------------------------------
+
+    def upsert(self, replacement_id, data):
+        with self._lock:
+            self.remove(replacement_id)
+            if data.get('status') != self.SEARCHABLE_STATUS:
+                return
+            try:
+                start = parse_date(data.get('startDate'))
+                end = parse_date(data.get('endDate'))
+            except ValueError:
+                return
+
+            entry = {'data': data, 'start': start, 'end': end}
+            self._docs[replacement_id] = entry
+            self._add_key(self._by_profession, data.get('professionId'), replacement_id)
+            self._add_key(self._by_specialty, data.get('specialtyId'), replacement_id)
+            self._add_key(self._by_establishment, data.get('establishmentId'), replacement_id)
+            if start is not None:
+                insort(self._by_start, (start, replacement_id))
+            if end is not None:
+                insort(self._by_end, (end, replacement_id))
+
+    def remove(self, replacement_id):
+        with self._lock:
+            entry = self._docs.pop(replacement_id, None)
+            if entry is None:
+                return
+            data = entry['data']
+            self._discard_key(self._by_profession, data.get('professionId'), replacement_id)
+            self._discard_key(self._by_specialty, data.get('specialtyId'), replacement_id)
+            self._discard_key(self._by_establishment, data.get('establishmentId'), replacement_id)
+            if entry['start'] is not None:
+                self._discard_sorted(self._by_start, (entry['start'], replacement_id))
+            if entry['end'] is not None:
+                self._discard_sorted(self._by_end, (entry['end'], replacement_id))
+
+    @staticmethod
+    def _add_key(index, key, replacement_id):
+        if key:
+            index.setdefault(key, set()).add(replacement_id)
+
+    @staticmethod
+    def _discard_key(index, key, replacement_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(replacement_id)
+            if not ids:
+                del index[key]
+
+    @staticmethod
+    def _discard_sorted(items, item):
+        position = bisect_left(items, item)
+        if position < len(items) and items[position] == item:
+            del items[position]
+
+    # --- Recherche --------------------------------------------------------
+
+    def by_profession(self, profession_id):
+        """Retourner {id: entrée} des remplacements ouverts d'une profession"""
+        with self._lock:
+            return {rid: self._docs[rid] for rid in self._by_profession.get(profession_id, ())}
+
+    def serialize_many(self, replacement_ids):
+        """Sérialiser les remplacements demandés, dans l'ordre, en ignorant ceux fermés entre-temps"""
+        with self._lock:
+            entries = [(rid, self._docs.get(rid)) for rid in replacement_ids]
+        return [serialize_replacement(rid, entry['data']) for rid, entry in entries if entry is not None]
+
+    def search(self, profession_id=None, establishment_ids=None, specialty_ids=None,
+               start_date=None, end_date=None):
+        """Retourner les remplacements ouverts correspondant aux filtres.
+
+        Un remplacement correspond à la période demandée s'il la chevauche
+        (startDate <= endDate demandée et endDate >= startDate demandée).
+        """
+        with self._lock:
+            candidates = None
+            if profession_id:
+                candidates = self._intersect(candidates, self._by_profession.get(profession_id, set()))
+            if establishment_ids:
+                candidates = self._intersect(candidates, self._union(self._by_establishment, establishment_ids))
+            if specialty_ids:
+                candidates = self._intersect(candidates, self._union(self._by_specialty, specialty_ids))
+            if candidates is None and (start_date is not None or end_date is not None):
+                # Aucun filtre par clé : partir de la liste triée la plus sélective
+                candidates = self._date_candidates(start_date, end_date)
+            if candidates is None:
+                candidates = self._docs.keys()
+
+            results = []
+            for rid in candidates:
+                entry = self._docs[rid]
+                if end_date is not None and (entry['start'] is None or entry['start'] > end_date):
+                    continue
+                if start_date is not None and (entry['end'] is None or entry['end'] < start_date):
+                    continue
+                results.append((entry, rid))
+
+        # Les remplacements les plus proches en premier
+        results.sort(key=lambda item: (item[0]['start'] or _MIN_DATE, item[1]))
+        return [serialize_replacement(rid, entry['data']) for entry, rid in results]
+
+    def _date_candidates(self, start_date, end_date):
+        """Sélectionner par dichotomie les remplacements qui chevauchent la période"""
+        started = None
+        ending = None
+        if end_date is not None:
+            # Remplacements commençant avant la fin de la période demandée
+            started = self._by_start[:bisect_right(self._by_start, (end_date, '\uffff'))]
+        if start_date is not None:
+            # Remplacements se terminant après le début de la période demandée
+            ending = self._by_end[bisect_left(self._by_end, (start_date, '')):]
+        if started is None or (ending is not None and len(ending) < len(started)):
+            return {rid for _, rid in ending}
+        return {rid for _, rid in started}
+
+    @staticmethod
+    def _intersect(candidates, ids):
+        if candidates is None:
+            return set(ids)
+        return candidates & ids
+
+    @staticmethod
+    def _union(index, keys):
+        ids = set()
+        for key in keys:
+            ids |= index.get(key, set())
+        return ids
+
+    def __len__(self):
+        return len(self._docs)
+
+
+replacement_index = ReplacementIndex()
@@ -0,0 +1,117 @@
+import atexit
+import threading
+import time
+
+from config import settings
+from config.logging_config import get_logger
+from services.batch_writer import BatchWriter
+
+logger = get_logger('services.update_coalescer')
+
+
+class UpdateCoalescer:
+    """Regrouper les mises à jour successives d'un même document en une seule écriture.
+
+    Le premier patch reçu pour un document ouvre une fenêtre de `window`
+    secondes ; les patchs suivants y sont fusionnés (le dernier gagne champ
+    par champ). À l'échéance, un thread unique valide toutes les fenêtres
+    expirées dans un même WriteBatch, dans l'ordre d'arrivée, ce qui
+    préserve l'ordre des écritures d'un document. Les fenêtres en attente
+    sont validées à l'arrêt du processus.
+    """
+
+    def __init__(self, collection, window=0.25):
+        self._collection = collection
+        self._window = window
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._db = None
+        self._thread = None
+        self.submitted = 0
+        self.flushed_writes = 0
+        self.failures = 0
+        atexit.register(self.flush)
+
+    @property
+    def window(self):
+        return self._window
+
+    def start(self, db):
+        """Démarrer le thread de validation (idempotent)"""
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is None:
+                self._db = db
+                self._thread = threading.Thread(target=self._run, name='update-coalescer', daemon=True)
+                self._thread.start()
+
+    def submit(self, doc_id, patch):
+        """Ajouter un patch à la fenêtre en cours du document"""
+        with self._condition:
+            entry = self._pending.get(doc_id)
+            if entry is None:
+                self._pending[doc_id] = (dict(patch), time.monotonic() + self._window)
+                self._condition.notify()
+            else:
+                entry[0].update(patch)
+            self.submitted += 1
+
+    def flush(self):
+        """Valider immédiatement toutes les fenêtres en attente"""
+        self._write(self._take(lambda deadline: True))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                # Les dictionnaires conservent l'ordre d'insertion : la première échéance est en tête
+                deadline = next(iter(self._pending.values()))[1]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+            now = time.monotonic()
+            self._write(self._take(lambda deadline: deadline <= now))
+
+    def _take(self, is_due):
+        with self._condition:
+            due = [(doc_id, entry[0]) for doc_id, entry in self._pending.items() if is_due(entry[1])]
+            for doc_id, _ in due:
+                del self._pending[doc_id]
+        return due
+
+    def _write(self, due):
+        if not due or self._db is None:
+            return
+        writer = BatchWriter(self._db)
+        collection = self._db.collection(self._collection)
+        for doc_id, patch in due:
+            writer.add(doc_id, [('update', collection.document(doc_id), patch)])
+        try:
+            failures = writer.commit()
+        except Exception:
+            logger.exception("Échec de l'écriture groupée des mises à jour", extra={'documents': len(due)})
+            self.failures += len(due)
+            return
+        for doc_id, error in failures.items():
+            logger.error(
+                "Mise à jour différée perdue",
+                extra={'collection': self._collection, 'docId': doc_id,
+                       'fields': sorted(dict(due)[doc_id]), 'error': str(error)}
+            )
+        self.failures += len(failures)
+        self.flushed_writes += len(due) - len(failures)
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'submitted': self.submitted,
+            'flushedWrites': self.flushed_writes,
+            'failures': self.failures
+        }
+
+
+# Mises à jour des profils (onboarding : un appel par étape)
+user_updates = UpdateCoalescer('users', window=settings.USER_UPDATE_COALESCE_MS / 1000)
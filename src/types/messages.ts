@@ -20,10 +20,17 @@ export interface TextMessage extends BaseMessage {
   content: string;
   attachments?: {
     type: 'image' | 'document' | 'pdf';
-    url: string;
+    url: string;        // Pièces jointes téléversées : /attachments/{id}/content (authentifié)
     name: string;
     size?: number;
     mimeType?: string;
+    id?: string;        // ID du document `attachments` (absent pour les pièces jointes en ligne)
+    metadata?: {
+      sha256: string;
+      width?: number;
+      height?: number;
+      thumbnail?: boolean;
+    };
   }[];
 }
 
@@ -68,6 +75,27 @@ export interface NotificationMessage extends BaseMessage {
  */
 export type Message = TextMessage | MissionMessage | NotificationMessage;
 
+/**
+ * Structure Firestore pour la collection conversations
+ * Path: conversations/{conversationId}
+ */
+export interface ConversationDocument {
+  participants: string[];
+  establishmentId?: string;
+  replacementId?: string;
+  status?: 'active' | 'closed';
+  lastActivity?: Timestamp;
+  lastMessage?: {
+    messageId?: string;  // Absent des conversations antérieures à son introduction
+    content: string;
+    senderId: string;
+    timestamp: Timestamp;
+  };
+  unreadCounts?: Record<string, number>;  // Messages non lus par participant (uid)
+  createdAt?: Timestamp;
+  updatedAt?: Timestamp;
+}
+
 /**
  * Structure Firestore pour la collection messages
  * Path: conversations/{conversationId}/messages/{messageId}